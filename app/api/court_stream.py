@@ -0,0 +1,117 @@
+# app/api/court_stream.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Set
+
+from fastapi.responses import Response
+
+from app.core.admission import AdmissionController, Rejected
+from app.core.msgpack_codec import MSGPACK_MEDIA_TYPE, MsgpackError, Unpacker, packb
+
+logger = logging.getLogger(__name__)
+
+
+class LookupStream(Response):
+    """ASGI-ответ потокового поиска: много поисков по одному соединению в MessagePack.
+
+    Тело запроса — подряд идущие объекты; клиент может досылать их, не дожидаясь ответов.
+    Поиск запускается, как только объект прочитан, и проходит допуск (AdmissionController)
+    как отдельный запрос. Ответы пишутся по мере готовности, не в порядке запросов; клиент
+    сопоставляет их по полю id. Одновременно выполняется не больше max_in_flight поисков
+    одного соединения; пока все места заняты, тело запроса дальше не читается.
+    """
+
+    def __init__(self, lookup: Callable[[Dict], Awaitable[Dict]], controller: AdmissionController, priority: str,
+                 max_in_flight: int = 32, max_frame: int = 64 * 1024, headers: Optional[Mapping[str, str]] = None):
+        # Как у StreamingResponse: тела нет, поэтому Content-Length не выставляется
+        self.status_code = 200
+        self.media_type = MSGPACK_MEDIA_TYPE
+        self.background = None
+        self.init_headers(headers)
+        self.lookup = lookup
+        self.controller = controller
+        self.priority = priority
+        self.max_in_flight = max_in_flight
+        self.max_frame = max_frame
+
+    async def _admitted(self, item) -> Dict:
+        lookup_id = item.get("id") if isinstance(item, dict) else None
+        try:
+            await self.controller.acquire(self.priority)
+        except Rejected as e:
+            return {"id": lookup_id, "status": "rejected", "reason": e.reason, "retry_after": e.retry_after}
+        started = time.monotonic()
+        try:
+            return await self.lookup(item)
+        except Exception as e:
+            logger.error(f"Ошибка поиска {lookup_id} в потоке: {str(e)}")
+            return {"id": lookup_id, "status": "error", "detail": "Внутренняя ошибка сервера"}
+        finally:
+            self.controller.release(self.priority, time.monotonic() - started)
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        outbox: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks: Set[asyncio.Task] = set()
+
+        async def run(item):
+            try:
+                reply = await self._admitted(item)
+            finally:
+                slots.release()
+            outbox.put_nowait(packb(reply))
+
+        async def read():
+            unpacker = Unpacker(self.max_frame)
+            try:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        for task in tasks:
+                            task.cancel()
+                        return
+                    unpacker.feed(message.get("body", b""))
+                    for item in unpacker:
+                        await slots.acquire()
+                        task = loop.create_task(run(item))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    if not message.get("more_body", False):
+                        if unpacker.pending:
+                            outbox.put_nowait(packb({"id": None, "status": "error",
+                                                     "detail": "Тело запроса оборвано на середине объекта"}))
+                        break
+            except MsgpackError as e:
+                logger.warning(f"Некорректный поток MessagePack: {str(e)}")
+                outbox.put_nowait(packb({"id": None, "status": "error", "detail": f"Некорректный MessagePack: {e}"}))
+            finally:
+                if tasks:
+                    await asyncio.wait(set(tasks))
+                outbox.put_nowait(None)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        reader = loop.create_task(read())
+        try:
+            finished = False
+            while not finished:
+                # Готовые ответы отправляются одной записью
+                frames: List[bytes] = []
+                frame: Optional[bytes] = await outbox.get()
+                while True:
+                    if frame is None:
+                        finished = True
+                        break
+                    frames.append(frame)
+                    if outbox.empty():
+                        break
+                    frame = outbox.get_nowait()
+                if frames:
+                    await send({"type": "http.response.body", "body": b"".join(frames), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if not reader.done():
+                reader.cancel()
+                for task in tasks:
+                    task.cancel()
@@ -0,0 +1,114 @@
+# app/api/endpoints/admin.py
+import asyncio
+import hmac
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.core.config import settings
+from app.core.admission import admission
+from app.core.loop_monitor import loop_monitor
+from app.core.memory import allocation_tracer
+from app.core.offload import offload
+from app.core.tracing import tracer
+from app.services.audit import audit_log
+from app.services.geocoder import gazetteer, geocoder
+from app.services.memory_usage import memory_report
+from app.services.shadow import shadow
+from app.services.upstream import upstream
+from app.services.shared_cache import shared_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+)
+
+
+def require_profile_token(request: Request):
+    """Доступ к диагностике, которая замедляет воркер или раскрывает лишнее, — по токену
+    профилирования (PROFILE_TOKEN в заголовке PROFILE_HEADER). Без токена она выключена."""
+    if not settings.PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Диагностика выключена: не задан PROFILE_TOKEN")
+    token = request.headers.get(settings.PROFILE_HEADER, "")
+    if not hmac.compare_digest(token.encode("utf-8"), settings.PROFILE_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail=f"Неверный токен в заголовке {settings.PROFILE_HEADER}")
+
+
+@router.get("/loop", response_model=dict, summary="Задержка событийного цикла и последние блокировки")
+async def get_loop_stats():
+    return loop_monitor.stats()
+
+
+@router.get("/admission", response_model=dict, summary="Загрузка, очереди и время ожидания по приоритетам")
+async def get_admission_stats():
+    return admission.snapshot()
+
+
+@router.get("/cache", response_model=dict, summary="Попадания в ближний и общий кэш")
+async def get_cache_stats():
+    return shared_cache.snapshot()
+
+
+@router.get("/audit", response_model=dict, summary="Очередь и счётчики журнала решений")
+async def get_audit_stats():
+    return audit_log.stats()
+
+
+@router.get("/geocoder", response_model=dict, summary="Задержки геокодеров и число подстраховочных запросов")
+async def get_geocoder_stats():
+    return {**geocoder.stats(), "gazetteer_settlements": len(gazetteer.entries)}
+
+
+@router.get("/upstream", response_model=dict, summary="Скорости и суточные квоты внешних сервисов")
+async def get_upstream_stats():
+    return await asyncio.to_thread(upstream.snapshot)
+
+
+@router.get("/offload", response_model=dict, summary="Вычисления, вынесенные в пул процессов: очередь и время")
+async def get_offload_stats():
+    return offload.snapshot()
+
+
+@router.get("/tracing", response_model=dict, summary="Выборка и выгрузка трассировки запросов")
+async def get_tracing_stats():
+    return tracer.stats()
+
+
+@router.get("/shadow", response_model=dict, summary="Сравнение теневого движка поиска суда с текущим",
+            dependencies=[Depends(require_profile_token)])
+async def get_shadow_stats():
+    return shadow.snapshot()
+
+
+@router.get("/memory", response_model=dict, summary="Память воркера по структурам данных и уровням кэша")
+async def get_memory_stats():
+    return await asyncio.to_thread(memory_report)
+
+
+@router.get("/memory/tracemalloc", response_model=dict, summary="Состояние трассировки выделений памяти",
+            dependencies=[Depends(require_profile_token)])
+async def get_tracemalloc_status():
+    return allocation_tracer.status()
+
+
+@router.post("/memory/tracemalloc/start", response_model=dict, summary="Включить трассировку выделений памяти",
+             dependencies=[Depends(require_profile_token)])
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=64, description="Кадров стека на выделение")):
+    return allocation_tracer.start(frames)
+
+
+@router.post("/memory/tracemalloc/stop", response_model=dict, summary="Выключить трассировку выделений памяти",
+             dependencies=[Depends(require_profile_token)])
+async def stop_tracemalloc():
+    return allocation_tracer.stop()
+
+
+@router.get("/memory/tracemalloc/snapshot", response_model=dict,
+            summary="Крупнейшие места выделения памяти и рост с предыдущего снимка",
+            dependencies=[Depends(require_profile_token)])
+async def get_tracemalloc_snapshot(limit: int = Query(25, ge=1, le=500),
+                                   group_by: Literal["lineno", "filename", "traceback"] = "lineno"):
+    if not allocation_tracer.tracing:
+        raise HTTPException(status_code=409, detail="Трассировка не включена: POST /admin/memory/tracemalloc/start")
+    return await asyncio.to_thread(allocation_tracer.snapshot, limit, group_by)
@@ -1,9 +1,23 @@
 # app/api/endpoints/courts.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field, validator
-from typing import Optional
-from app.services.court_finder import find_court
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Request, Response
+from pydantic import BaseModel, Field, ValidationError, validator
+import asyncio
+import hmac
+from typing import Dict, Optional
+from app.api.court_stream import LookupStream
+from app.api.responses import OrjsonResponse
+from app.core.admission import admission, request_priority
+from app.core.config import settings
+from app.core.msgpack_codec import MSGPACK_MEDIA_TYPE, accepts_msgpack
+from app.core.tracing import tracer
+from app.services.audit import AuditRecord, audit_log
+from app.services.court_finder import CourtFinder, Resolution
+from app.services.court_payload import envelope
+from app.services.court_store import COURT_TYPES
+from app.services.warmup import warmup
+from app.services.court_tiles import MAX_ZOOM
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -55,18 +69,68 @@ class CourtResponse(BaseModel):
     polygon: str
 
 
-@router.post("/find_court/", response_model=dict, summary="Поиск суда")
+class FindCourtResponse(BaseModel):
+    status: str
+    confidence: str
+    deadline_exceeded: bool
+    court: CourtResponse
+
+
+def _record_audit(request: CourtRequest, resolution: Resolution):
+    result = resolution.court
+    lat, lon = resolution.coords if resolution.coords else (None, None)
+    audit_log.record(AuditRecord(
+        created_at=time.time(), address=request.address, debt_amount=request.debt_amount,
+        case_type=request.case_type, latitude=lat, longitude=lon, court_name=result.get("name"),
+        court_type=result.get("type"), path=resolution.path, confidence=resolution.confidence,
+        deadline_exceeded=resolution.deadline_exceeded, latency_ms=round(resolution.elapsed * 1000, 1),
+    ))
+
+
+def _remember_debtor_address(address: str):
+    """Адрес должника попадает в подсказки, только если их можно получить с токеном (SUGGEST_TOKEN)."""
+    if settings.SUGGEST_TOKEN:
+        CourtFinder.suggest_index.add(address)
+
+
+def _require_courts():
+    """Пока процесс не готов (загрузка данных и прогрев, /health/ready), просим повторить запрос позже."""
+    if not warmup.ready or not CourtFinder.courts_data:
+        raise HTTPException(status_code=503, detail="Данные о судах не загружены",
+                            headers={"Retry-After": str(warmup.retry_after())})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return bool(if_none_match) and (if_none_match.strip() == "*" or etag in
+                                    [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")])
+
+
+@router.post("/find_court/", response_model=FindCourtResponse, response_class=OrjsonResponse,
+             summary="Поиск суда")
 async def find_court_endpoint(request: CourtRequest):
     logger.info(
         f"Получен запрос: address={request.address}, debt_amount={request.debt_amount}, case_type={request.case_type}")
+    _require_courts()
     try:
-        result = await find_court(request.address, request.debt_amount, request.case_type)
-        if "status" in result and result["status"] == "error":
-            logger.warning(f"Ошибка поиска суда: {result['message']}")
-            raise HTTPException(status_code=404, detail=result["message"])
-        court = CourtResponse(**result)
-        logger.info(f"Найден суд: {court.name}")
-        return {"status": "success", "court": court}
+        with tracer.span("find_court_endpoint", case_type=request.case_type) as span:
+            resolution = await CourtFinder.resolve(request.address, request.debt_amount, request.case_type)
+            result = resolution.court
+            span.set("resolution.path", resolution.path)
+            span.set("cache.hit", resolution.cached)
+            _record_audit(request, resolution)
+            if "status" in result and result["status"] == "error":
+                logger.warning(f"Ошибка поиска суда: {result['message']}")
+                raise HTTPException(status_code=404, detail=result["message"])
+            logger.info(f"Найден суд: {result['name']} ({resolution.path}, {resolution.elapsed:.2f} с)")
+            span.set("court.name", result["name"])
+            _remember_debtor_address(request.address)
+            # Тело собирается из готового JSON суда, без повторной валидации через response_model
+            return OrjsonResponse(envelope(
+                result,
+                status="success",
+                confidence=resolution.confidence,
+                deadline_exceeded=resolution.deadline_exceeded,
+            ))
     except HTTPException:
         raise
     except Exception as e:
@@ -74,7 +138,98 @@ async def find_court_endpoint(request: CourtRequest):
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+async def _stream_lookup(item) -> Dict:
+    """Один поиск потокового API; суд из набора данных передаётся номером строки таблицы судов."""
+    if not isinstance(item, dict):
+        return {"id": None, "status": "error", "detail": "Ожидался словарь с полями запроса"}
+    lookup_id = item.get("id")
+    try:
+        request = CourtRequest(**{field: item.get(field) for field in CourtRequest.model_fields})
+    except ValidationError as e:
+        detail = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        return {"id": lookup_id, "status": "error", "detail": detail}
+    resolution = await CourtFinder.resolve(request.address, request.debt_amount, request.case_type)
+    _record_audit(request, resolution)
+    result = resolution.court
+    if result.get("status") == "error":
+        return {"id": lookup_id, "status": "error", "detail": result["message"]}
+    _remember_debtor_address(request.address)
+    index = CourtFinder.payloads.index_of(result)
+    return {"id": lookup_id, "status": "success", "confidence": resolution.confidence,
+            "deadline_exceeded": resolution.deadline_exceeded, "court": index if index is not None else dict(result)}
+
+
+@router.post("/stream", summary="Потоковый поиск судов в MessagePack", response_class=Response, responses={200: {
+    "content": {MSGPACK_MEDIA_TYPE: {}},
+    "description": "Поток объектов {id, status, confidence, deadline_exceeded, court}; court — номер строки "
+                   "таблицы судов версии из заголовка X-Courts-Version или полная запись суда не из таблицы",
+}})
+async def stream_find_court(request: Request):
+    """Тело — подряд идущие объекты MessagePack {id, address, debt_amount, case_type}."""
+    if not accepts_msgpack(request.headers.get("content-type", "")):
+        raise HTTPException(status_code=415, detail=f"Ожидается тело {MSGPACK_MEDIA_TYPE}")
+    _require_courts()
+    return LookupStream(
+        _stream_lookup, admission,
+        priority=request_priority(request.scope, settings.ADMISSION_PRIORITY_HEADER.lower().encode("latin-1")),
+        max_in_flight=settings.STREAM_MAX_IN_FLIGHT, max_frame=settings.STREAM_MAX_FRAME,
+        headers={"X-Courts-Version": CourtFinder.payloads.version},
+    )
+
+
+@router.get("/table", summary="Таблица судов для потокового поиска (JSON или MessagePack по Accept)")
+async def get_court_table(accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    _require_courts()
+    msgpack = accepts_msgpack(accept or "")
+    payloads = CourtFinder.payloads
+    headers = {"Cache-Control": "public, max-age=3600", "Vary": "Accept",
+               "ETag": f'"{payloads.version}:{"msgpack" if msgpack else "json"}"'}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payloads.table(msgpack), headers=headers,
+                    media_type=MSGPACK_MEDIA_TYPE if msgpack else "application/json")
+
+
 @router.get("/case_types/", response_model=dict, summary="Список доступных типов дел")
 async def get_case_types():
     case_types = ["имущественный_спор", "расторжение_брака", "алименты", "раздел_имущества"]
-    return {"case_types": case_types}
\ No newline at end of file
+    return {"case_types": case_types}
+
+
+@router.get("/suggest", response_model=dict, summary="Подсказки адресов")
+async def suggest_addresses(
+        request: Request,
+        q: str = Query(..., min_length=2, description="Начало адреса"),
+        limit: int = Query(5, ge=1, le=20, description="Максимальное число подсказок")
+):
+    """Адреса судов; адреса должников — только с токеном SUGGEST_TOKEN в заголовке SUGGEST_HEADER."""
+    token = request.headers.get(settings.SUGGEST_HEADER, "")
+    trusted = bool(settings.SUGGEST_TOKEN) and hmac.compare_digest(token.encode("utf-8"),
+                                                                   settings.SUGGEST_TOKEN.encode("utf-8"))
+    suggestions = CourtFinder.suggest_index.suggest(q, limit, courts_only=not trusted)
+    return {"query": q, "suggestions": suggestions}
+
+
+@router.get("/tiles/{z}/{x}/{y}", summary="Тайл с судами и территориями (GeoJSON)")
+async def get_court_tile(
+        z: int = Path(..., ge=0, le=MAX_ZOOM),
+        x: int = Path(..., ge=0),
+        y: int = Path(..., ge=0),
+        court_type: Optional[str] = Query(None, description="мировой, районный или областной; по умолчанию все"),
+        if_none_match: Optional[str] = Header(None)
+):
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Тайл вне сетки")
+    if court_type is not None:
+        court_type = court_type.lower()
+        if court_type not in COURT_TYPES:
+            raise HTTPException(status_code=422,
+                                detail=f"Неизвестный тип суда '{court_type}', допустимые: {', '.join(COURT_TYPES)}")
+    _require_courts()
+    # Построение территорий (диаграммы Вороного) и отрисовка тайла — в потоке, не в цикле событий
+    renderer = await asyncio.to_thread(CourtFinder.get_tile_renderer)
+    headers = {"Cache-Control": "public, max-age=3600", "ETag": renderer.etag(z, x, y, court_type)}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    _, body = await asyncio.to_thread(renderer.render, z, x, y, court_type)
+    return Response(content=body, media_type="application/geo+json", headers=headers)
@@ -0,0 +1,16 @@
+# app/api/responses.py
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+
+class OrjsonResponse(Response):
+    """JSON-ответ через orjson; bytes отдаются как есть (уже сериализованное тело)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
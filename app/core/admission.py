@@ -0,0 +1,209 @@
+# app/core/admission.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence
+
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)  # в порядке обслуживания
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _PriorityStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits: Deque[float] = deque(maxlen=1000)
+
+    def to_dict(self) -> Dict:
+        waits = sorted(self.waits)
+        return {
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected,
+            "rejected_timeout": self.timed_out,
+            "queue_wait_p50_ms": round(waits[len(waits) // 2] * 1000, 2) if waits else None,
+            "queue_wait_p99_ms": round(waits[int(len(waits) * 0.99)] * 1000, 2) if waits else None,
+        }
+
+
+class AdmissionController:
+    """Ограничивает число одновременно обрабатываемых запросов.
+
+    Запросы сверх max_concurrent ждут в ограниченных очередях по приоритетам. Освободившееся
+    место получает первый ожидающий интерактивный запрос, и только если таких нет — пакетный.
+    Пакетные запросы занимают не больше bulk_share мест, чтобы всплеск пакетной нагрузки
+    не вытеснял интерактивную. Если очередь полна или ожидание дольше queue_timeout, запрос
+    сразу отклоняется (Rejected) с оценкой, через сколько секунд стоит повторить.
+    """
+
+    def __init__(self, max_concurrent: int, queue_limits: Dict[str, int], queue_timeout: float,
+                 bulk_share: float = 0.5):
+        self.max_concurrent = max_concurrent
+        self.queue_limits = queue_limits
+        self.queue_timeout = queue_timeout
+        self.bulk_limit = max(1, int(max_concurrent * bulk_share))
+        self.active = {priority: 0 for priority in PRIORITIES}
+        self.queues: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self.stats = {priority: _PriorityStats() for priority in PRIORITIES}
+        self.service_time = 0.5  # скользящее среднее времени обработки, с
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self.active.values())
+
+    def _can_start(self, priority: str) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            return False
+        return priority != PRIORITY_BULK or self.active[PRIORITY_BULK] < self.bulk_limit
+
+    def retry_after(self, priority: str) -> int:
+        ahead = sum(len(self.queues[p]) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        return max(1, math.ceil((ahead + 1) * self.service_time / self.max_concurrent))
+
+    async def acquire(self, priority: str) -> float:
+        """Ждёт места для запроса; возвращает время ожидания в очереди (с)."""
+        stats = self.stats[priority]
+        if not any(self.queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1]) and self._can_start(priority):
+            self.active[priority] += 1
+            stats.admitted += 1
+            stats.waits.append(0.0)
+            return 0.0
+
+        queue = self.queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            stats.rejected += 1
+            raise Rejected("queue_full", self.retry_after(priority))
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                queue.remove(waiter)
+                waiter.cancel()
+                stats.timed_out += 1
+                raise Rejected("queue_timeout", self.retry_after(priority))
+            # место выдано в момент истечения таймаута — пользуемся им
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(priority, 0.0)
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+        wait = time.monotonic() - started
+        stats.admitted += 1
+        stats.waits.append(wait)
+        return wait
+
+    def release(self, priority: str, service_time: Optional[float] = None):
+        self.active[priority] -= 1
+        if service_time:
+            self.service_time = 0.9 * self.service_time + 0.1 * service_time
+        for candidate in PRIORITIES:
+            queue = self.queues[candidate]
+            while queue and self._can_start(candidate):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.active[candidate] += 1
+                waiter.set_result(None)
+            if queue and self.in_flight >= self.max_concurrent:
+                break
+
+    def snapshot(self) -> Dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "bulk_limit": self.bulk_limit,
+            "in_flight": dict(self.active),
+            "queued": {priority: len(queue) for priority, queue in self.queues.items()},
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "priorities": {priority: stats.to_dict() for priority, stats in self.stats.items()},
+        }
+
+
+def request_priority(scope, priority_header: bytes) -> str:
+    """Приоритет запроса по заголовку: «bulk» — пакетный, иначе интерактивный."""
+    for name, value in scope.get("headers", []):
+        if name == priority_header and value.strip().lower() == PRIORITY_BULK.encode("latin-1"):
+            return PRIORITY_BULK
+    return PRIORITY_INTERACTIVE
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: пропускает запросы к тяжёлым эндпоинтам через AdmissionController.
+
+    Приоритет берётся из заголовка priority_header («bulk» — пакетный, иначе интерактивный).
+    Отклонённый запрос получает 429 с Retry-After, не доходя до обработчика. Время ожидания
+    в очереди добавляется в ответ заголовком Server-Timing.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: Sequence[str],
+                 priority_header: str = "x-request-priority"):
+        self.app = app
+        self.controller = controller
+        self.paths = tuple(path for path in paths if path)
+        self.priority_header = priority_header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        priority = request_priority(scope, self.priority_header)
+        try:
+            wait = await self.controller.acquire(priority)
+        except Rejected as e:
+            logger.warning(f"Запрос {scope['method']} {scope['path']} ({priority}) отклонён: {e.reason}, "
+                           f"повтор через {e.retry_after} с")
+            await self._reject(send, e)
+            return
+
+        timing = f"queue;dur={wait * 1000:.1f}".encode("latin-1")
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing)]
+            await send(message)
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.controller.release(priority, time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(send, error: Rejected):
+        body = orjson.dumps({"status": "error", "detail": "Сервис перегружен, повторите запрос позже",
+                             "reason": error.reason})
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(error.retry_after).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    queue_limits={PRIORITY_INTERACTIVE: settings.ADMISSION_QUEUE_INTERACTIVE,
+                  PRIORITY_BULK: settings.ADMISSION_QUEUE_BULK},
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    bulk_share=settings.ADMISSION_BULK_SHARE,
+)
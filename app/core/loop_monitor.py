@@ -0,0 +1,253 @@
+# app/core/loop_monitor.py
+import asyncio
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+class _ActiveRequest:
+    __slots__ = ("id", "label", "started", "profile", "samples")
+
+    def __init__(self, request_id: int, label: str, profile: bool):
+        self.id = request_id
+        self.label = label
+        self.started = time.monotonic()
+        self.profile = profile
+        self.samples: Dict[str, int] = {}
+
+
+# Запрос, к которому относится текущая задача; задачи, созданные при его обработке, наследуют его
+_current_request: ContextVar[Optional[_ActiveRequest]] = ContextVar("current_request", default=None)
+
+
+class LoopMonitor:
+    """Следит за задержкой событийного цикла и снимает стеки его потока.
+
+    Корутина в цикле обновляет «пульс» каждые interval секунд, а отдельный поток-сторож
+    проверяет его. Если пульса нет дольше stall_threshold, цикл чем-то заблокирован:
+    сторож снимает стек потока цикла и определяет, какой запрос выполнялся, по текущей задаче
+    цикла. Запрос задачи берётся из контекста, в котором она создана (фабрика задач цикла),
+    поэтому блокировку в дочерней задаче — геокодировании, запросе к sudrf.ru — тоже видно.
+    Тот же поток периодически снимает стеки для запросов, отмеченных к профилированию.
+    """
+
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.2, sample_interval: float = 0.005,
+                 max_events: int = 100):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.sample_interval = sample_interval
+        self.events: Deque[Dict] = deque(maxlen=max_events)
+        self.lags: Deque[float] = deque(maxlen=1000)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.active: Dict[int, _ActiveRequest] = {}
+        self._ids = itertools.count(1)
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._previous_task_factory = None
+        self._task_requests: Dict[int, _ActiveRequest] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._previous_task_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._create_task)
+        self._task = self._loop.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Мониторинг событийного цикла запущен (порог блокировки {self.stall_threshold} с)")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+        if self._loop is not None and self._loop.get_task_factory() == self._create_task:
+            self._loop.set_task_factory(self._previous_task_factory)
+
+    def _create_task(self, loop, coro, **kwargs):
+        if self._previous_task_factory is not None:
+            task = self._previous_task_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        request = context.get(_current_request) if context is not None else _current_request.get()
+        if request is not None:
+            self._task_requests[id(task)] = request
+            task.add_done_callback(self._forget_task)
+        return task
+
+    def _forget_task(self, task: asyncio.Task):
+        self._task_requests.pop(id(task), None)
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def register(self, label: str, profile: bool) -> _ActiveRequest:
+        """Регистрирует запрос текущей задачи; вызывается в задаче, обрабатывающей запрос."""
+        request = _ActiveRequest(next(self._ids), label, profile)
+        self.active[request.id] = request
+        _current_request.set(request)
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_requests[id(task)] = request
+        return request
+
+    def unregister(self, request: _ActiveRequest):
+        self.active.pop(request.id, None)
+        task = asyncio.current_task()
+        if task is not None and self._task_requests.get(id(task)) is request:
+            del self._task_requests[id(task)]
+
+    def _loop_stack(self) -> List:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(frame)
+            frame = frame.f_back
+        return stack
+
+    def _running_request(self) -> Optional[_ActiveRequest]:
+        """Запрос задачи, которая сейчас выполняется в цикле (вызывается из потока-сторожа)."""
+        if self._loop is None:
+            return None
+        task = asyncio.current_task(self._loop)
+        return self._task_requests.get(id(task)) if task is not None else None
+
+    def _watch(self):
+        stalled_since = None
+        while not self._stopped.is_set():
+            profiling = any(request.profile for request in list(self.active.values()))
+            time.sleep(self.sample_interval if profiling else self.interval / 2)
+            stack = None
+
+            if time.monotonic() - self._heartbeat > self.stall_threshold:
+                if stalled_since != self._heartbeat:
+                    stalled_since = self._heartbeat
+                    stack = self._loop_stack()
+                    self._record_stall(stack)
+            if profiling:
+                stack = stack or self._loop_stack()
+                request = self._running_request()
+                if request is not None and request.profile:
+                    folded = ";".join(_frame_label(frame) for frame in reversed(stack))
+                    request.samples[folded] = request.samples.get(folded, 0) + 1
+
+    def _record_stall(self, stack: List):
+        self.stalls += 1
+        request = self._running_request()
+        event = {
+            "at": time.time(),
+            "blocked_for_ms": round((time.monotonic() - self._heartbeat) * 1000, 1),
+            "request": request.label if request else None,
+            "in_flight": [r.label for r in list(self.active.values())],
+            "stack": [_frame_label(frame) for frame in stack[:20]],
+        }
+        self.events.append(event)
+        logger.warning(f"Событийный цикл заблокирован дольше {self.stall_threshold} с, "
+                       f"выполняется запрос: {event['request']}, место: {event['stack'][:3]}")
+
+    def stats(self) -> Dict:
+        lags = sorted(self.lags)
+        return {
+            "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 2) if lags else None,
+            "lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else None,
+            "lag_max_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "in_flight": len(self.active),
+            "recent_stalls": list(self.events)[-10:],
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware: регистрирует запросы в LoopMonitor и профилирует выбранные.
+
+    Запрос профилируется, если в заголовке profile_header передан profile_token или если он
+    попал в долю sample_rate. Сэмплы стека сохраняются в формате «folded stacks»
+    (по строке «кадр;кадр;кадр количество»), который понимают flamegraph.pl и speedscope.
+    Middleware написана на чистом ASGI, чтобы обработчик выполнялся в той же задаче, что и
+    регистрация запроса.
+    """
+
+    def __init__(self, app, monitor: LoopMonitor, profile_dir: str = "profiles", sample_rate: float = 0.0,
+                 profile_header: str = "x-profile", profile_token: str = ""):
+        self.app = app
+        self.monitor = monitor
+        self.profile_dir = Path(profile_dir)
+        self.sample_rate = sample_rate
+        self.profile_header = profile_header.lower().encode("latin-1")
+        self.profile_token = profile_token.encode("latin-1")
+
+    def _should_profile(self, scope) -> bool:
+        if self.profile_token:
+            for name, value in scope.get("headers", []):
+                if name == self.profile_header and value == self.profile_token:
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        active = self.monitor.register(f"{scope['method']} {scope['path']}", self._should_profile(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.unregister(active)
+            if active.profile and active.samples:
+                # Запись файла — в потоке, чтобы сама не блокировала цикл
+                await asyncio.to_thread(self._write_profile, active)
+
+    def _write_profile(self, request: _ActiveRequest):
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            name = request.label.replace(" ", "_").replace("/", "_").strip("_")
+            path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{request.id}-{name}.folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in request.samples.items():
+                    f.write(f"{stack} {count}\n")
+            logger.info(f"Профиль запроса {request.label} сохранён в {path}")
+        except OSError as e:
+            logger.error(f"Не удалось сохранить профиль запроса: {str(e)}")
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_LAG_INTERVAL,
+    stall_threshold=settings.LOOP_STALL_THRESHOLD,
+    sample_interval=settings.PROFILE_SAMPLE_INTERVAL,
+)
@@ -0,0 +1,143 @@
+# app/core/memory.py
+import gc
+import linecache
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Объекты, которые принадлежат интерпретатору, а не структуре данных
+_SKIP_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_sizeof(obj, seen: Optional[Set[int]] = None) -> int:
+    """Примерный размер объекта вместе со всем, на что он ссылается (sys.getsizeof по графу).
+
+    Объекты из seen не считаются, поэтому общий seen для нескольких структур распределяет
+    общие данные по первой из них. Память вне кучи Python (mmap, буферы C-расширений)
+    не учитывается. Контейнеры копируются перед обходом: структуры могут меняться
+    из других потоков.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        try:
+            size += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, (str, bytes, bytearray, int, float, bool, memoryview)) or current is None:
+            continue
+        if isinstance(current, dict):
+            for key, value in list(current.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(list(current))
+        else:
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for slot in getattr(type(current), "__slots__", ()):
+                value = getattr(current, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return size
+
+
+def process_rss() -> Optional[int]:
+    """Резидентная память процесса в байтах (Linux), иначе пиковая из getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class AllocationTracer:
+    """Снимки tracemalloc по запросу: включается явно, потому что замедляет каждое выделение памяти.
+
+    Каждый снимок сравнивается с предыдущим, так что два вызова подряд показывают, где выросла
+    память между ними. Хранится только последний снимок.
+    """
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"Трассировка выделений памяти включена ({frames} кадров стека)")
+        return self.status()
+
+    def stop(self) -> Dict:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("Трассировка выделений памяти выключена")
+        with self._lock:
+            self._previous = None
+            self._previous_at = None
+        return self.status()
+
+    def status(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": True, "frames": tracemalloc.get_traceback_limit(), "traced_bytes": current,
+                "peak_bytes": peak, "overhead_bytes": tracemalloc.get_tracemalloc_memory()}
+
+    def snapshot(self, limit: int = 25, group_by: str = "lineno") -> Dict:
+        """Крупнейшие места выделения памяти и разница с предыдущим снимком."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Трассировка выделений памяти не включена")
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        with self._lock:
+            previous, previous_at = self._previous, self._previous_at
+            self._previous, self._previous_at = snapshot, time.monotonic()
+        result = {**self.status(), "top": [_stat(stat) for stat in snapshot.statistics(group_by)[:limit]]}
+        if previous is not None:
+            result["diff_interval_s"] = round(time.monotonic() - previous_at, 1)
+            result["diff"] = [_stat(stat) for stat in snapshot.compare_to(previous, group_by)[:limit]]
+        return result
+
+
+def _stat(stat) -> Dict:
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    item = {"where": frames[0] if len(frames) == 1 else frames, "bytes": stat.size, "count": stat.count}
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        item["bytes_diff"] = stat.size_diff
+        item["count_diff"] = stat.count_diff
+    return item
+
+
+allocation_tracer = AllocationTracer()
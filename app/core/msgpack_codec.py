@@ -0,0 +1,238 @@
+# app/core/msgpack_codec.py
+"""Кодек MessagePack (https://msgpack.org) для потокового API.
+
+Поддерживаются nil, bool, целые, float, str, bin, массивы и словари — всё, что бывает в
+запросах и ответах API; расширения (ext) не поддерживаются.
+"""
+import struct
+from typing import Any, Dict, Iterator, List
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/msgpack", "application/vnd.msgpack")
+
+_UINT8, _UINT16, _UINT32, _UINT64 = (struct.Struct(f">{code}") for code in "BHIQ")
+_INT8, _INT16, _INT32, _INT64 = (struct.Struct(f">{code}") for code in "bhiq")
+_FLOAT32, _FLOAT64 = struct.Struct(">f"), struct.Struct(">d")
+
+# Закодированные короткие ключи словарей: они повторяются в каждом ответе. Кэшируются только
+# ключи — их задаёт сервер; значения могут прийти от клиента и не должны оседать в памяти процесса
+_SHORT_STRINGS: Dict[str, bytes] = {}
+_SHORT_STRINGS_LIMIT = 4096
+
+
+class MsgpackError(ValueError):
+    pass
+
+
+def accepts_msgpack(accept: str) -> bool:
+    accept = accept.lower()
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def _pack_length(out: bytearray, length: int, fix_base: int, fix_limit: int, codes: bytes):
+    if length < fix_limit:
+        out.append(fix_base | length)
+    elif codes[0] and length < 0x100:
+        out.append(codes[0])
+        out.append(length)
+    elif length < 0x10000:
+        out.append(codes[1])
+        out += _UINT16.pack(length)
+    elif length < 0x100000000:
+        out.append(codes[2])
+        out += _UINT32.pack(length)
+    else:
+        raise MsgpackError(f"Слишком длинное значение: {length}")
+
+
+def _pack_key(out: bytearray, key: Any):
+    encoded = _SHORT_STRINGS.get(key) if isinstance(key, str) else None
+    if encoded is not None:
+        out += encoded
+        return
+    start = len(out)
+    _pack(out, key)
+    if isinstance(key, str) and len(out) - start <= 32 and len(_SHORT_STRINGS) < _SHORT_STRINGS_LIMIT:
+        _SHORT_STRINGS[key] = bytes(out[start:])
+
+
+def _pack(out: bytearray, obj: Any):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif obj >= 0:
+            if obj < 0x100:
+                out += b"\xcc" + _UINT8.pack(obj)
+            elif obj < 0x10000:
+                out += b"\xcd" + _UINT16.pack(obj)
+            elif obj < 0x100000000:
+                out += b"\xce" + _UINT32.pack(obj)
+            else:
+                out += b"\xcf" + _UINT64.pack(obj)
+        elif obj >= -0x80:
+            out += b"\xd0" + _INT8.pack(obj)
+        elif obj >= -0x8000:
+            out += b"\xd1" + _INT16.pack(obj)
+        elif obj >= -0x80000000:
+            out += b"\xd2" + _INT32.pack(obj)
+        else:
+            out += b"\xd3" + _INT64.pack(obj)
+    elif isinstance(obj, float):
+        out += b"\xcb" + _FLOAT64.pack(obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        _pack_length(out, len(data), 0xa0, 32, b"\xd9\xda\xdb")
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        _pack_length(out, len(data), 0, 0, b"\xc4\xc5\xc6")
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        _pack_length(out, len(obj), 0x90, 16, b"\x00\xdc\xdd")
+        for item in obj:
+            _pack(out, item)
+    elif isinstance(obj, dict):
+        _pack_length(out, len(obj), 0x80, 16, b"\x00\xde\xdf")
+        for key, value in obj.items():
+            _pack_key(out, key)
+            _pack(out, value)
+    else:
+        raise MsgpackError(f"Тип {type(obj).__name__} не поддерживается")
+
+
+def packb(obj: Any) -> bytes:
+    out = bytearray()
+    _pack(out, obj)
+    return bytes(out)
+
+
+class _Incomplete(Exception):
+    pass
+
+
+class Unpacker:
+    """Потоковый декодер: feed() добавляет полученные байты, итерация отдаёт готовые объекты.
+
+    Незаконченный объект остаётся в буфере до следующего feed(). Буфер ограничен
+    max_buffer байтами, чтобы один огромный объект не занял память, вложенность массивов и
+    словарей — max_depth уровнями, чтобы глубокая вложенность не исчерпала стек.
+    """
+
+    def __init__(self, max_buffer: int = 1 << 20, max_depth: int = 32):
+        self.max_buffer = max_buffer
+        self.max_depth = max_depth
+        self._buffer = bytearray()
+        self._pos = 0
+        self._depth = 0
+
+    def feed(self, data: bytes):
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._pos = 0
+        self._buffer += data
+        if len(self._buffer) > self.max_buffer:
+            raise MsgpackError(f"Объект длиннее {self.max_buffer} байт")
+
+    @property
+    def pending(self) -> int:
+        """Число байт незаконченного объекта."""
+        return len(self._buffer) - self._pos
+
+    def __iter__(self) -> Iterator[Any]:
+        while self._pos < len(self._buffer):
+            start = self._pos
+            self._depth = 0
+            try:
+                obj = self._unpack()
+            except _Incomplete:
+                self._pos = start
+                return
+            except UnicodeDecodeError as e:
+                raise MsgpackError(f"Строка не в UTF-8: {e}")
+            yield obj
+
+    def _take(self, size: int) -> bytes:
+        end = self._pos + size
+        if end > len(self._buffer):
+            raise _Incomplete()
+        data = bytes(self._buffer[self._pos:end])
+        self._pos = end
+        return data
+
+    def _number(self, fmt: struct.Struct):
+        return fmt.unpack(self._take(fmt.size))[0]
+
+    def _nested(self):
+        self._depth += 1
+        if self._depth > self.max_depth:
+            raise MsgpackError(f"Вложенность глубже {self.max_depth} уровней")
+
+    def _array(self, length: int) -> List:
+        self._nested()
+        result = [self._unpack() for _ in range(length)]
+        self._depth -= 1
+        return result
+
+    def _map(self, length: int) -> dict:
+        self._nested()
+        result = {}
+        for _ in range(length):
+            key = self._unpack()
+            if isinstance(key, (list, dict)):
+                raise MsgpackError("Ключ словаря не может быть массивом или словарём")
+            result[key] = self._unpack()
+        self._depth -= 1
+        return result
+
+    def _unpack(self) -> Any:
+        code = self._take(1)[0]
+        if code < 0x80:
+            return code
+        if code >= 0xe0:
+            return code - 0x100
+        if code < 0x90:
+            return self._map(code & 0x0f)
+        if code < 0xa0:
+            return self._array(code & 0x0f)
+        if code < 0xc0:
+            return self._take(code & 0x1f).decode("utf-8")
+        if code == 0xc0:
+            return None
+        if code == 0xc2:
+            return False
+        if code == 0xc3:
+            return True
+        if code in (0xc4, 0xc5, 0xc6):
+            return self._take(self._number((_UINT8, _UINT16, _UINT32)[code - 0xc4]))
+        if code == 0xca:
+            return self._number(_FLOAT32)
+        if code == 0xcb:
+            return self._number(_FLOAT64)
+        if 0xcc <= code <= 0xcf:
+            return self._number((_UINT8, _UINT16, _UINT32, _UINT64)[code - 0xcc])
+        if 0xd0 <= code <= 0xd3:
+            return self._number((_INT8, _INT16, _INT32, _INT64)[code - 0xd0])
+        if code in (0xd9, 0xda, 0xdb):
+            return self._take(self._number((_UINT8, _UINT16, _UINT32)[code - 0xd9])).decode("utf-8")
+        if code in (0xdc, 0xdd):
+            return self._array(self._number((_UINT16, _UINT32)[code - 0xdc]))
+        if code in (0xde, 0xdf):
+            return self._map(self._number((_UINT16, _UINT32)[code - 0xde]))
+        raise MsgpackError(f"Тип 0x{code:02x} не поддерживается")
+
+
+def unpackb(data: bytes) -> Any:
+    unpacker = Unpacker(max_buffer=max(len(data), 1))
+    unpacker.feed(data)
+    objects = list(unpacker)
+    if len(objects) != 1 or unpacker.pending:
+        raise MsgpackError("Ожидался ровно один объект")
+    return objects[0]
@@ -0,0 +1,141 @@
+# app/core/offload.py
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+STAGE_SUDRF_PARSE = "sudrf_parse"
+STAGE_NEAREST = "nearest"
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float, float]:
+    """Выполняется в процессе пула: результат и моменты начала и конца (time.time)."""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+def _preload(modules: Sequence[str]):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _noop():
+    return None
+
+
+class _StageStats:
+    def __init__(self, window: int = 500):
+        self.inline = 0
+        self.offloaded = 0
+        self.fallbacks = 0
+        self.queue_ms: Deque[float] = deque(maxlen=window)
+        self.run_ms: Deque[float] = deque(maxlen=window)
+
+    @staticmethod
+    def _percentiles(values: Deque[float]) -> Dict:
+        if not values:
+            return {"p50": None, "p95": None}
+        ordered = sorted(values)
+        return {"p50": round(ordered[len(ordered) // 2], 2),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)}
+
+    def snapshot(self) -> Dict:
+        return {"inline": self.inline, "offloaded": self.offloaded, "fallbacks": self.fallbacks,
+                "queue_ms": self._percentiles(self.queue_ms), "run_ms": self._percentiles(self.run_ms)}
+
+
+class CpuOffload:
+    """Вынос вычислительных этапов обработки запроса из потока событийного цикла в пул процессов.
+
+    Разбор HTML и расчёт расстояний выполняются на чистом Python и держат GIL, поэтому пул
+    потоков цикл не разгрузил бы. Маленькие задачи (size меньше порога этапа) выполняются на
+    месте: пересылка аргументов дороже самой работы. В пул одновременно отправляется не больше
+    max_pending задач, остальные ждут очереди; время ожидания (включая очередь самого пула)
+    и время выполнения учитываются по этапам. Если процесс пула упал, пул пересоздаётся,
+    а задача выполняется на месте. processes=0 — всё выполняется на месте.
+    """
+
+    def __init__(self, processes: int = 2, max_pending: int = 8, thresholds: Optional[Dict[str, int]] = None,
+                 preload: Sequence[str] = ()):
+        self.processes = processes
+        self.preload = tuple(preload)
+        self.max_pending = max_pending
+        self.thresholds = thresholds or {}
+        self.stages: Dict[str, _StageStats] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+
+    def start(self):
+        """Запускает процессы пула заранее, чтобы первый тяжёлый запрос не ждал их старта."""
+        if self.processes and self._pool is None:
+            # spawn: fork процесса с потоками (сторож цикла, пулы) небезопасен
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_preload, initargs=(self.preload,))
+            for _ in range(self.processes):
+                self._pool.submit(_noop)
+            logger.info(f"Пул процессов для вычислений запущен: {self.processes}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _stage(self, stage: str) -> _StageStats:
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = _StageStats()
+        return stats
+
+    async def run(self, stage: str, size: int, fn: Callable, *args):
+        """fn(*args) в пуле процессов или на месте, если size меньше порога этапа.
+
+        fn должна быть функцией уровня модуля, а аргументы — компактными: они сериализуются.
+        """
+        stats = self._stage(stage)
+        if not self.processes or size < self.thresholds.get(stage, 0):
+            stats.inline += 1
+            return fn(*args)
+        if self._pool is None:
+            self.start()
+        with tracer.span(f"offload.{stage}", size=size) as span:
+            submitted = time.time()
+            async with self._slots:
+                try:
+                    result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                        self._pool, _timed, fn, *args)
+                except BrokenProcessPool:
+                    logger.error(f"Пул процессов недоступен, этап {stage} выполняется на месте")
+                    self.shutdown()
+                    stats.fallbacks += 1
+                    span.set("fallback", True)
+                    return fn(*args)
+            stats.offloaded += 1
+            stats.queue_ms.append(max(0.0, started - submitted) * 1000)
+            stats.run_ms.append((finished - started) * 1000)
+            span.set("queue_ms", round(stats.queue_ms[-1], 2))
+            span.set("run_ms", round(stats.run_ms[-1], 2))
+        return result
+
+    def snapshot(self) -> Dict:
+        return {"processes": self.processes, "max_pending": self.max_pending, "thresholds": self.thresholds,
+                "stages": {stage: stats.snapshot() for stage, stats in self.stages.items()}}
+
+
+offload = CpuOffload(
+    processes=settings.OFFLOAD_PROCESSES,
+    max_pending=settings.OFFLOAD_MAX_PENDING,
+    thresholds={STAGE_SUDRF_PARSE: settings.OFFLOAD_SUDRF_PARSE_MIN_BYTES,
+                STAGE_NEAREST: settings.OFFLOAD_NEAREST_MIN_POINTS},
+    preload=("app.services.cpu_tasks",),
+)
@@ -0,0 +1,327 @@
+# app/core/tracing.py
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = b"traceparent"
+# Span.SpanKind из opentelemetry-proto: корень HTTP-запроса — SERVER, этапы внутри — INTERNAL
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+# version-trace_id-parent_id-flags (W3C Trace Context); у версий после 00 могут быть поля дальше
+TRACEPARENT_RE = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?")
+ZERO_TRACE_ID = "0" * 32
+ZERO_SPAN_ID = "0" * 16
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_id, sampled) из заголовка traceparent; None, если заголовок неверен
+    и, по W3C, его нужно игнорировать и начинать новую трассировку."""
+    match = TRACEPARENT_RE.fullmatch(value.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    if version == "ff" or (version == "00" and rest) or trace_id == ZERO_TRACE_ID or parent_id == ZERO_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class Span:
+    """Этап обработки запроса: имя, время начала и конца (нс), атрибуты и статус ошибки."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error",
+                 "_token")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict,
+                 kind: int = SPAN_KIND_INTERNAL):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def set(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def fail(self, message: str):
+        """Этап завершился ошибкой, которая была обработана и не вышла за его пределы."""
+        self.error = message
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.error = f"{exc_type.__name__}: {exc}"
+        elif exc_type is not None:
+            self.set("cancelled", True)
+        self.end_ns = time.time_ns()
+        tracer.export(self)
+        return False
+
+
+class _NoopSpan:
+    """Этап запроса, не попавшего в выборку: ничего не записывает."""
+
+    recording = False
+    trace_id = None
+
+    def set(self, key: str, value):
+        pass
+
+    def fail(self, message: str):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span():
+    """Текущий этап запроса (или заглушка вне трассировки) — чтобы дописать атрибуты."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(span: Span) -> Dict:
+    """Этап в кодировке OTLP/JSON (opentelemetry-proto, Span)."""
+    item = {
+        "traceId": span.trace_id, "spanId": span.span_id, "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns), "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        item["parentSpanId"] = span.parent_id
+    return item
+
+
+def otlp_request(spans: List[Span], service_name: str) -> Dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [otlp_span(span) for span in spans]}],
+    }]}
+
+
+class FileSpanWriter:
+    """Пачка этапов — строка OTLP/JSON в файле (формат файлового экспортёра OpenTelemetry Collector)."""
+
+    def __init__(self, path: str, service_name: str):
+        self.path = Path(path)
+        self.service_name = service_name
+
+    def _write(self, line: bytes):
+        with open(self.path, "ab") as f:
+            f.write(line)
+
+    async def write(self, spans: List[Span]):
+        await asyncio.to_thread(self._write, orjson.dumps(otlp_request(spans, self.service_name)) + b"\n")
+
+    async def close(self):
+        pass
+
+
+class OtlpHttpSpanWriter:
+    """Отправка пачек в коллектор по OTLP/HTTP с JSON (POST {endpoint}/v1/traces)."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service_name = service_name
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def write(self, spans: List[Span]):
+        response = await self._client.post(self.url, content=orjson.dumps(otlp_request(spans, self.service_name)),
+                                           headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class Tracer:
+    """Трассировка запросов с выборкой в начале запроса (head-based) и пакетной выгрузкой.
+
+    Решение о записи принимается один раз для корня запроса: по флагу sampled во входящем
+    заголовке traceparent (W3C Trace Context), иначе с вероятностью sample_rate. Этапы
+    невыбранных запросов — заглушки, поэтому трассировка почти ничего не стоит. Завершённые
+    этапы копятся в очереди (не больше max_queue, лишние отбрасываются) и выгружаются пачками
+    по batch_size или раз в flush_interval секунд, как журнал решений.
+    """
+
+    def __init__(self, writer, sample_rate: float = 0.01, max_queue: int = 10000, batch_size: int = 512,
+                 flush_interval: float = 2.0):
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Deque[Span] = deque()
+        self.sampled = 0
+        self.exported = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """Корень запроса. Родитель из traceparent продолжает чужую трассировку."""
+        if self.writer is None:
+            return NOOP_SPAN
+        trace_id, parent_id, sampled = None, None, None
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        self.sampled += 1
+        return Span(trace_id or os.urandom(16).hex(), parent_id, name, attributes, kind=SPAN_KIND_SERVER)
+
+    def span(self, name: str, **attributes):
+        """Вложенный этап текущего запроса; вне выбранного запроса — заглушка."""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(parent.trace_id, parent.span_id, name, attributes)
+
+    def export(self, span: Span):
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append(span)
+        if self._wakeup is not None and len(self.queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self.writer is None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Трассировка запросов: доля {self.sample_rate}, выгрузка через {type(self.writer).__name__}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            try:
+                await self.writer.write(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                # Трассы — диагностика: пачку, которую не удалось выгрузить, не повторяем
+                self.failed_batches += 1
+                self.dropped += len(batch)
+                logger.warning(f"Не удалось выгрузить {len(batch)} этапов трассировки: {str(e)}")
+                return
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self.writer is not None:
+            await self.flush()
+            await self.writer.close()
+
+    def stats(self) -> Dict:
+        return {"exporter": type(self.writer).__name__ if self.writer else None, "sample_rate": self.sample_rate,
+                "sampled_requests": self.sampled, "queued": len(self.queue), "exported": self.exported,
+                "dropped": self.dropped, "failed_batches": self.failed_batches}
+
+
+class TracingMiddleware:
+    """ASGI-middleware: корневой этап каждого HTTP-запроса и заголовок traceparent в ответе."""
+
+    def __init__(self, app, tracer: "Tracer", skip_paths=("/health",)):
+        self.app = app
+        self.tracer = tracer
+        self.skip_paths = tuple(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_paths):
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == TRACEPARENT_HEADER:
+                traceparent = value.decode("latin-1")
+                break
+        span = self.tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent,
+                                       **{"http.method": scope["method"], "http.target": scope["path"]})
+        if not span.recording:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set("http.status_code", message["status"])
+                header = f"00-{span.trace_id}-{span.span_id}-01".encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (TRACEPARENT_HEADER, header)]}
+            await send(message)
+
+        with span:
+            await self.app(scope, receive, send_with_trace)
+
+
+def _create_writer():
+    if settings.TRACE_EXPORTER == "file":
+        return FileSpanWriter(settings.TRACE_FILE_PATH, settings.TRACE_SERVICE_NAME)
+    if settings.TRACE_EXPORTER == "otlp":
+        return OtlpHttpSpanWriter(settings.TRACE_OTLP_ENDPOINT, settings.TRACE_SERVICE_NAME)
+    return None
+
+
+tracer = Tracer(_create_writer(), sample_rate=settings.TRACE_SAMPLE_RATE, max_queue=settings.TRACE_MAX_QUEUE,
+                batch_size=settings.TRACE_BATCH_SIZE, flush_interval=settings.TRACE_FLUSH_INTERVAL)
@@ -0,0 +1,20 @@
+from sqlalchemy import Boolean, Column, Float, Integer, String, Text
+from app.db.base import Base
+
+
+class LookupAudit(Base):
+    __tablename__ = "lookup_audit"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(Float, nullable=False, index=True)  # время решения, Unix time
+    address = Column(Text, nullable=False)
+    debt_amount = Column(Float)
+    case_type = Column(String(50))
+    latitude = Column(Float)  # координаты адреса, если он геокодировался
+    longitude = Column(Float)
+    court_name = Column(String(255))
+    court_type = Column(String(20))
+    path = Column(String(30), nullable=False)  # как найден суд: territory, nearest, sudrf, ...
+    confidence = Column(String(10))
+    deadline_exceeded = Column(Boolean, default=False)
+    latency_ms = Column(Float)
@@ -3,7 +3,17 @@ import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 from app.api.endpoints.courts import router as courts_router
-from app.services.court_finder import CourtFinder
+from app.api.endpoints.admin import router as admin_router
+from app.core.admission import AdmissionMiddleware, admission
+from app.core.config import settings
+from app.core.loop_monitor import ProfilingMiddleware, loop_monitor
+from app.core.memory import allocation_tracer
+from app.core.offload import offload
+from app.core.tracing import TracingMiddleware, tracer
+from app.services.audit import audit_log
+from app.services.shadow import shadow
+from app.services.shared_cache import shared_cache
+from app.services.warmup import warmup
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -40,25 +50,62 @@ app = FastAPI(
 )
 
 app.include_router(courts_router, prefix="/api")
+app.include_router(admin_router)
+app.add_middleware(
+    ProfilingMiddleware,
+    monitor=loop_monitor,
+    profile_dir=settings.PROFILE_DIR,
+    sample_rate=settings.PROFILE_SAMPLE_RATE,
+    profile_header=settings.PROFILE_HEADER,
+    profile_token=settings.PROFILE_TOKEN,
+)
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    paths=settings.ADMISSION_PATHS.split(","),
+    priority_header=settings.ADMISSION_PRIORITY_HEADER,
+)
+# Снаружи допуска: в корневой этап входит и ожидание в очереди
+app.add_middleware(TracingMiddleware, tracer=tracer)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Инициализация приложения при старте."""
     try:
-        CourtFinder.load_courts_data()
+        if settings.TRACEMALLOC_FRAMES:
+            allocation_tracer.start(settings.TRACEMALLOC_FRAMES)
+        loop_monitor.start()
+        audit_log.start()
+        tracer.start()
+        offload.start()
+        # Данные, индексы и кэши готовятся в фоне; трафик принимается после /health/ready
+        warmup.start()
         logger.info("Приложение успешно запущено")
     except Exception as e:
         logger.error(f"Ошибка при запуске приложения: {str(e)}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Остановка фоновых задач приложения."""
+    await warmup.stop()
+    await shadow.stop()
+    offload.shutdown()
+    await tracer.stop()
+    await loop_monitor.stop()
+    await audit_log.stop()
+    await shared_cache.close()
+
+
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request, exc):
     """Обработка HTTP-исключений с кастомным форматом."""
     return JSONResponse(
         status_code=exc.status_code,
-        content={"status": "error", "detail": exc.detail}
+        content={"status": "error", "detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -74,10 +121,21 @@ async def root():
 @app.get("/health", summary="Проверка состояния API")
 async def health_check():
     """Проверяет состояние приложения."""
-    if not hasattr(app, "courts_loaded"):
-        CourtFinder.load_courts_data()
-        app.courts_loaded = True
-    return {"status": "healthy", "version": app.version}
+    return {"status": "healthy", "version": app.version, "ready": warmup.ready}
+
+
+@app.get("/health/live", summary="Процесс жив (liveness)")
+async def liveness_check():
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", summary="Процесс готов принимать трафик (readiness)")
+async def readiness_check():
+    """503, пока загружаются данные и прогреваются кэши; в ответе — ход прогрева."""
+    state = warmup.snapshot()
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **state})
+    return {"status": "ready", **state}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+# app/services/address_suggest.py
+import heapq
+from bisect import bisect_left, insort
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+MAX_PREFIX_LENGTH = 12
+# Для префиксов с большим числом адресов держим заранее отсортированный по рангу список,
+# чтобы короткий запрос не перебирал весь набор.
+RANKED_POSTINGS_THRESHOLD = 256
+RANKED_SCAN_FACTOR = 4
+
+SOURCE_COURT = "court"
+SOURCE_DEBTOR = "debtor"
+
+
+def normalize_address(address: str) -> str:
+    """Приводит адрес к виду для индексации: нижний регистр, без \\xa0 и ё."""
+    return address.replace("\xa0", " ").lower().replace("ё", "е").strip()
+
+
+def address_key(address: str) -> str:
+    """Ключ адреса для кэшей: нормализованный адрес со схлопнутыми пробелами."""
+    return " ".join(normalize_address(address).split())
+
+
+def tokenize(address: str) -> List[str]:
+    return TOKEN_RE.findall(normalize_address(address))
+
+
+class _Entry:
+    __slots__ = ("id", "address", "normalized", "tokens", "source", "hits")
+
+    def __init__(self, entry_id: int, address: str, normalized: str, tokens: List[str], source: str):
+        self.id = entry_id
+        self.address = address
+        self.normalized = normalized
+        self.tokens = tokens
+        self.source = source
+        self.hits = 1
+
+
+class AddressSuggestIndex:
+    """Префиксный индекс адресов судов и уже обработанных адресов должников.
+
+    Каждое слово адреса индексируется всеми своими префиксами (до MAX_PREFIX_LENGTH символов),
+    поэтому запрос разрешается пересечением нескольких множеств без просмотра всего набора.
+    Для частых префиксов кэшируется список адресов в порядке ранга: новые адреса дописываются
+    в его конец, а полная пересортировка выполняется, когда таких дописанных становится много.
+    Адреса, начинающиеся с запроса целиком, ищутся по отсортированному списку адресов.
+    """
+
+    def __init__(self, max_debtor_entries: int = 50000):
+        self.max_debtor_entries = max_debtor_entries
+        self._entries: Dict[int, _Entry] = {}
+        self._by_address: Dict[str, int] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._debtor_order: "OrderedDict[int, None]" = OrderedDict()
+        self._sorted: List[Tuple[str, int]] = []
+        self._ranked: Dict[str, List[int]] = {}
+        self._ranked_stale: Dict[str, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def debtor_entries(self) -> int:
+        return len(self._debtor_order)
+
+    def build(self, court_addresses: Iterable[str]):
+        """Перестраивает индекс по адресам судов, сохраняя адреса должников."""
+        with self._lock:
+            # Снимок под блокировкой: add() из обработчиков запросов меняет оба словаря
+            debtor_entries = [(self._entries[i].address, self._entries[i].hits) for i in self._debtor_order]
+            self._entries.clear()
+            self._by_address.clear()
+            self._postings.clear()
+            self._debtor_order.clear()
+            self._sorted.clear()
+            self._ranked.clear()
+            self._ranked_stale.clear()
+        for address in court_addresses:
+            self.add(address, SOURCE_COURT)
+        for address, hits in debtor_entries:
+            self.add(address, SOURCE_DEBTOR, hits)
+        logger.info(f"Индекс подсказок адресов построен: {len(self._entries)} адресов")
+
+    def rebuilt(self, court_addresses: Iterable[str]) -> "AddressSuggestIndex":
+        """Новый индекс по адресам судов с адресами должников из этого — для замены целиком."""
+        index = AddressSuggestIndex(self.max_debtor_entries)
+        with self._lock:
+            debtor_entries = [(self._entries[i].address, self._entries[i].hits) for i in self._debtor_order]
+        for address in court_addresses:
+            index.add(address, SOURCE_COURT)
+        for address, hits in debtor_entries:
+            index.add(address, SOURCE_DEBTOR, hits)
+        logger.info(f"Индекс подсказок адресов построен: {len(index)} адресов")
+        return index
+
+    def add(self, address: str, source: str = SOURCE_DEBTOR, hits: int = 1):
+        normalized = normalize_address(address)
+        tokens = TOKEN_RE.findall(normalized)
+        if not tokens:
+            return
+        with self._lock:
+            entry_id = self._by_address.get(normalized)
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                entry.hits += hits
+                if entry_id in self._debtor_order:
+                    self._debtor_order.move_to_end(entry_id)
+                return
+
+            entry_id = self._next_id
+            self._next_id += 1
+            entry = _Entry(entry_id, address.replace("\xa0", " ").strip(), normalized, tokens, source)
+            entry.hits = hits
+            self._entries[entry_id] = entry
+            self._by_address[normalized] = entry_id
+            insort(self._sorted, (normalized, entry_id))
+            for token in set(tokens):
+                for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                    key = token[:length]
+                    self._postings.setdefault(key, set()).add(entry_id)
+                    ranked = self._ranked.get(key)
+                    if ranked is not None:
+                        ranked.append(entry_id)
+                        self._ranked_stale[key] += 1
+
+            if source == SOURCE_DEBTOR:
+                self._debtor_order[entry_id] = None
+                if len(self._debtor_order) > self.max_debtor_entries:
+                    evicted_id, _ = self._debtor_order.popitem(last=False)
+                    self._remove(evicted_id)
+                    self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        del self._by_address[entry.normalized]
+        del self._sorted[bisect_left(self._sorted, (entry.normalized, entry_id))]
+        for token in set(entry.tokens):
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                key = token[:length]
+                postings = self._postings.get(key)
+                if postings is not None:
+                    postings.discard(entry_id)
+                    if not postings:
+                        del self._postings[key]
+                        self._ranked.pop(key, None)
+                        self._ranked_stale.pop(key, None)
+
+    def _static_rank(self, entry_id: int):
+        entry = self._entries[entry_id]
+        return entry.source == SOURCE_COURT, entry.hits, -len(entry.normalized)
+
+    def _ranked_postings(self, key: str) -> List[int]:
+        ranked = self._ranked.get(key)
+        postings = self._postings[key]
+        if ranked is None or self._ranked_stale[key] * 10 > len(postings):
+            ranked = sorted(postings, key=self._static_rank, reverse=True)
+            self._ranked[key] = ranked
+            self._ranked_stale[key] = 0
+        return ranked
+
+    def _matches(self, entry_id: int, query_tokens: List[str], courts_only: bool = False) -> bool:
+        entry = self._entries[entry_id]
+        if courts_only and entry.source != SOURCE_COURT:
+            return False
+        return all(any(t.startswith(q) for t in entry.tokens) for q in query_tokens)
+
+    def _leading(self, normalized_query: str) -> Tuple[int, int]:
+        """Границы адресов в _sorted, начинающихся с запроса."""
+        low = bisect_left(self._sorted, (normalized_query,))
+        return low, bisect_left(self._sorted, (normalized_query + "\uffff",), low)
+
+    def _candidates(self, normalized_query: str, query_tokens: List[str], limit: int,
+                    courts_only: bool = False) -> List[int]:
+        keys = []
+        for token in query_tokens:
+            key = token[:MAX_PREFIX_LENGTH]
+            if key not in self._postings:
+                return []
+            keys.append(key)
+        keys.sort(key=lambda k: len(self._postings[k]))
+        smallest, others = keys[0], [self._postings[k] for k in keys[1:]]
+        # Полная проверка слов нужна для слов длиннее индексируемого префикса и для отбора по источнику
+        check = courts_only or any(len(token) > MAX_PREFIX_LENGTH for token in query_tokens)
+
+        if len(self._postings[smallest]) <= RANKED_POSTINGS_THRESHOLD:
+            candidates = self._postings[smallest]
+            for found in others:
+                candidates = candidates & found
+                if not candidates:
+                    return []
+            if check:
+                return [i for i in candidates if self._matches(i, query_tokens, courts_only)]
+            return list(candidates)
+
+        # Большой префикс: просматриваем список в порядке ранга и останавливаемся,
+        # набрав с запасом нужное число подходящих адресов. Адреса, начинающиеся с запроса,
+        # ранжируются в suggest выше остальных: если их немного, они берутся все сразу,
+        # иначе просмотр продолжается, пока их не наберётся limit.
+        wanted = limit * RANKED_SCAN_FACTOR
+        low, high = self._leading(normalized_query)
+        if high - low <= RANKED_POSTINGS_THRESHOLD:
+            result = [entry_id for _, entry_id in self._sorted[low:high]
+                      if self._matches(entry_id, query_tokens, courts_only)]
+            wanted_leading = 0
+        else:
+            result = []
+            wanted_leading = limit
+        postings = self._postings[smallest]
+        seen: Set[int] = set(result)
+        leading = 0
+        for entry_id in self._ranked_postings(smallest):
+            if entry_id in seen or entry_id not in postings:
+                continue
+            seen.add(entry_id)
+            if all(entry_id in found for found in others) and (
+                    not check or self._matches(entry_id, query_tokens, courts_only)):
+                result.append(entry_id)
+                if wanted_leading and self._entries[entry_id].normalized.startswith(normalized_query):
+                    leading += 1
+                if len(result) >= wanted and leading >= wanted_leading:
+                    break
+        return result
+
+    def suggest(self, query: str, limit: int = 5, courts_only: bool = False) -> List[Dict]:
+        """Возвращает до limit адресов, все слова которых начинаются со слов запроса;
+        с courts_only — только адреса судов, без адресов должников."""
+        normalized_query = normalize_address(query)
+        query_tokens = TOKEN_RE.findall(normalized_query)
+        if not query_tokens or limit <= 0:
+            return []
+        with self._lock:
+            candidates = self._candidates(normalized_query, query_tokens, limit, courts_only)
+            if not candidates:
+                return []
+            entries = self._entries
+
+            def rank(entry_id: int):
+                entry = entries[entry_id]
+                return (
+                    entry.normalized.startswith(normalized_query),
+                    entry.source == SOURCE_COURT,
+                    entry.hits,
+                    -len(entry.normalized),
+                )
+
+            best = heapq.nlargest(limit, candidates, key=rank)
+            return [
+                {"address": entries[i].address, "source": entries[i].source, "hits": entries[i].hits}
+                for i in best
+            ]
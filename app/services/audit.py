@@ -0,0 +1,230 @@
+# app/services/audit.py
+import asyncio
+import logging
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# (адрес, сумма долга, тип дела) частого запроса — для прогрева кэшей
+FrequentLookup = Tuple[str, Optional[float], Optional[str]]
+
+# Группы — адрес и тип суда, который определяет сумма долга (порог debt_threshold): адрес,
+# по которому искали и мировой, и районный суд, прогревается для обоих
+FREQUENT_LOOKUPS_SQL = (
+    "SELECT address, MAX(debt_amount), MAX(case_type) FROM lookup_audit WHERE created_at >= ? "
+    "GROUP BY address, COALESCE(debt_amount, 0) > ? ORDER BY COUNT(*) DESC, MAX(created_at) DESC LIMIT ?")
+
+
+@dataclass
+class AuditRecord:
+    created_at: float
+    address: str
+    debt_amount: Optional[float]
+    case_type: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    court_name: Optional[str]
+    court_type: Optional[str]
+    path: str
+    confidence: Optional[str]
+    deadline_exceeded: bool
+    latency_ms: float
+
+
+AUDIT_COLUMNS = [field.name for field in fields(AuditRecord)]
+
+
+class SqliteAuditWriter:
+    """Пишет журнал в локальный файл SQLite (WAL, чтобы воркеры не мешали друг другу).
+
+    Запись синхронная и выполняется в отдельном потоке, а не в событийном цикле. Соединение
+    открывается, используется и закрывается только в этом одном потоке: sqlite3 не разрешает
+    работать с соединением из нескольких потоков сразу.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-sqlite")
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS lookup_audit (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, "
+                "address TEXT NOT NULL, debt_amount REAL, case_type TEXT, latitude REAL, longitude REAL, "
+                "court_name TEXT, court_type TEXT, path TEXT NOT NULL, confidence TEXT, "
+                "deadline_exceeded INTEGER, latency_ms REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS lookup_audit_created_at ON lookup_audit (created_at)")
+            self._connection = connection
+        return self._connection
+
+    def _write(self, records: List[AuditRecord]):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                f"INSERT INTO lookup_audit ({', '.join(AUDIT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})",
+                [tuple(getattr(record, name) for name in AUDIT_COLUMNS) for record in records])
+
+    async def write(self, records: List[AuditRecord]):
+        await self._call(self._write, records)
+
+    def _frequent_lookups(self, since: float, limit: int, debt_threshold: float) -> List[FrequentLookup]:
+        return [tuple(row) for row in
+                self._connect().execute(FREQUENT_LOOKUPS_SQL, (since, debt_threshold, limit)).fetchall()]
+
+    async def frequent_lookups(self, since: float, limit: int, debt_threshold: float) -> List[FrequentLookup]:
+        """Самые частые адреса с момента since — для прогрева кэшей."""
+        return await self._call(self._frequent_lookups, since, limit, debt_threshold)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def close(self):
+        await self._call(self._close)
+
+
+class DatabaseAuditWriter:
+    """Пишет журнал в таблицу lookup_audit через асинхронный движок SQLAlchemy (app.db.base)."""
+
+    def __init__(self):
+        # Импорт здесь: движок создаётся при импорте app.db.base, а без этого приёмника БД не нужна
+        from app.db.base import engine
+        from app.db.models.lookup_audit import LookupAudit
+        self.engine = engine
+        self.table = LookupAudit.__table__
+        self._created = False
+
+    async def write(self, records: List[AuditRecord]):
+        async with self.engine.begin() as connection:
+            if not self._created:
+                await connection.run_sync(self.table.create, checkfirst=True)
+                self._created = True
+            await connection.execute(self.table.insert(), [asdict(record) for record in records])
+
+    async def frequent_lookups(self, since: float, limit: int, debt_threshold: float) -> List[FrequentLookup]:
+        from sqlalchemy import func, select
+        table = self.table
+        query = (select(table.c.address, func.max(table.c.debt_amount), func.max(table.c.case_type))
+                 .where(table.c.created_at >= since)
+                 .group_by(table.c.address, func.coalesce(table.c.debt_amount, 0) > debt_threshold)
+                 .order_by(func.count().desc(), func.max(table.c.created_at).desc()).limit(limit))
+        async with self.engine.connect() as connection:
+            return [tuple(row) for row in (await connection.execute(query)).all()]
+
+    async def close(self):
+        pass
+
+
+class AuditLog:
+    """Журнал решений о подсудности с отложенной пакетной записью.
+
+    record() только кладёт запись в очередь в памяти и не ждёт запись. Фоновая задача
+    сбрасывает очередь пачками по batch_size или раз в flush_interval секунд. Очередь
+    ограничена max_queue записями: лишние записи отбрасываются и учитываются в dropped.
+    Пачка, которую не удалось записать, возвращается в очередь, если там есть место.
+    При остановке всё накопленное записывается.
+    """
+
+    def __init__(self, writer, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.writer = writer
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Deque[AuditRecord] = deque()
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def record(self, record: AuditRecord):
+        if self.writer is None:
+            return
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append(record)
+        if self._wakeup is not None and len(self.queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self.writer is None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Журнал решений пишется через {type(self.writer).__name__}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            try:
+                await self.writer.write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.failed_batches += 1
+                requeue = batch[:max(0, self.max_queue - len(self.queue))]
+                self.dropped += len(batch) - len(requeue)
+                self.queue.extendleft(reversed(requeue))
+                logger.error(f"Не удалось записать {len(batch)} записей журнала: {str(e)}")
+                return
+
+    async def stop(self):
+        if self._task is not None:
+            # Задача дописывает текущую пачку и выходит; отмена могла бы потерять пачку в потоке записи
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self.writer is not None:
+            await self.flush()
+            if self.queue:
+                logger.warning(f"При остановке не записано {len(self.queue)} записей журнала")
+            await self.writer.close()
+
+    async def frequent_lookups(self, since: float, limit: int, debt_threshold: float) -> List[FrequentLookup]:
+        if self.writer is None:
+            return []
+        return await self.writer.frequent_lookups(since, limit, debt_threshold)
+
+    def stats(self) -> Dict:
+        return {"sink": type(self.writer).__name__ if self.writer else None, "queued": len(self.queue),
+                "written": self.written, "dropped": self.dropped, "failed_batches": self.failed_batches}
+
+
+def _create_writer():
+    if settings.AUDIT_SINK == "sqlite":
+        return SqliteAuditWriter(settings.AUDIT_SQLITE_PATH)
+    if settings.AUDIT_SINK == "database":
+        return DatabaseAuditWriter()
+    return None
+
+
+audit_log = AuditLog(_create_writer(), max_queue=settings.AUDIT_MAX_QUEUE, batch_size=settings.AUDIT_BATCH_SIZE,
+                     flush_interval=settings.AUDIT_FLUSH_INTERVAL)
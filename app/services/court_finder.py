@@ -1,87 +1,181 @@
 # app/services/court_finder.py
-import json
+import asyncio
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple, Union
 import logging
-import requests
-from bs4 import BeautifulSoup
-from geopy.distance import geodesic
-from app.services.geocoder import geocode_address
+import httpx
+from app.services.geocoder import build_gazetteer, gazetteer, geocode_address
+from app.services.shadow import shadow
+from app.services.address_suggest import AddressSuggestIndex, address_key
+from app.services.court_store import (
+    COURTS_DATA_PATH, build_nearest_tiles, index_records, iter_points, open_snapshot, read_courts_file,
+    source_fingerprint
+)
+from app.services.court_names import CourtNameIndex
+from app.services.court_payload import CourtPayload, PayloadCache, court_payload, guessed_payload
+from app.services.court_tiles import CourtTileRenderer
+from app.services.cpu_tasks import nearest_point, pack_points, parse_sudrf_html
+from app.services.geo_tiles import MappedNearestTiles, NearestCourtTiles
+from app.services.shared_cache import shared_cache
+from app.services.territory_index import TerritoryIndex, load_territory_index
+from app.services.upstream import PRIORITY_INTERACTIVE, SERVICE_SUDRF, upstream, upstream_priority
+from app.core.config import settings
+from app.core.offload import STAGE_NEAREST, STAGE_SUDRF_PARSE, offload
+from app.core.tracing import tracer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Как был найден суд
+PATH_TERRITORY = "territory"
+PATH_NEAREST = "nearest"
+PATH_SUDRF = "sudrf"
+PATH_SUDRF_UNMATCHED = "sudrf_unmatched"
+PATH_FALLBACK_DISTRICT = "fallback_district"
+PATH_FALLBACK_NEAREST = "fallback_nearest"
+PATH_FALLBACK_GUESS = "fallback_guess"
+PATH_ERROR = "error"
+
+CONFIDENCE_HIGH = "high"
+CONFIDENCE_MEDIUM = "medium"
+CONFIDENCE_LOW = "low"
+
+# Сумма долга, до которой дело рассматривает мировой суд
+DEBT_THRESHOLD = 50000.0
+
+
+@dataclass
+class Resolution:
+    court: Dict
+    path: str
+    confidence: str
+    coords: Optional[Tuple[float, float]] = None
+    elapsed: float = 0.0
+    deadline_exceeded: bool = False
+    cached: bool = False
+
 
 class CourtFinder:
-    courts_data: List[Dict] = []
+    courts_data: Sequence[Dict] = []
+    suggest_index: AddressSuggestIndex = AddressSuggestIndex()
+    nearest_tiles: Union[NearestCourtTiles, MappedNearestTiles] = NearestCourtTiles()
+    territory_index: TerritoryIndex = TerritoryIndex()
+    dataset_version: str = ""
+    tile_renderer: Optional[CourtTileRenderer] = None
+    payloads: PayloadCache = PayloadCache()
+    court_districts: Dict[str, List[int]] = {}
+    name_index: CourtNameIndex = CourtNameIndex()
+    _tile_renderer_lock = threading.Lock()
 
     @classmethod
     def load_courts_data(cls):
-        file_path = Path(__file__).parent.parent.parent / "data" / "courts_rostov.json"  # Обновили путь
+        """Загружает данные о судах и строит индексы.
+
+        Выполняется в потоке, пока цикл обслуживает запросы: всё строится в локальных переменных
+        и публикуется в конце, courts_data — последним. При ошибке остаются прежние данные.
+        """
+        file_path = COURTS_DATA_PATH
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                cls.courts_data = data if isinstance(data, list) else data.get("courts", [])
-            for court in cls.courts_data:
-                if "coordinates" in court and "lat" in court["coordinates"] and "lon" in court["coordinates"]:
-                    court["latitude"] = court["coordinates"]["lat"]
-                    court["longitude"] = court["coordinates"]["lon"]
-                elif "latitude" not in court or "longitude" not in court:
-                    logger.warning(f"Суд '{court.get('name')}' не имеет координат")
-                court["type"] = court.get("type", "мировой" if "Судебный участок" in court["name"] else "районный")
-            logger.info(f"Данные о {len(cls.courts_data)} судах успешно загружены")
+            dataset_version = source_fingerprint(file_path)
+            if settings.COURTS_SNAPSHOT_PATH:
+                courts_data = open_snapshot(file_path, Path(settings.COURTS_SNAPSHOT_PATH))
+                logger.info(f"Данные о судах отображены из снимка {settings.COURTS_SNAPSHOT_PATH}")
+            else:
+                courts_data = read_courts_file(file_path)
+            logger.info(f"Данные о {len(courts_data)} судах успешно загружены")
+            # Индексы строятся по полям записей; из снимка полные записи при этом не разбираются
+            records = index_records(courts_data)
+            suggest_index = cls.suggest_index.rebuilt(court["address"] for court in records if court.get("address"))
+            nearest_tiles = build_nearest_tiles(courts_data)
+            territory_index = load_territory_index(records)
+            gazetteer_entries = build_gazetteer(records)
+            name_index = CourtNameIndex(settings.COURT_NAME_MATCH_THRESHOLD).build(records)
+            payloads = PayloadCache(courts_data, dataset_version).warm()
+            court_districts: Dict[str, List[int]] = {}
+            for index, court in enumerate(records):
+                # Городские суды и участки без района в названии — обычное дело при загрузке
+                court_district = cls.extract_district_from_court_name(court["name"], logging.DEBUG)
+                if court_district:
+                    court_districts.setdefault(court_district.lower(), []).append(index)
         except Exception as e:
             logger.error(f"Ошибка загрузки данных: {str(e)}")
-            cls.courts_data = []
+            return
+        cls.suggest_index = suggest_index
+        cls.nearest_tiles = nearest_tiles
+        cls.territory_index = territory_index
+        gazetteer.entries = gazetteer_entries
+        cls.name_index = name_index
+        cls.payloads = payloads
+        cls.court_districts = court_districts
+        cls.dataset_version = dataset_version
+        cls.courts_data = courts_data
 
     @classmethod
-    async def find_nearest_court(cls, user_coords: tuple, target_type: str) -> Optional[Dict]:
+    def court_response(cls, index: int) -> CourtPayload:
+        """Готовый ответ по индексу суда в courts_data."""
+        return cls.payloads.get(index)
+
+    @classmethod
+    def get_tile_renderer(cls) -> CourtTileRenderer:
+        """Тайлы строятся лениво, при первом запросе к текущей версии данных.
+
+        Вызывается из потоков: пока один строит территории, остальные ждут его результата.
+        """
+        with cls._tile_renderer_lock:
+            if cls.tile_renderer is None or cls.tile_renderer.version != cls.dataset_version:
+                cls.tile_renderer = CourtTileRenderer(cls.courts_data, cls.dataset_version)
+            return cls.tile_renderer
+
+    @classmethod
+    async def find_nearest_court(cls, user_coords: tuple, target_type: str) -> Optional[CourtPayload]:
         if not cls.courts_data:
             logger.error("Данные о судах не загружены")
             return None
+        with tracer.span("find_nearest_court", **{"court.type": target_type}) as span:
+            candidates = cls.nearest_candidates(user_coords, target_type)
+            span.set("candidates", len(candidates))
+            # Полный перебор судов (точка вне таблицы ячеек) — в пуле процессов, чтобы не держать цикл
+            nearest = await offload.run(STAGE_NEAREST, len(candidates), nearest_point, tuple(user_coords),
+                                        *pack_points(candidates))
+            span.set("distance_km", round(nearest[1], 3) if nearest else None)
+        if nearest is None:
+            logger.warning(f"Ближайший суд типа '{target_type}' не найден")
+            return None
+        nearest_index, distance = nearest
+        logger.info(f"Найден ближайший суд: '{cls.courts_data[nearest_index]['name']}' ({distance:.2f} км)")
+        return cls.court_response(nearest_index)
 
-        min_distance = float('inf')
-        nearest_court = None
-
+    @classmethod
+    def nearest_candidates(cls, user_coords: tuple, target_type: str) -> List[Tuple[int, float, float]]:
+        """Суды, среди которых нужно искать ближайший: один, несколько для граничной ячейки или все."""
         logger.debug(f"Поиск ближайшего суда типа '{target_type}' для координат {user_coords}")
+        tile = cls.nearest_tiles.lookup(user_coords[0], user_coords[1], target_type)
+        if isinstance(tile, int):
+            # Точка внутри ячейки, целиком принадлежащей одному суду
+            indexes = [tile]
+        elif tile:
+            # Граничная ячейка: точный расчёт только по судам-кандидатам
+            indexes = tile
+        else:
+            return list(iter_points(cls.courts_data, target_type))
+        return [(index, cls.courts_data[index]["latitude"], cls.courts_data[index]["longitude"])
+                for index in indexes]
 
-        for court in cls.courts_data:
-            lat = court.get("latitude")
-            lon = court.get("longitude")
-            if lat is None or lon is None:
-                logger.debug(f"Пропущен суд '{court.get('name')}' из-за отсутствия координат")
-                continue
-
-            court_type = court.get("type", "").lower()
-            if target_type != court_type:
-                continue
-
-            coords = (lat, lon)
-            distance = geodesic(user_coords, coords).kilometers
-            if distance < min_distance:
-                min_distance = distance
-                nearest_court = court
-
-        if nearest_court:
-            logger.info(f"Найден ближайший суд: '{nearest_court['name']}' ({min_distance:.2f} км)")
-            return {
-                "name": nearest_court["name"],
-                "type": nearest_court["type"],
-                "address": nearest_court["address"],
-                "phone": nearest_court.get("phone", ""),
-                "email": nearest_court.get("email", ""),
-                "latitude": nearest_court.get("latitude"),
-                "longitude": nearest_court.get("longitude"),
-                "website": nearest_court.get("website", ""),
-                "electronic_filing": nearest_court.get("electronic_filing", "Не указана"),  # Добавили
-                "polygon": ""
-            }
-        logger.warning(f"Ближайший суд типа '{target_type}' не найден")
-        return None
+    @classmethod
+    def nearest_court_index(cls, user_coords: tuple, target_type: str) -> Optional[int]:
+        """Индекс ближайшего суда нужного типа в courts_data (синхронно, без обращений к сети)."""
+        nearest = nearest_point(tuple(user_coords), *pack_points(cls.nearest_candidates(user_coords, target_type)))
+        if nearest is None:
+            return None
+        logger.info(f"Найден ближайший суд: '{cls.courts_data[nearest[0]]['name']}' ({nearest[1]:.2f} км)")
+        return nearest[0]
 
     @classmethod
-    def search_courts_by_address_sudrf(cls, address: str, target_type: str) -> List[dict]:
-        url = "https://sudrf.ru/index.php"
+    async def search_courts_by_address_sudrf(cls, address: str, target_type: str,
+                                             timeout: float = None) -> List[dict]:
+        url = settings.SUDRF_URL
         params = {
             "id": "300",
             "act": "go_ms_search" if target_type == "мировой" else "go_search",
@@ -90,36 +184,29 @@ class CourtFinder:
         }
         data = {"court_addr": address}
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124"}
-        try:
-            logger.info(f"Запрос на sudrf.ru с адресом: {address}, тип: {target_type}")
-            response = requests.post(url, params=params, data=data, headers=headers, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
+        with tracer.span("search_courts_by_address_sudrf", **{"court.type": target_type}) as span:
+            try:
+                logger.info(f"Запрос на sudrf.ru с адресом: {address}, тип: {target_type}")
+                async with upstream[SERVICE_SUDRF].call() as call:
+                    async with httpx.AsyncClient() as client:
+                        response = await client.post(url, params=params, data=data, headers=headers,
+                                                     timeout=timeout or settings.SUDRF_TIMEOUT)
+                    call.observe(response.status_code)
+                span.set("http.status_code", response.status_code)
+                response.raise_for_status()
+                courts_found = await offload.run(STAGE_SUDRF_PARSE, len(response.text), parse_sudrf_html,
+                                                 response.text, target_type)
+                logger.info(f"Найдено судов на sudrf.ru: {len(courts_found)}")
+                span.set("courts_found", len(courts_found))
+                return courts_found
+            except Exception as e:
+                logger.error(f"Ошибка запроса к sudrf.ru: {str(e)}")
+                span.fail(f"{type(e).__name__}: {e}")
+                return []
 
-            courts_found = []
-            if target_type == "мировой":
-                court_rows = soup.select("table tr")
-                for row in court_rows:
-                    name_cell = row.select_one("td:nth-child(2) a")
-                    if name_cell:
-                        court_name = name_cell.text.strip()
-                        court_link = row.select_one("td:nth-child(5) a")
-                        website = court_link["href"] if court_link else ""
-                        courts_found.append({"name": court_name, "website": website})
-            else:
-                court_items = soup.select("li")
-                for item in court_items:
-                    name_link = item.select_one("a.court-result")
-                    if name_link:
-                        court_name = name_link.text.strip()
-                        court_link = item.select_one("a[target='_blank']")
-                        website = court_link["href"] if court_link else ""
-                        courts_found.append({"name": court_name, "website": website})
-            logger.info(f"Найдено судов на sudrf.ru: {len(courts_found)}")
-            return courts_found
-        except Exception as e:
-            logger.error(f"Ошибка запроса к sudrf.ru: {str(e)}")
-            return []
+    @classmethod
+    def parse_sudrf_results(cls, html: str, target_type: str) -> List[dict]:
+        return parse_sudrf_html(html, target_type)
 
     @classmethod
     def get_district_from_address(cls, address: str) -> str:
@@ -146,7 +233,7 @@ class CourtFinder:
         return "Неизвестный"
 
     @classmethod
-    def extract_district_from_court_name(cls, court_name: str) -> Optional[str]:
+    def extract_district_from_court_name(cls, court_name: str, missing_level: int = logging.WARNING) -> Optional[str]:
         districts = {
             "Азовский": "Азовского", "Аксайский": "Аксайского", "Багаевский": "Багаевского",
             "Белокалитвинский": "Белокалитвинского", "Боковский": "Боковского",
@@ -179,37 +266,153 @@ class CourtFinder:
             if nominative.lower() in court_name_lower or genitive.lower() in court_name_lower:
                 logger.debug(f"Извлечён район: {nominative} из {court_name}")
                 return nominative
-        logger.warning(f"Район не извлечён из: {court_name}")
+        logger.log(missing_level, f"Район не извлечён из: {court_name}")
         return None
 
     @classmethod
     def determine_court_type(cls, debt_amount: float) -> str:
-        debt_threshold = 50000.0
-        return "мировой" if debt_amount <= debt_threshold else "районный"
+        return "мировой" if debt_amount <= DEBT_THRESHOLD else "районный"
+
+    @staticmethod
+    async def _wait(task: asyncio.Task, deadline: float):
+        """Ждёт задачу не дольше дедлайна; по истечении бюджета возвращает None, не отменяя её.
+
+        Отменённая или упавшая задача тоже даёт None: поиск переходит к следующему шагу.
+        """
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0 and not task.done():
+            return None
+        done, _ = await asyncio.wait({task}, timeout=max(remaining, 0))
+        if not done:
+            return None
+        if task.cancelled():
+            logger.warning(f"Шаг поиска {task.get_name()} отменён")
+            return None
+        if task.exception() is not None:
+            logger.warning(f"Шаг поиска {task.get_name()} завершился ошибкой: {task.exception()!r}")
+            return None
+        return task.result()
 
     @classmethod
     async def find_court(cls, address: str, debt_amount: float, case_type: str) -> Dict:
+        return (await cls.resolve(address, debt_amount, case_type)).court
+
+    @classmethod
+    async def resolve(cls, address: str, debt_amount: float, case_type: str,
+                      budget: Optional[float] = None) -> Resolution:
+        """Определяет суд, используя общий кэш результатов.
+
+        Ключ — версия набора данных, тип суда и нормализованный адрес. В кэш попадают только
+        уверенные ответы (high/medium), полученные в пределах бюджета. Часть запросов API
+        (не фоновых задач) повторяется теневым движком для сравнения, см. ShadowRunner.
+        """
+        with tracer.span("resolve", **{"court.type": cls.determine_court_type(debt_amount)}) as span:
+            if not cls.courts_data:
+                resolution = await cls._resolve(address, debt_amount, case_type, budget)
+            else:
+                resolution = await cls._cached_resolve(address, debt_amount, case_type, budget)
+                if upstream_priority.get() == PRIORITY_INTERACTIVE:
+                    shadow.observe(address, debt_amount, case_type, resolution.court, resolution.path,
+                                   None if resolution.cached else resolution.elapsed)
+            span.set("resolution.path", resolution.path)
+            span.set("resolution.confidence", resolution.confidence)
+            span.set("resolution.deadline_exceeded", resolution.deadline_exceeded)
+            span.set("cache.hit", resolution.cached)
+            return resolution
+
+    @classmethod
+    async def _cached_resolve(cls, address: str, debt_amount: float, case_type: str,
+                              budget: Optional[float] = None) -> Resolution:
+        started = asyncio.get_running_loop().time()
+        key = f"court:{cls.dataset_version}:{cls.determine_court_type(debt_amount)}:{address_key(address)}"
+        computed: List[Resolution] = []
+
+        async def compute() -> Dict:
+            resolution = await cls._resolve(address, debt_amount, case_type, budget)
+            computed.append(resolution)
+            return {"court": resolution.court, "path": resolution.path, "confidence": resolution.confidence,
+                    "coords": resolution.coords, "deadline_exceeded": resolution.deadline_exceeded}
+
+        cached = await shared_cache.get_or_compute(
+            key, compute, settings.CACHE_COURT_TTL,
+            cacheable=lambda value: value["confidence"] in (CONFIDENCE_HIGH, CONFIDENCE_MEDIUM)
+            and not value["deadline_exceeded"])
+        if computed:
+            return computed[0]
+        logger.info(f"Суд для адреса {address} взят из кэша: {cached['court'].get('name')}")
+        coords = tuple(cached["coords"]) if cached["coords"] else None
+        return Resolution(CourtPayload(cached["court"]), cached["path"], cached["confidence"], coords,
+                          asyncio.get_running_loop().time() - started, cached["deadline_exceeded"], cached=True)
+
+    @classmethod
+    async def _resolve(cls, address: str, debt_amount: float, case_type: str,
+                       budget: Optional[float] = None) -> Resolution:
+        """Определяет суд в пределах бюджета времени.
+
+        Сначала геокодирование: ответ по координатам приоритетнее. Запрос к sudrf.ru — подстраховка:
+        он стартует, если геокодер не нашёл координат или не ответил за долю бюджета
+        SUDRF_HEDGE_AFTER, и отменяется, если ближайший суд всё-таки найден. Координаты
+        передаются в резервный поиск, чтобы не геокодировать адрес повторно. Когда бюджет
+        исчерпан, возвращается лучший ответ из уже имеющихся данных с низкой уверенностью.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + (budget if budget is not None else settings.FIND_COURT_BUDGET)
+        tasks: List[asyncio.Task] = []
+
+        def done(court: Dict, path: str, confidence: str, coords=None) -> Resolution:
+            return Resolution(court, path, confidence, coords, loop.time() - started,
+                              loop.time() >= deadline)
+
         try:
             logger.info(f"Поиск суда для адреса: {address}, сумма: {debt_amount}, тип дела: {case_type}")
             if not cls.courts_data:
                 logger.error("Данные о судах не загружены")
-                return {"status": "error", "message": "Данные о судах не загружены"}
+                return done({"status": "error", "message": "Данные о судах не загружены"}, PATH_ERROR, CONFIDENCE_LOW)
 
             target_type = cls.determine_court_type(debt_amount)
             logger.info(f"Требуемый тип суда: {target_type}")
 
-            coords = await geocode_address(address)
+            if target_type == "мировой":
+                court_index = cls.territory_index.lookup(address)
+                if court_index is not None:
+                    court = cls.court_response(court_index)
+                    logger.info(f"Участок определён по территории подсудности: {court['name']}")
+                    return done(court, PATH_TERRITORY, CONFIDENCE_HIGH)
+
+            def start_sudrf() -> asyncio.Task:
+                task = loop.create_task(cls.search_courts_by_address_sudrf(
+                    address, target_type, timeout=min(settings.SUDRF_TIMEOUT, deadline - loop.time())),
+                    name="sudrf")
+                tasks.append(task)
+                return task
+
+            geocode_task = loop.create_task(geocode_address(address), name="geocode")
+            tasks.append(geocode_task)
+            sudrf_task = None
+            coords = await cls._wait(geocode_task, started + (deadline - started) * settings.SUDRF_HEDGE_AFTER)
+            if not geocode_task.done():
+                logger.info("Геокодер не ответил за отведённую долю бюджета, параллельно запрашивается sudrf.ru")
+                sudrf_task = start_sudrf()
+                coords = await cls._wait(geocode_task, deadline)
             if coords:
                 nearest_court = await cls.find_nearest_court(coords, target_type)
                 if nearest_court:
-                    return nearest_court
+                    return done(nearest_court, PATH_NEAREST, CONFIDENCE_MEDIUM, coords)
 
             address_district = cls.get_district_from_address(address)
             logger.info(f"Район адреса: {address_district}")
-            courts_found = cls.search_courts_by_address_sudrf(address, target_type)
+            if sudrf_task is None and loop.time() < deadline:
+                sudrf_task = start_sudrf()
+            courts_found = await cls._wait(sudrf_task, deadline) if sudrf_task is not None else None
             if not courts_found:
-                logger.warning("Суды не найдены на sudrf.ru")
-                return await cls.fallback_search(address_district, target_type, address)
+                if loop.time() >= deadline:
+                    logger.warning("Бюджет времени на поиск исчерпан, используется резервный поиск")
+                else:
+                    logger.warning("Суды не найдены на sudrf.ru")
+                court, path = await cls.fallback_search(address_district, target_type, address,
+                                                        coords=coords, geocode=False)
+                return done(court, path, CONFIDENCE_LOW, coords)
 
             selected_court = None
             for court in courts_found:
@@ -227,93 +430,101 @@ class CourtFinder:
 
             if not selected_court:
                 logger.warning("Подходящий суд не найден среди результатов sudrf.ru")
-                return await cls.fallback_search(address_district, target_type, address)
+                court, path = await cls.fallback_search(address_district, target_type, address,
+                                                        coords=coords, geocode=False)
+                return done(court, path, CONFIDENCE_LOW, coords)
 
             logger.info(f"Выбран суд с sudrf.ru: {selected_court['name']}")
-            local_court = next((c for c in cls.courts_data if c["name"] == selected_court["name"]), None)
-            if local_court:
-                logger.info(f"Найден суд в JSON: {local_court['name']}")
-                return {
-                    "name": local_court["name"],
-                    "type": local_court["type"],
-                    "address": local_court["address"],
-                    "phone": local_court.get("phone", ""),
-                    "email": local_court.get("email", ""),
-                    "latitude": local_court.get("latitude"),
-                    "longitude": local_court.get("longitude"),
-                    "website": local_court.get("website", selected_court["website"]),
-                    "electronic_filing": local_court.get("electronic_filing", "Не указана"),  # Добавили
-                    "polygon": ""
-                }
+            match = cls.name_index.match(selected_court["name"], selected_court.get("code"),
+                                         selected_court["website"])
+            if match is not None:
+                local_index, score = match
+                local_court = cls.courts_data[local_index]
+                logger.info(f"Найден суд в JSON: {local_court['name']} (сходство {score:.2f})")
+                if "website" in local_court:
+                    response = cls.court_response(local_index)
+                else:
+                    response = court_payload(local_court, website=selected_court["website"])
+                return done(response, PATH_SUDRF, CONFIDENCE_HIGH, coords)
             else:
                 logger.warning(f"Суд {selected_court['name']} не найден в JSON")
-                lat, lon = coords if coords else (None, None)
-                return {
-                    "name": selected_court["name"],
-                    "type": target_type,
-                    "address": address,
-                    "website": selected_court["website"],
-                    "latitude": lat,
-                    "longitude": lon,
-                    "electronic_filing": "Не указана",  # Значение по умолчанию
-                    "polygon": ""
-                }
+                return done(guessed_payload(selected_court["name"], target_type, address,
+                                            selected_court["website"], coords),
+                            PATH_SUDRF_UNMATCHED, CONFIDENCE_MEDIUM, coords)
 
         except Exception as e:
             logger.error(f"Ошибка в find_court: {str(e)}")
-            return {"status": "error", "message": "Внутренняя ошибка сервера"}
+            return done({"status": "error", "message": "Внутренняя ошибка сервера"}, PATH_ERROR, CONFIDENCE_LOW)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     @classmethod
-    async def fallback_search(cls, address_district: str, target_type: str, address: str) -> Dict:
-        logger.info(f"Резервный поиск для района: {address_district}, тип: {target_type}")
-        suitable_courts = []
-        for court in cls.courts_data:
-            court_name = court["name"]
-            court_type = court.get("type", "").lower()
-            court_district = cls.extract_district_from_court_name(court_name)
+    async def fallback_search(cls, address_district: str, target_type: str, address: str,
+                              coords: Optional[tuple] = None, geocode: bool = True) -> Tuple[Dict, str]:
+        with tracer.span("fallback_search", **{"court.type": target_type, "district": address_district}) as span:
+            court, path = await cls._fallback_search(address_district, target_type, address, coords, geocode)
+            span.set("resolution.path", path)
+            return court, path
 
-            if court_district and court_district.lower() == address_district.lower():
-                if (target_type == "мировой" and "судебный участок" in court_name.lower()) or \
-                        (target_type == "районный" and court_type == "районный"):
-                    suitable_courts.append(court)
-
-        if suitable_courts:
-            court = suitable_courts[0]
+    @classmethod
+    async def _fallback_search(cls, address_district: str, target_type: str, address: str,
+                               coords: Optional[tuple] = None, geocode: bool = True) -> Tuple[Dict, str]:
+        logger.info(f"Резервный поиск для района: {address_district}, тип: {target_type}")
+        district_index = cls.district_court_index(address_district, target_type)
+        if district_index is not None:
+            court = cls.court_response(district_index)
             logger.info(f"Выбран суд из JSON: {court['name']}")
-            return {
-                "name": court["name"],
-                "type": court["type"],
-                "address": court["address"],
-                "phone": court.get("phone", ""),
-                "email": court.get("email", ""),
-                "latitude": court.get("latitude"),
-                "longitude": court.get("longitude"),
-                "website": court.get("website", ""),
-                "electronic_filing": court.get("electronic_filing", "Не указана"),  # Добавили
-                "polygon": ""
-            }
-
-        coords = await geocode_address(address)
+            return court, PATH_FALLBACK_DISTRICT
+
+        if coords is None and geocode:
+            coords = await geocode_address(address)
         if coords:
             nearest_court = await cls.find_nearest_court(coords, target_type)
             if nearest_court:
-                return nearest_court
+                return nearest_court, PATH_FALLBACK_NEAREST
 
         logger.warning(f"Суд не найден в резервном поиске")
-        lat, lon = coords if coords else (None, None)
-        return {
-            "name": f"{address_district} районный суд" if target_type == "районный" else f"Судебный участок {address_district} район",
-            "type": target_type,
-            "address": address,
-            "website": "",
-            "latitude": lat,
-            "longitude": lon,
-            "electronic_filing": "Не указана",  # Значение по умолчанию
-            "polygon": ""
-        }
+        name = f"{address_district} районный суд" if target_type == "районный" else f"Судебный участок {address_district} район"
+        return guessed_payload(name, target_type, address, coords=coords), PATH_FALLBACK_GUESS
 
+    @classmethod
+    def district_court_index(cls, address_district: str, target_type: str) -> Optional[int]:
+        """Первый суд нужного типа, в названии которого упомянут район адреса."""
+        for index in cls.court_districts.get(address_district.lower(), ()):
+            court = cls.courts_data[index]
+            court_name = court["name"]
+            court_type = court.get("type", "").lower()
+            if (target_type == "мировой" and "судебный участок" in court_name.lower()) or \
+                    (target_type == "районный" and court_type == "районный"):
+                return index
+        return None
 
-CourtFinder.load_courts_data()
+    @classmethod
+    async def resolve_offline(cls, address: str, debt_amount: float, case_type: str) -> Optional[Dict]:
+        """Суд без обращений к сети: территория участка, иначе ближайший суд по координатам
+        из кэша геокодирования или локального справочника. Кандидат для теневого запуска."""
+        target_type = cls.determine_court_type(debt_amount)
+        if target_type == "мировой":
+            court_index = cls.territory_index.lookup(address)
+            if court_index is not None:
+                return cls.court_response(court_index)
+        coords = await shared_cache.get(f"geo:{address_key(address)}") or await gazetteer.geocode(address)
+        if not coords:
+            return None
+        nearest_index = cls.nearest_court_index(tuple(coords), target_type)
+        return cls.court_response(nearest_index) if nearest_index is not None else None
+
+
+# Движки, которые можно сравнить с текущим в теневом режиме (SHADOW_ENGINE)
+SHADOW_ENGINES = {
+    "offline": CourtFinder.resolve_offline,
+}
+if settings.SHADOW_ENGINE:
+    shadow.candidate = SHADOW_ENGINES.get(settings.SHADOW_ENGINE)
+    if shadow.candidate is None:
+        logger.error(f"Неизвестный теневой движок: {settings.SHADOW_ENGINE}")
 
 
 async def find_court(address: str, debt_amount: float, case_type: str) -> Dict:
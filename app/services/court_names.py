@@ -0,0 +1,107 @@
+# app/services/court_names.py
+import logging
+import re
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+NUMBER_SIGN_RE = re.compile(r"(?:№|\bn)\s*(?=\d)")
+PUNCTUATION_RE = re.compile(r"[\"'«»“”„`.,;:()]")
+NUMBER_RE = re.compile(r"\d+")
+# Код суда по классификатору ГАС «Правосудие», например 61MS0001
+COURT_CODE_RE = re.compile(r"\b\d{2}[A-Z]{2}\d{4}\b")
+# Триграммы, встречающиеся в названиях многих судов («суд», «ово»), кандидатов не отбирают
+MAX_TRIGRAM_POSTINGS = 64
+
+Match = Tuple[int, float]
+
+
+def normalize_court_name(name: str) -> str:
+    """Название суда без различий в регистре, \\xa0, ё, кавычках и записи «№»."""
+    text = name.replace("\xa0", " ").lower().replace("ё", "е")
+    text = NUMBER_SIGN_RE.sub("№ ", text)
+    text = PUNCTUATION_RE.sub(" ", text)
+    return " ".join(text.split())
+
+
+def website_key(url: str) -> str:
+    """Хост сайта суда без схемы и www: http://vrsh1.ros.msudrf.ru/ -> vrsh1.ros.msudrf.ru."""
+    url = url.strip().lower()
+    host = urlparse(url if "//" in url else f"//{url}").hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def trigrams(normalized: str) -> FrozenSet[str]:
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CourtNameIndex:
+    """Сопоставление судов из выдачи sudrf.ru с записями набора данных.
+
+    По убыванию надёжности: код суда, сайт, нормализованное название и, наконец, сходство
+    триграмм (коэффициент Дайса не ниже threshold). Кандидаты для сходства берутся только по
+    редким триграммам, поэтому время поиска не зависит от числа судов. Номера участков в
+    названиях должны совпадать полностью: «№ 1» и «№ 11» почти не различаются по триграммам.
+    """
+
+    def __init__(self, threshold: float = 0.75):
+        self.threshold = threshold
+        self._by_code: Dict[str, int] = {}
+        self._by_website: Dict[str, int] = {}
+        self._by_name: Dict[str, List[int]] = {}
+        self._trigrams: List[FrozenSet[str]] = []
+        self._numbers: List[Tuple[str, ...]] = []
+        self._postings: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._trigrams)
+
+    def build(self, courts: Iterable[Dict]) -> "CourtNameIndex":
+        for index, court in enumerate(courts):
+            normalized = normalize_court_name(court["name"])
+            if court.get("code"):
+                self._by_code.setdefault(court["code"].upper(), index)
+            if court.get("website"):
+                self._by_website.setdefault(website_key(court["website"]), index)
+            self._by_name.setdefault(normalized, []).append(index)
+            grams = trigrams(normalized)
+            self._trigrams.append(grams)
+            self._numbers.append(tuple(NUMBER_RE.findall(normalized)))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(index)
+        self._postings = {gram: indexes for gram, indexes in self._postings.items()
+                          if len(indexes) <= MAX_TRIGRAM_POSTINGS}
+        logger.info(f"Индекс названий судов построен: {len(self._trigrams)} названий, "
+                    f"{len(self._postings)} триграмм")
+        return self
+
+    def match(self, name: str, code: Optional[str] = None, website: Optional[str] = None) -> Optional[Match]:
+        """(индекс суда, оценка от 0 до 1) или None, если похожего суда нет."""
+        if code and code.upper() in self._by_code:
+            return self._by_code[code.upper()], 1.0
+        if website:
+            index = self._by_website.get(website_key(website))
+            if index is not None:
+                return index, 1.0
+        normalized = normalize_court_name(name)
+        exact = self._by_name.get(normalized)
+        if exact:
+            return exact[0], 1.0
+
+        grams = trigrams(normalized)
+        numbers = tuple(NUMBER_RE.findall(normalized))
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        best: Optional[Match] = None
+        for index, _ in shared.most_common(8):
+            if self._numbers[index] != numbers:
+                continue
+            candidate = self._trigrams[index]
+            score = 2 * len(grams & candidate) / (len(grams) + len(candidate))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (index, score)
+        return best
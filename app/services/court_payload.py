@@ -0,0 +1,142 @@
+# app/services/court_payload.py
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from app.core.msgpack_codec import packb
+
+# Столбцы таблицы судов (GET /api/courts/table); суд в потоковом API — номер строки этой таблицы
+TABLE_FIELDS = ("code", "name", "type", "address", "phone", "email", "latitude", "longitude", "website",
+                "electronic_filing")
+
+
+class CourtPayload(dict):
+    """Данные суда в виде ответа API вместе с готовым JSON (атрибут raw).
+
+    Словарь не должен меняться после создания: иначе raw разойдётся с содержимым.
+    Для изменённой копии используйте court_payload(court, поле=значение).
+    """
+
+    __slots__ = ("raw",)
+
+    def __init__(self, data: Dict):
+        super().__init__(data)
+        self.raw = orjson.dumps(data)
+
+    @classmethod
+    def from_raw(cls, raw: bytes) -> "CourtPayload":
+        """Ответ по готовому JSON (из снимка данных) без повторного кодирования."""
+        payload = cls.__new__(cls)
+        dict.__init__(payload, orjson.loads(raw))
+        payload.raw = raw
+        return payload
+
+
+def _coordinate(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def court_payload(court: Dict, **overrides) -> CourtPayload:
+    """Ответ API по записи суда из набора данных."""
+    data = {
+        "name": court["name"],
+        "type": court["type"],
+        "address": court["address"],
+        "phone": court.get("phone", ""),
+        "email": court.get("email", ""),
+        "latitude": _coordinate(court.get("latitude")),
+        "longitude": _coordinate(court.get("longitude")),
+        "website": court.get("website", ""),
+        "electronic_filing": court.get("electronic_filing", "Не указана"),
+        "polygon": "",
+    }
+    data.update(overrides)
+    return CourtPayload(data)
+
+
+def guessed_payload(name: str, court_type: str, address: str, website: str = "",
+                    coords: Optional[Tuple[float, float]] = None) -> CourtPayload:
+    """Ответ API для суда, которого нет в наборе данных (из sudrf.ru или по названию района)."""
+    lat, lon = coords if coords else (None, None)
+    return court_payload({"name": name, "type": court_type, "address": address, "website": website,
+                          "latitude": lat, "longitude": lon}, phone=None, email=None)
+
+
+class PayloadCache:
+    """Готовые ответы по индексу суда для одной версии набора данных.
+
+    Запись сериализуется при первом обращении и дальше отдаётся без копирования полей
+    и повторного кодирования JSON. Кэш пересоздаётся вместе с данными о судах.
+    Если данные — снимок (app.services.court_store.CourtSnapshot), готовый JSON ответов уже
+    лежит в нём, в общей для воркеров памяти: в процессе держатся только stored_limit
+    последних разобранных ответов.
+    Здесь же — таблица судов этой версии для клиентов, получающих суд номером строки.
+    """
+
+    def __init__(self, courts: Sequence[Dict] = (), version: str = "", stored_limit: int = 512):
+        self.courts = courts
+        self.version = version
+        self.stored_limit = stored_limit
+        self._stored = getattr(courts, "payload_bytes", None)
+        self._payloads: Dict[int, CourtPayload] = {}
+        self._lock = threading.Lock()
+        self._by_name: Dict[str, List[int]] = {}
+        names = courts.column("name") if self._stored else (court["name"] for court in courts)
+        for index, name in enumerate(names):
+            self._by_name.setdefault(name, []).append(index)
+        self._tables: Dict[bool, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def get(self, index: int) -> CourtPayload:
+        payload = self._payloads.get(index)
+        if payload is None:
+            if self._stored:
+                payload = CourtPayload.from_raw(self._stored(index))
+            else:
+                payload = court_payload(self.courts[index])
+            with self._lock:
+                payload = self._payloads.setdefault(index, payload)
+                if self._stored and len(self._payloads) > self.stored_limit:
+                    # Самый давно разобранный ответ: его JSON по-прежнему есть в снимке
+                    del self._payloads[next(iter(self._payloads))]
+        return payload
+
+    def warm(self) -> "PayloadCache":
+        """Сериализует все ответы заранее; для снимка не нужно — они уже в нём."""
+        if not self._stored:
+            for index in range(len(self.courts)):
+                self.get(index)
+        return self
+
+    def index_of(self, court: Dict) -> Optional[int]:
+        """Номер суда в наборе данных, если ответ совпадает с его записью (а не собран из sudrf.ru)."""
+        for index in self._by_name.get(court.get("name"), ()):
+            payload = self.get(index)
+            if court is payload or court == payload:
+                return index
+        return None
+
+    def table(self, msgpack: bool = False) -> bytes:
+        """Таблица судов {"version", "fields", "courts": [[...], ...]} в JSON или MessagePack."""
+        body = self._tables.get(msgpack)
+        if body is None:
+            rows = []
+            codes = self.courts.column("code") if self._stored else [court.get("code") for court in self.courts]
+            for index, code in enumerate(codes):
+                payload = self.get(index)
+                rows.append([code] + [payload[field] for field in TABLE_FIELDS[1:]])
+            table = {"version": self.version, "fields": list(TABLE_FIELDS), "courts": rows}
+            body = self._tables.setdefault(msgpack, packb(table) if msgpack else orjson.dumps(table))
+        return body
+
+
+def envelope(court: Dict, **fields) -> bytes:
+    """JSON ответа {**fields, "court": court}; для CourtPayload суд не сериализуется заново."""
+    raw = court.raw if isinstance(court, CourtPayload) else orjson.dumps(court)
+    head = orjson.dumps(fields)
+    if head == b"{}":
+        return b'{"court":' + raw + b"}"
+    return head[:-1] + b',"court":' + raw + b"}"
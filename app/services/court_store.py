@@ -0,0 +1,311 @@
+# app/services/court_store.py
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from app.services.court_payload import court_payload
+from app.services.geo_tiles import MappedNearestTiles, NearestCourtTiles
+
+logger = logging.getLogger(__name__)
+
+COURTS_DATA_PATH = Path(__file__).parent.parent.parent / "data" / "courts_rostov.json"
+
+SNAPSHOT_MAGIC = b"CSNAP004"
+SNAPSHOT_ALIGN = 8
+COURT_TYPES = ["мировой", "районный", "областной"]
+UNKNOWN_TYPE_CODE = 255
+# Поля записей, по которым строятся индексы поиска; в снимке лежат отдельными столбцами
+INDEX_FIELDS = ("name", "code", "website", "address", "latitude", "longitude", "type")
+
+
+def read_courts_file(file_path: Path) -> List[Dict]:
+    """Читает JSON с судами и приводит записи к виду, который использует CourtFinder."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return prepare_courts(data if isinstance(data, list) else data.get("courts", []))
+
+
+def prepare_courts(courts: List[Dict]) -> List[Dict]:
+    for court in courts:
+        if "coordinates" in court and "lat" in court["coordinates"] and "lon" in court["coordinates"]:
+            court["latitude"] = court["coordinates"]["lat"]
+            court["longitude"] = court["coordinates"]["lon"]
+        elif "latitude" not in court or "longitude" not in court:
+            logger.warning(f"Суд '{court.get('name')}' не имеет координат")
+        court["type"] = court.get("type", "мировой" if "Судебный участок" in court["name"] else "районный")
+    return courts
+
+
+def source_fingerprint(file_path: Path) -> str:
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def iter_points(courts: Sequence[Dict], target_type: str) -> Iterator[Tuple[int, float, float]]:
+    """Перебирает (индекс, широта, долгота) судов нужного типа, у которых есть координаты."""
+    if isinstance(courts, CourtSnapshot):
+        yield from courts.iter_points(target_type)
+        return
+    for index, court in enumerate(courts):
+        lat = court.get("latitude")
+        lon = court.get("longitude")
+        if lat is None or lon is None:
+            continue
+        if court.get("type", "").lower() != target_type:
+            continue
+        yield index, lat, lon
+
+
+def index_records(courts: Sequence[Dict]) -> Sequence[Dict]:
+    """Записи для построения индексов поиска.
+
+    Для снимка — временный список только с полями INDEX_FIELDS из его столбцов, без разбора
+    полных записей (после построения индексов список освобождается), иначе — сами записи.
+    """
+    if isinstance(courts, CourtSnapshot):
+        return courts.index_records()
+    return courts
+
+
+def build_nearest_tiles(courts: Sequence[Dict]) -> Union[NearestCourtTiles, MappedNearestTiles]:
+    """Таблица ближайших судов: читается на месте из снимка, если он есть, иначе строится заново."""
+    if isinstance(courts, CourtSnapshot):
+        return courts.nearest_tiles()
+    return NearestCourtTiles().build({court_type: iter_points(courts, court_type) for court_type in COURT_TYPES})
+
+
+def _pad(blob: bytes) -> bytes:
+    return blob + b"\0" * (-len(blob) % SNAPSHOT_ALIGN)
+
+
+def build_snapshot(source_path: Path, snapshot_path: Path) -> Path:
+    """Собирает снимок данных о судах в один файл для отображения в память воркеров.
+
+    Формат: магическая строка, длина заголовка (uint32), JSON-заголовок с таблицей секций
+    и сами секции, выровненные по 8 байт. Координаты и типы судов лежат в плоских массивах,
+    поэтому поиск ближайшего суда не требует разбора записей. Производные данные (таблица
+    ближайших судов, готовые JSON-ответы, столбцы полей для индексов поиска) считаются здесь
+    один раз и тоже кладутся в снимок, чтобы воркеры не разбирали все записи при старте.
+    Таблица ближайших судов хранится ячейками фиксированной длины (NearestCourtTiles.pack)
+    и ищется прямо в отображённой памяти.
+    """
+    courts = read_courts_file(source_path)
+    records = [json.dumps(court, ensure_ascii=False).encode("utf-8") for court in courts]
+    payloads = [court_payload(court).raw for court in courts]
+
+    offsets = array("Q", [0])
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    payload_offsets = array("Q", [0])
+    for payload in payloads:
+        payload_offsets.append(payload_offsets[-1] + len(payload))
+    coords = array("d")
+    types = bytearray()
+    for court in courts:
+        lat, lon = court.get("latitude"), court.get("longitude")
+        coords.extend((math.nan, math.nan) if lat is None or lon is None else (lat, lon))
+        court_type = court.get("type", "").lower()
+        types.append(COURT_TYPES.index(court_type) if court_type in COURT_TYPES else UNKNOWN_TYPE_CODE)
+
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        payload_offsets.byteswap()
+        coords.byteswap()
+    fields = {field: [court.get(field) for court in courts] for field in INDEX_FIELDS}
+    tiles_meta, tile_cells, tile_candidates = build_nearest_tiles(courts).pack()
+    blobs = {
+        "offsets": offsets.tobytes(),
+        "coords": coords.tobytes(),
+        "types": bytes(types),
+        "records": b"".join(records),
+        "tiles": tile_cells,
+        "tile_candidates": tile_candidates,
+        "payload_offsets": payload_offsets.tobytes(),
+        "payloads": b"".join(payloads),
+        "fields": json.dumps(fields, ensure_ascii=False).encode("utf-8"),
+    }
+
+    sections = {}
+    position = 0
+    for name, blob in blobs.items():
+        sections[name] = [position, len(blob)]
+        position += len(_pad(blob))
+    header = json.dumps({
+        "count": len(courts),
+        "source": str(source_path),
+        "fingerprint": source_fingerprint(source_path),
+        "types": COURT_TYPES,
+        "tiles": tiles_meta,
+        "sections": sections,
+    }).encode("utf-8")
+    header = _pad(struct.pack("<I", len(header)) + header)
+
+    tmp_path = snapshot_path.with_name(snapshot_path.name + f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(header)
+        for blob in blobs.values():
+            f.write(_pad(blob))
+    os.replace(tmp_path, snapshot_path)
+    logger.info(f"Снимок данных о {len(courts)} судах записан в {snapshot_path}")
+    return snapshot_path
+
+
+class CourtSnapshot(Sequence):
+    """Данные о судах, отображённые в память только для чтения.
+
+    Страницы файла общие для всех процессов, открывших снимок, поэтому расход памяти не растёт
+    с числом воркеров. Записи разбираются из JSON при обращении и кэшируются в небольшом LRU;
+    готовые ответы API отдаются из снимка как есть (payload_bytes).
+    """
+
+    def __init__(self, snapshot_path: Path):
+        self.path = Path(snapshot_path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self._mm.close()
+            raise ValueError(f"Файл {self.path} не является снимком данных о судах")
+        header_start = len(SNAPSHOT_MAGIC)
+        (header_length,) = struct.unpack_from("<I", self._mm, header_start)
+        header_end = header_start + 4 + header_length
+        self.header = json.loads(self._mm[header_start + 4:header_end])
+        self._data_start = header_end + (-(header_end - header_start) % SNAPSHOT_ALIGN)
+        self._count = self.header["count"]
+
+        self._offsets = self._section("offsets").cast("Q")
+        self._coords = self._section("coords").cast("d")
+        self._types = self._section("types")
+        self._records = self._section("records")
+        self._payload_offsets = self._section("payload_offsets").cast("Q")
+        self._payloads = self._section("payloads")
+        self._tile_cells = self._section("tiles")
+        self._tile_candidates = self._section("tile_candidates")
+        self._type_codes = {name: code for code, name in enumerate(self.header["types"])}
+        self._decode = lru_cache(maxsize=512)(self._decode_record)
+
+    @property
+    def fingerprint(self) -> str:
+        return self.header["fingerprint"]
+
+    @property
+    def mapped_bytes(self) -> int:
+        return len(self._mm)
+
+    def decoded_cache_info(self):
+        """Счётчики LRU разобранных записей (functools.lru_cache)."""
+        return self._decode.cache_info()
+
+    def close(self):
+        self._decode.cache_clear()
+        for view in (self._offsets, self._coords, self._types, self._records, self._payload_offsets,
+                     self._payloads, self._tile_cells, self._tile_candidates):
+            view.release()
+        self._mm.close()
+
+    def _section(self, name: str) -> memoryview:
+        offset, length = self.header["sections"][name]
+        start = self._data_start + offset
+        return memoryview(self._mm)[start:start + length]
+
+    def nearest_tiles(self) -> MappedNearestTiles:
+        """Таблица ближайших судов поверх страниц снимка, без копирования в память воркера."""
+        return MappedNearestTiles(self.header["tiles"], self._tile_cells, self._tile_candidates)
+
+    def payload_bytes(self, index: int) -> bytes:
+        """Готовый JSON ответа API для суда (app.services.court_payload.court_payload)."""
+        return bytes(self._payloads[self._payload_offsets[index]:self._payload_offsets[index + 1]])
+
+    def column(self, field: str) -> List:
+        """Значения одного из INDEX_FIELDS по всем судам; список не кэшируется."""
+        return json.loads(bytes(self._section("fields")))[field]
+
+    def index_records(self) -> List[Dict]:
+        fields = json.loads(bytes(self._section("fields")))
+        return [dict(zip(fields, values)) for values in zip(*fields.values())]
+
+    def _decode_record(self, index: int) -> Dict:
+        return json.loads(bytes(self._records[self._offsets[index]:self._offsets[index + 1]]))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("индекс суда вне диапазона")
+        return self._decode(index)
+
+    def iter_points(self, target_type: str) -> Iterator[Tuple[int, float, float]]:
+        type_code = self._type_codes.get(target_type)
+        if type_code is None:
+            return
+        coords, types = self._coords, self._types
+        for index in range(self._count):
+            if types[index] != type_code:
+                continue
+            lat, lon = coords[2 * index], coords[2 * index + 1]
+            if lat != lat or lon != lon:  # NaN — координат нет
+                continue
+            yield index, lat, lon
+
+
+def _open_if_fresh(snapshot_path: Path, fingerprint: str) -> Optional[CourtSnapshot]:
+    if not snapshot_path.exists():
+        return None
+    try:
+        snapshot = CourtSnapshot(snapshot_path)
+    except ValueError:
+        return None
+    if snapshot.fingerprint == fingerprint:
+        return snapshot
+    snapshot.close()
+    return None
+
+
+def open_snapshot(source_path: Path, snapshot_path: Path) -> CourtSnapshot:
+    """Открывает снимок, при необходимости пересобирая его под файловой блокировкой.
+
+    Первый воркер, обнаруживший устаревший снимок, собирает его, остальные ждут блокировку
+    и затем просто отображают готовый файл.
+    """
+    snapshot_path = Path(snapshot_path)
+    fingerprint = source_fingerprint(source_path)
+    snapshot = _open_if_fresh(snapshot_path, fingerprint)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(snapshot_path.with_name(snapshot_path.name + ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            snapshot = _open_if_fresh(snapshot_path, fingerprint)
+            if snapshot is not None:
+                return snapshot
+            build_snapshot(source_path, snapshot_path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return CourtSnapshot(snapshot_path)
+
+
+if __name__ == "__main__":
+    # Сборка снимка загрузчиком до старта воркеров:
+    #   python -m app.services.court_store /dev/shm/courts_rostov.snapshot [путь/к/courts.json]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2:
+        print("Использование: python -m app.services.court_store <снимок> [courts.json]")
+        sys.exit(1)
+    source = Path(sys.argv[2]) if len(sys.argv) > 2 else COURTS_DATA_PATH
+    build_snapshot(source, Path(sys.argv[1]))
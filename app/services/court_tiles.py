@@ -0,0 +1,191 @@
+# app/services/court_tiles.py
+import hashlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from shapely import affinity
+from shapely.geometry import MultiPoint, Point, box, mapping
+from shapely.ops import voronoi_diagram
+
+from app.services.court_store import COURT_TYPES, index_records, iter_points
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+CLUSTER_RADIUS_PX = 60
+CLUSTER_MAX_ZOOM = 11  # начиная с 12-го масштаба суды показываются точками
+TERRITORY_MARGIN_DEG = 0.5
+CLIP_BUFFER_PX = 4
+MAX_ZOOM = 18
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) тайла в схеме XYZ (Web Mercator)."""
+    n = 2 ** z
+
+    def lat(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def world_pixel(lat: float, lon: float, z: int) -> Tuple[float, float]:
+    scale = TILE_SIZE * 2 ** z
+    sin_lat = math.sin(math.radians(lat))
+    px = (lon + 180) / 360 * scale
+    py = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return px, py
+
+
+class CourtTileRenderer:
+    """Строит тайлы GeoJSON с судами и территориями для одной версии набора данных.
+
+    Территории — области Вороного вокруг зданий судов каждого типа (ближайший суд, как в
+    find_nearest_court), построенные в равнопромежуточной проекции и обрезанные по области
+    обслуживания. На мелких масштабах суды объединяются в кластеры по сетке в пикселях
+    всего мира, поэтому кластер не разрезается границей тайла. Готовые тайлы хранятся в LRU.
+    """
+
+    def __init__(self, courts: Sequence[Dict], version: str, cache_size: int = 2048):
+        self.version = version
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._clusters: Dict[Tuple[int, str], List[Dict]] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.points: Dict[str, List[Dict]] = {}
+        self.territories: Dict[str, List[Tuple[object, Dict]]] = {}
+        records = index_records(courts)
+        for court_type in COURT_TYPES:
+            points = []
+            for index, lat, lon in iter_points(courts, court_type):
+                court = records[index]
+                points.append({"lat": lat, "lon": lon, "properties": {
+                    "name": court["name"], "type": court["type"], "code": court.get("code"),
+                    "address": court.get("address"),
+                }})
+            if points:
+                self.points[court_type] = points
+                self.territories[court_type] = self._build_territories(points)
+        logger.info(f"Подготовлены тайлы судов версии {version}: "
+                    f"{ {court_type: len(items) for court_type, items in self.territories.items()} } территорий")
+
+    @staticmethod
+    def _build_territories(points: List[Dict]) -> List[Tuple[object, Dict]]:
+        sites: "OrderedDict[Tuple[float, float], List[Dict]]" = OrderedDict()
+        for point in points:
+            sites.setdefault((point["lat"], point["lon"]), []).append(point["properties"])
+        lats = [lat for lat, _ in sites]
+        lons = [lon for _, lon in sites]
+        k = math.cos(math.radians(sum(lats) / len(lats)))
+        envelope = box(
+            (min(lons) - TERRITORY_MARGIN_DEG) * k, min(lats) - TERRITORY_MARGIN_DEG,
+            (max(lons) + TERRITORY_MARGIN_DEG) * k, max(lats) + TERRITORY_MARGIN_DEG,
+        )
+        projected = {(lon * k, lat): (lat, lon) for lat, lon in sites}
+        if len(sites) == 1:
+            cells = [envelope]
+        else:
+            cells = list(voronoi_diagram(MultiPoint(list(projected)), envelope=envelope).geoms)
+
+        territories = []
+        for cell in cells:
+            cell = cell.intersection(envelope)
+            if cell.is_empty:
+                continue
+            site = next((key for xy, key in projected.items() if cell.covers(Point(xy))), None)
+            if site is None:
+                continue
+            geometry = affinity.scale(cell, xfact=1 / k, yfact=1.0, origin=(0, 0))
+            courts = sites[site]
+            territories.append((geometry, {
+                "names": [court["name"] for court in courts],
+                "codes": [court["code"] for court in courts if court.get("code")],
+                "type": courts[0]["type"],
+            }))
+        return territories
+
+    def _clustered(self, z: int, court_type: str) -> List[Dict]:
+        key = (z, court_type)
+        clusters = self._clusters.get(key)
+        if clusters is not None:
+            return clusters
+        buckets: Dict[Tuple[int, int], List[Dict]] = {}
+        for point in self.points.get(court_type, []):
+            px, py = world_pixel(point["lat"], point["lon"], z)
+            buckets.setdefault((int(px // CLUSTER_RADIUS_PX), int(py // CLUSTER_RADIUS_PX)), []).append(point)
+        clusters = []
+        for members in buckets.values():
+            clusters.append({
+                "lat": sum(p["lat"] for p in members) / len(members),
+                "lon": sum(p["lon"] for p in members) / len(members),
+                "count": len(members),
+                "names": [p["properties"]["name"] for p in members[:5]],
+            })
+        self._clusters[key] = clusters
+        return clusters
+
+    def __len__(self) -> int:
+        """Число готовых тайлов в LRU."""
+        return len(self._cache)
+
+    def etag(self, z: int, x: int, y: int, court_type: Optional[str]) -> str:
+        digest = hashlib.sha1(f"{self.version}:{z}/{x}/{y}:{court_type}".encode("utf-8")).hexdigest()[:20]
+        return f'"{digest}"'
+
+    def render(self, z: int, x: int, y: int, court_type: Optional[str] = None) -> Tuple[str, bytes]:
+        """Возвращает (ETag, тело тайла в GeoJSON)."""
+        key = (z, x, y, court_type)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+        degrees_per_px = 360 / (TILE_SIZE * 2 ** z)
+        pad = CLIP_BUFFER_PX * degrees_per_px
+        tile_box = box(min_lon - pad, min_lat - pad, max_lon + pad, max_lat + pad)
+        features = []
+        for current_type in ([court_type] if court_type else list(self.points)):
+            for geometry, properties in self.territories.get(current_type, []):
+                if not geometry.intersects(tile_box):
+                    continue
+                clipped = geometry.simplify(degrees_per_px, preserve_topology=True).intersection(tile_box)
+                if clipped.is_empty:
+                    continue
+                features.append({"type": "Feature", "geometry": mapping(clipped),
+                                 "properties": {"kind": "territory", **properties}})
+
+            if z <= CLUSTER_MAX_ZOOM:
+                for cluster in self._clustered(z, current_type):
+                    if min_lat <= cluster["lat"] <= max_lat and min_lon <= cluster["lon"] <= max_lon:
+                        features.append({
+                            "type": "Feature",
+                            "geometry": {"type": "Point", "coordinates": [cluster["lon"], cluster["lat"]]},
+                            "properties": {"kind": "cluster", "type": current_type, "count": cluster["count"],
+                                           "names": cluster["names"]},
+                        })
+            else:
+                for point in self.points.get(current_type, []):
+                    if min_lat <= point["lat"] <= max_lat and min_lon <= point["lon"] <= max_lon:
+                        features.append({
+                            "type": "Feature",
+                            "geometry": {"type": "Point", "coordinates": [point["lon"], point["lat"]]},
+                            "properties": {"kind": "court", **point["properties"]},
+                        })
+
+        body = json.dumps({"type": "FeatureCollection", "features": features},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        result = (self.etag(z, x, y, court_type), body)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return result
+
@@ -0,0 +1,63 @@
+# app/services/cpu_tasks.py
+"""Вычислительные этапы поиска суда, которые можно выполнять в процессах пула (app.core.offload).
+
+Модуль не зависит от состояния приложения и импортирует только то, что нужно самим функциям,
+чтобы процессы пула запускались быстро. Аргументы — строки и массивы чисел, без словарей судов.
+"""
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from bs4 import BeautifulSoup
+from geopy.distance import geodesic
+
+from app.services.court_names import COURT_CODE_RE
+
+
+def parse_sudrf_html(html: str, target_type: str) -> List[Dict]:
+    """Суды из страницы результатов поиска sudrf.ru: название, сайт и код, если он есть в строке."""
+    soup = BeautifulSoup(html, "html.parser")
+    courts_found = []
+    if target_type == "мировой":
+        court_rows = soup.select("table tr")
+        for row in court_rows:
+            name_cell = row.select_one("td:nth-child(2) a")
+            if name_cell:
+                court_name = name_cell.text.strip()
+                court_link = row.select_one("td:nth-child(5) a")
+                website = court_link["href"] if court_link else ""
+                code = COURT_CODE_RE.search(row.get_text(" "))
+                courts_found.append({"name": court_name, "website": website,
+                                     "code": code.group(0) if code else None})
+    else:
+        court_items = soup.select("li")
+        for item in court_items:
+            name_link = item.select_one("a.court-result")
+            if name_link:
+                court_name = name_link.text.strip()
+                court_link = item.select_one("a[target='_blank']")
+                website = court_link["href"] if court_link else ""
+                code = COURT_CODE_RE.search(item.get_text(" "))
+                courts_found.append({"name": court_name, "website": website,
+                                     "code": code.group(0) if code else None})
+    return courts_found
+
+
+def pack_points(points: Sequence[Tuple[int, float, float]]) -> Tuple[array, array]:
+    """(индексы, координаты lat, lon подряд) — компактный вид кандидатов для nearest_point."""
+    indexes, coords = array("q"), array("d")
+    for index, lat, lon in points:
+        indexes.append(index)
+        coords.append(lat)
+        coords.append(lon)
+    return indexes, coords
+
+
+def nearest_point(origin: Tuple[float, float], indexes: Sequence[int],
+                  coords: Sequence[float]) -> Optional[Tuple[int, float]]:
+    """(индекс, расстояние в км) ближайшей к origin точки по эллипсоиду или None."""
+    best: Optional[Tuple[int, float]] = None
+    for position, index in enumerate(indexes):
+        distance = geodesic(origin, (coords[2 * position], coords[2 * position + 1])).kilometers
+        if best is None or distance < best[1]:
+            best = (index, distance)
+    return best
@@ -0,0 +1,288 @@
+# app/services/geo_tiles.py
+import logging
+import math
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_INDEX = {char: i for i, char in enumerate(GEOHASH_ALPHABET)}
+EARTH_RADIUS_KM = 6371.0088
+
+# Ячейка считается целиком принадлежащей одному суду, только если во всех её углах
+# второй по близости суд дальше ближайшего с запасом: приближённая метрика здесь
+# равнопромежуточная, а в find_nearest_court расстояние считается по эллипсоиду.
+MARGIN_RATIO = 0.01
+MARGIN_KM = 0.1
+
+CellValue = Union[int, Tuple[int, ...]]
+
+# Ячейка в плоском виде (снимок данных): geohash, дополненный нулями до 8 байт, и значение —
+# индекс суда (>= 0) или -(1 + смещение) списка кандидатов в массиве «число, индексы...»
+TILE_CELL = struct.Struct("<8si")
+TILE_INT = struct.Struct("<i")
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            rng[0] = mid
+        else:
+            bits = bits * 2
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Возвращает (min_lat, min_lon, max_lat, max_lon) ячейки."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_INDEX[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def approx_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_KM * math.hypot(x, y)
+
+
+class _Sites:
+    """Уникальные точки судов одного типа; при совпадении координат берётся первый суд."""
+
+    def __init__(self, points: Iterable[Tuple[int, float, float]]):
+        seen = {}
+        for index, lat, lon in points:
+            seen.setdefault((lat, lon), index)
+        self.coords = list(seen.keys())
+        self.indexes = list(seen.values())
+        self._corner_cache: Dict[Tuple[float, float], Tuple[int, float, float]] = {}
+
+    def nearest_two(self, lat: float, lon: float) -> Tuple[int, float, float]:
+        """(позиция ближайшей точки, расстояние до неё, расстояние до второй)."""
+        key = (lat, lon)
+        cached = self._corner_cache.get(key)
+        if cached is not None:
+            return cached
+        best = second = math.inf
+        best_pos = -1
+        for pos, (site_lat, site_lon) in enumerate(self.coords):
+            d = approx_distance_km(lat, lon, site_lat, site_lon)
+            if d < best:
+                best, second, best_pos = d, best, pos
+            elif d < second:
+                second = d
+        result = (best_pos, best, second)
+        self._corner_cache[key] = result
+        return result
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        return [pos for pos, (site_lat, site_lon) in enumerate(self.coords)
+                if approx_distance_km(lat, lon, site_lat, site_lon) <= radius_km]
+
+
+class NearestCourtTiles:
+    """Предрасчитанная таблица «ячейка geohash -> ближайший суд» для каждого типа суда.
+
+    Область обслуживания делится на ячейки geohash, начиная с min_precision. Ячейка, все углы
+    которой с запасом ближе к одному и тому же суду, целиком лежит в его области Вороного
+    (области выпуклы) и хранит индекс суда. Остальные ячейки делятся дальше до max_precision;
+    на последнем уровне граничная ячейка хранит короткий список судов-кандидатов, среди
+    которых find_nearest_court выбирает точным расчётом. Точки вне области не покрыты таблицей.
+    """
+
+    def __init__(self, min_precision: int = 2, max_precision: int = 5, margin_deg: float = 0.5):
+        self.min_precision = min_precision
+        self.max_precision = max_precision
+        self.margin_deg = margin_deg
+        self.cells: Dict[str, Dict[str, CellValue]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def build(self, points_by_type: Dict[str, Iterable[Tuple[int, float, float]]]) -> "NearestCourtTiles":
+        started = time.perf_counter()
+        self.cells = {}
+        self.stats = {}
+        for court_type, points in points_by_type.items():
+            sites = _Sites(points)
+            if not sites.coords:
+                continue
+            cells: Dict[str, CellValue] = {}
+            stats = {"uniform": 0, "boundary": 0}
+            for geohash in self._cover(sites):
+                self._fill(geohash, sites, cells, stats)
+            self.cells[court_type] = cells
+            self.stats[court_type] = stats
+        logger.info(f"Таблица ближайших судов построена за {time.perf_counter() - started:.2f} с: {self.stats}")
+        return self
+
+    def _cover(self, sites: _Sites) -> List[str]:
+        lats = [lat for lat, _ in sites.coords]
+        lons = [lon for _, lon in sites.coords]
+        min_lat, max_lat = min(lats) - self.margin_deg, max(lats) + self.margin_deg
+        min_lon, max_lon = min(lons) - self.margin_deg, max(lons) + self.margin_deg
+        start = geohash_encode(min_lat, min_lon, self.min_precision)
+        s_lat, s_lon, e_lat, e_lon = geohash_bbox(start)
+        step_lat, step_lon = e_lat - s_lat, e_lon - s_lon
+        cover = []
+        lat = s_lat + step_lat / 2
+        while lat - step_lat / 2 < max_lat:
+            lon = s_lon + step_lon / 2
+            while lon - step_lon / 2 < max_lon:
+                cover.append(geohash_encode(lat, lon, self.min_precision))
+                lon += step_lon
+            lat += step_lat
+        return cover
+
+    def _fill(self, geohash: str, sites: _Sites, cells: Dict[str, CellValue], stats: Dict[str, int]):
+        min_lat, min_lon, max_lat, max_lon = geohash_bbox(geohash)
+        corners = [sites.nearest_two(lat, lon) for lat in (min_lat, max_lat) for lon in (min_lon, max_lon)]
+        owner = corners[0][0]
+        if all(pos == owner and second - best > best * MARGIN_RATIO + MARGIN_KM
+               for pos, best, second in corners):
+            cells[geohash] = sites.indexes[owner]
+            stats["uniform"] += 1
+            return
+        if len(geohash) < self.max_precision:
+            for char in GEOHASH_ALPHABET:
+                self._fill(geohash + char, sites, cells, stats)
+            return
+        # Граничная ячейка: для любой её точки p и центра c ближайший суд s удовлетворяет
+        # d(c, s) <= d(c, s1) + 2r, где r — половина диагонали ячейки.
+        center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+        _, nearest_km, _ = sites.nearest_two(center_lat, center_lon)
+        radius_km = approx_distance_km(min_lat, min_lon, max_lat, max_lon) / 2
+        limit = (nearest_km + 2 * radius_km) * (1 + MARGIN_RATIO) + MARGIN_KM
+        cells[geohash] = tuple(sorted(sites.indexes[pos] for pos in sites.within(center_lat, center_lon, limit)))
+        stats["boundary"] += 1
+
+    def lookup(self, lat: float, lon: float, court_type: str) -> Optional[CellValue]:
+        """Индекс ближайшего суда, кортеж кандидатов для граничной ячейки или None вне таблицы."""
+        cells = self.cells.get(court_type)
+        if not cells:
+            return None
+        geohash = geohash_encode(lat, lon, self.max_precision)
+        for length in range(self.min_precision, self.max_precision + 1):
+            value = cells.get(geohash[:length])
+            if value is not None:
+                return value
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(cells) for cells in self.cells.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            "min_precision": self.min_precision,
+            "max_precision": self.max_precision,
+            "cells": self.cells,
+            "stats": self.stats,
+        }
+
+    def pack(self) -> Tuple[Dict, bytes, bytes]:
+        """Таблица для чтения на месте (MappedNearestTiles): описание, ячейки и кандидаты.
+
+        Ячейки каждого типа отсортированы по geohash, поэтому ищутся двоичным поиском.
+        """
+        if self.max_precision > TILE_CELL.size - TILE_INT.size:
+            raise ValueError(f"geohash длиннее {TILE_CELL.size - TILE_INT.size} символов не помещается в ячейку")
+        cells = bytearray()
+        candidates: List[int] = []
+        ranges = {}
+        for court_type, type_cells in self.cells.items():
+            ranges[court_type] = [len(cells) // TILE_CELL.size, len(type_cells)]
+            for geohash in sorted(type_cells):
+                value = type_cells[geohash]
+                if not isinstance(value, int):
+                    offset = len(candidates)
+                    candidates.append(len(value))
+                    candidates.extend(value)
+                    value = -1 - offset
+                cells += TILE_CELL.pack(geohash.encode("ascii"), value)
+        meta = {"min_precision": self.min_precision, "max_precision": self.max_precision, "types": ranges,
+                "stats": self.stats}
+        return meta, bytes(cells), struct.pack(f"<{len(candidates)}i", *candidates)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NearestCourtTiles":
+        tiles = cls(min_precision=data["min_precision"], max_precision=data["max_precision"])
+        tiles.cells = {
+            court_type: {geohash: value if isinstance(value, int) else tuple(value) for geohash, value in cells.items()}
+            for court_type, cells in data["cells"].items()
+        }
+        tiles.stats = data["stats"]
+        return tiles
+
+
+
+class MappedNearestTiles:
+    """Таблица ближайших судов, читаемая на месте из буфера (отображённого в память снимка).
+
+    Формат — NearestCourtTiles.pack(); поиск тот же, что у NearestCourtTiles.lookup, но ячейки
+    не разбираются в словари, поэтому таблица не занимает память каждого воркера.
+    """
+
+    def __init__(self, meta: Dict, cells, candidates):
+        self.min_precision = meta["min_precision"]
+        self.max_precision = meta["max_precision"]
+        self.stats = meta["stats"]
+        self._types = {court_type: tuple(bounds) for court_type, bounds in meta["types"].items()}
+        self._cells = cells
+        self._candidates = candidates
+
+    def _find(self, key: bytes, start: int, count: int) -> Optional[int]:
+        low, high = start, start + count
+        while low < high:
+            middle = (low + high) // 2
+            cell_key, value = TILE_CELL.unpack_from(self._cells, middle * TILE_CELL.size)
+            if cell_key == key:
+                return value
+            if cell_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _value(self, value: int) -> CellValue:
+        if value >= 0:
+            return value
+        offset = (-1 - value) * TILE_INT.size
+        (count,) = TILE_INT.unpack_from(self._candidates, offset)
+        return struct.unpack_from(f"<{count}i", self._candidates, offset + TILE_INT.size)
+
+    def lookup(self, lat: float, lon: float, court_type: str) -> Optional[CellValue]:
+        """Индекс ближайшего суда, кортеж кандидатов для граничной ячейки или None вне таблицы."""
+        bounds = self._types.get(court_type)
+        if not bounds or not bounds[1]:
+            return None
+        geohash = geohash_encode(lat, lon, self.max_precision).encode("ascii")
+        for length in range(self.min_precision, self.max_precision + 1):
+            value = self._find(geohash[:length].ljust(TILE_CELL.size - TILE_INT.size, b"\0"), *bounds)
+            if value is not None:
+                return self._value(value)
+        return None
+
+    def __len__(self) -> int:
+        return sum(count for _, count in self._types.values())
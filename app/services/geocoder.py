@@ -1,26 +1,90 @@
 # app/services/geocoder.py
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import deque
 import httpx
-from typing import Tuple, Optional
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
 from app.core.config import settings
+from app.core.tracing import current_span, tracer
+from app.services.address_suggest import address_key
+from app.services.shared_cache import shared_cache
+from app.services.territory_index import parse_address
+from app.services.upstream import SERVICE_YANDEX, UpstreamLimited, upstream
 import logging
 
 logger = logging.getLogger(__name__)
 
+Coords = Tuple[float, float]
 
-async def geocode_address(address: str) -> Optional[Tuple[float, float]]:
-    try:
-        logger.info(f"Запрос геокодирования для адреса: {address}")
-        logger.info(f"Используемый API-ключ: {settings.YANDEX_GEOCODER_API_KEY[:4]}...")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://geocode-maps.yandex.ru/1.x/",
-                params={
-                    "apikey": settings.YANDEX_GEOCODER_API_KEY,
-                    "geocode": address,
-                    "format": "json"
-                },
-                timeout=10.0
-            )
+
+class GeocoderProvider(ABC):
+    """Источник координат. Учитывает задержки успешных ответов, по которым
+    HedgedGeocoder решает, когда подключать следующий источник."""
+
+    name = "provider"
+
+    def __init__(self, timeout: float = 10.0, window: int = 200):
+        self.timeout = timeout
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+
+    @abstractmethod
+    async def request(self, address: str) -> Optional[Coords]:
+        """Координаты (широта, долгота) или None; ошибки источник обрабатывает сам."""
+
+    async def geocode(self, address: str) -> Optional[Coords]:
+        self.requests += 1
+        started = time.monotonic()
+        with tracer.span(f"geocoder.{self.name}") as span:
+            try:
+                coords = await self.request(address)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            span.set("found", coords is not None)
+        if coords is None:
+            self.failures += 1
+        else:
+            self.latencies.append(time.monotonic() - started)
+        return coords
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def stats(self) -> Dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {"requests": self.requests, "failures": self.failures, "cancelled": self.cancelled,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None}
+
+
+class YandexProvider(GeocoderProvider):
+    name = "yandex"
+
+    async def request(self, address: str) -> Optional[Coords]:
+        data = None
+        try:
+            logger.info(f"Запрос геокодирования для адреса: {address}")
+            logger.info(f"Используемый API-ключ: {settings.YANDEX_GEOCODER_API_KEY[:4]}...")
+            async with upstream[SERVICE_YANDEX].call() as call:
+                async with httpx.AsyncClient() as client:
+                    response = await client.get(
+                        settings.YANDEX_GEOCODER_URL,
+                        params={
+                            "apikey": settings.YANDEX_GEOCODER_API_KEY,
+                            "geocode": address,
+                            "format": "json"
+                        },
+                        timeout=self.timeout
+                    )
+                call.observe(response.status_code)
+            current_span().set("http.status_code", response.status_code)
             logger.info(f"Статус ответа API: {response.status_code}")
             if response.status_code != 200:
                 logger.error(f"Ошибка API геокодирования: статус {response.status_code}, текст: {response.text}")
@@ -34,15 +98,195 @@ async def geocode_address(address: str) -> Optional[Tuple[float, float]]:
             lon, lat = map(float, pos.split())
             logger.info(f"Успешное геокодирование адреса {address}: ({lat}, {lon})")
             return (lat, lon)
-    except httpx.TimeoutException:
-        logger.error(f"Превышено время ожидания при геокодировании адреса: {address}")
-        return None
-    except httpx.RequestError as e:
-        logger.error(f"Ошибка запроса к API геокодирования: {str(e)}")
-        return None
-    except (KeyError, ValueError) as e:
-        logger.error(f"Ошибка обработки ответа API: {str(e)}, данные: {data}")
-        return None
-    except Exception as e:
-        logger.error(f"Неизвестная ошибка в geocode_address: {str(e)}")
-        return None
+        except UpstreamLimited as e:
+            logger.warning(f"Запрос к геокодеру не отправлен ({e.reason}): {address}")
+            current_span().set("upstream.limited", e.reason)
+            return None
+        except httpx.TimeoutException:
+            logger.error(f"Превышено время ожидания при геокодировании адреса: {address}")
+            return None
+        except httpx.RequestError as e:
+            logger.error(f"Ошибка запроса к API геокодирования: {str(e)}")
+            return None
+        except (KeyError, ValueError) as e:
+            logger.error(f"Ошибка обработки ответа API: {str(e)}, данные: {data}")
+            return None
+        except Exception as e:
+            logger.error(f"Неизвестная ошибка в geocode_address: {str(e)}")
+            return None
+
+
+class NominatimProvider(GeocoderProvider):
+    """Собственный экземпляр Nominatim (OpenStreetMap), API /search."""
+
+    name = "nominatim"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        super().__init__(timeout)
+        self.url = url.rstrip("/")
+
+    async def request(self, address: str) -> Optional[Coords]:
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{self.url}/search",
+                    params={"q": address, "format": "json", "limit": 1, "countrycodes": "ru"},
+                    headers={"User-Agent": "court-jurisdiction-api"},
+                    timeout=self.timeout
+                )
+            current_span().set("http.status_code", response.status_code)
+            if response.status_code != 200:
+                logger.error(f"Ошибка Nominatim: статус {response.status_code}")
+                return None
+            results = response.json()
+            if not results:
+                logger.warning(f"Nominatim не нашёл адрес: {address}")
+                return None
+            return (float(results[0]["lat"]), float(results[0]["lon"]))
+        except (httpx.HTTPError, KeyError, ValueError, TypeError) as e:
+            logger.error(f"Ошибка запроса к Nominatim: {type(e).__name__}: {str(e)}")
+            return None
+
+
+class GazetteerProvider(GeocoderProvider):
+    """Локальный справочник «населённый пункт -> координаты здания суда».
+
+    Содержит только населённые пункты с единственным адресом суда: для адреса в таком
+    пункте ближайший суд определяется верно и без точных координат. Справочник грубее
+    сетевых источников, поэтому используется, только когда они не ответили.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, entries: Optional[Dict[str, Coords]] = None):
+        super().__init__(timeout=0)
+        self.entries = entries or {}
+
+    async def request(self, address: str) -> Optional[Coords]:
+        settlement = parse_address(address)[0]
+        return self.entries.get(settlement) if settlement else None
+
+
+def build_gazetteer(courts: Iterable[Dict]) -> Dict[str, Coords]:
+    locations: Dict[str, set] = {}
+    for court in courts:
+        lat, lon = court.get("latitude"), court.get("longitude")
+        if lat is None or lon is None or not court.get("address"):
+            continue
+        settlement = parse_address(court["address"])[0]
+        # «д. 9» в адресе суда — номер дома, а не деревня
+        if settlement and not any(char.isdigit() for char in settlement):
+            locations.setdefault(settlement, set()).add((lat, lon))
+    return {settlement: next(iter(points)) for settlement, points in locations.items() if len(points) == 1}
+
+
+class HedgedGeocoder:
+    """Опрашивает сетевые источники с подстраховкой (hedging).
+
+    Основной источник запрашивается сразу. Если он не ответил за свою наблюдаемую p95
+    (в пределах [min_delay, max_delay]) или ответил неудачей, параллельно запрашивается
+    следующий; побеждает первый непустой ответ, остальные запросы отменяются. Общий срок —
+    timeout.
+    """
+
+    def __init__(self, providers: Sequence[GeocoderProvider], timeout: float = 10.0, min_delay: float = 0.05,
+                 max_delay: float = 2.0, default_delay: float = 0.5):
+        self.providers = list(providers)
+        self.timeout = timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.hedged = 0
+        self.wins: Dict[str, int] = {}
+
+    def hedge_delay(self, provider: GeocoderProvider) -> float:
+        p95 = provider.percentile(0.95)
+        return min(self.max_delay, max(self.min_delay, p95 if p95 is not None else self.default_delay))
+
+    async def geocode(self, address: str) -> Optional[Coords]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        waiting = list(self.providers)
+        tasks: Dict[asyncio.Task, GeocoderProvider] = {}
+
+        def launch() -> Optional[GeocoderProvider]:
+            if not waiting:
+                return None
+            provider = waiting.pop(0)
+            tasks[loop.create_task(provider.geocode(address))] = provider
+            return provider
+
+        latest = launch()
+        try:
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"Геокодеры не ответили за {self.timeout} с: {address}")
+                    return None
+                timeout = min(self.hedge_delay(latest), remaining) if waiting else remaining
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not waiting:
+                        continue
+                    self.hedged += 1
+                    hedge = launch()
+                    logger.info(f"Геокодер {latest.name} не ответил за {timeout * 1000:.0f} мс, "
+                                f"параллельно запрашиваем {hedge.name}")
+                    latest = hedge
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    coords = task.result()
+                    if coords:
+                        self.wins[provider.name] = self.wins.get(provider.name, 0) + 1
+                        return coords
+                # Неудачный ответ: следующий источник подключается сразу
+                latest = launch() or latest
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        return {"hedged": self.hedged, "wins": dict(self.wins),
+                "providers": {provider.name: {**provider.stats(), "hedge_delay_ms": round(
+                    self.hedge_delay(provider) * 1000, 1)} for provider in self.providers}}
+
+
+def _create_geocoder() -> HedgedGeocoder:
+    providers: List[GeocoderProvider] = [YandexProvider(timeout=settings.GEOCODER_TIMEOUT)]
+    if settings.NOMINATIM_URL:
+        providers.append(NominatimProvider(settings.NOMINATIM_URL, timeout=settings.GEOCODER_TIMEOUT))
+    return HedgedGeocoder(providers, timeout=settings.GEOCODER_TIMEOUT,
+                          min_delay=settings.GEOCODER_HEDGE_MIN_DELAY, max_delay=settings.GEOCODER_HEDGE_MAX_DELAY)
+
+
+geocoder = _create_geocoder()
+# Заполняется CourtFinder.load_courts_data
+gazetteer = GazetteerProvider()
+
+
+async def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+    """Координаты адреса; результат кэшируется для всех воркеров по нормализованному адресу.
+
+    Если сетевые геокодеры ничего не дали, берутся координаты из локального справочника;
+    такой ответ не кэшируется, чтобы следующий запрос снова попробовал точные источники.
+    """
+    with tracer.span("geocode_address") as span:
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return geocoder.geocode(address)
+
+        coords = await shared_cache.get_or_compute(f"geo:{address_key(address)}", compute,
+                                                   settings.CACHE_GEOCODE_TTL)
+        span.set("cache.hit", bool(coords) and not computed)
+        if coords:
+            span.set("source", "geocoder")
+            return tuple(coords)
+        coords = await gazetteer.geocode(address)
+        if coords:
+            logger.info(f"Координаты адреса {address} взяты из локального справочника")
+            span.set("source", "gazetteer")
+        return coords
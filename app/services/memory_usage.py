@@ -0,0 +1,83 @@
+# app/services/memory_usage.py
+import time
+from typing import Dict, Optional, Set
+
+from app.core.memory import allocation_tracer, deep_sizeof, process_rss
+from app.core.msgpack_codec import _SHORT_STRINGS
+from app.services.court_finder import CourtFinder
+from app.services.court_store import CourtSnapshot
+from app.services.geocoder import gazetteer
+from app.services.shared_cache import shared_cache
+
+
+def _tier(entries: int, size: int, evictions: Optional[int] = None, **extra) -> Dict:
+    item = {"entries": entries, "bytes": size}
+    if evictions is not None:
+        item["evictions"] = evictions
+    item.update(extra)
+    return item
+
+
+def _courts(seen: Set[int]) -> Dict:
+    courts = CourtFinder.courts_data
+    if not isinstance(courts, CourtSnapshot):
+        return _tier(len(courts), deep_sizeof(courts, seen), storage="heap")
+    # Записи снимка лежат в отображённом файле (общем для воркеров); в куче — только разобранный LRU
+    info = courts.decoded_cache_info()
+    decoded = info.currsize * deep_sizeof(courts[0]) if info.currsize else 0
+    return _tier(len(courts), deep_sizeof(courts, seen) + decoded, storage="snapshot",
+                 mapped_bytes=courts.mapped_bytes,
+                 decoded_cache={"entries": info.currsize, "capacity": info.maxsize, "hits": info.hits,
+                                "misses": info.misses})
+
+
+def memory_report() -> Dict:
+    """Память воркера по структурам: набор данных, производные индексы и уровни кэша.
+
+    Размеры приблизительные (deep_sizeof). Структуры обходятся в порядке перечисления с общим
+    множеством уже учтённых объектов: записи судов, на которые ссылаются индексы, считаются
+    один раз — в courts_data. Выполняется долго на больших кэшах, вызывать из потока.
+    """
+    started = time.perf_counter()
+    seen: Set[int] = set()
+    structures = {"courts_data": _courts(seen)}
+
+    payloads = CourtFinder.payloads
+    structures["payloads"] = _tier(len(payloads), deep_sizeof(payloads, seen))
+    suggest = CourtFinder.suggest_index
+    structures["suggest_index"] = _tier(len(suggest), deep_sizeof(suggest, seen), suggest.evictions,
+                                        debtor_entries=suggest.debtor_entries,
+                                        max_debtor_entries=suggest.max_debtor_entries)
+    tiles = CourtFinder.nearest_tiles
+    structures["nearest_tiles"] = _tier(len(tiles), deep_sizeof(tiles, seen))
+    structures["territory_index"] = _tier(len(CourtFinder.territory_index),
+                                          deep_sizeof(CourtFinder.territory_index, seen))
+    structures["court_districts"] = _tier(len(CourtFinder.court_districts),
+                                          deep_sizeof(CourtFinder.court_districts, seen))
+    structures["name_index"] = _tier(len(CourtFinder.name_index), deep_sizeof(CourtFinder.name_index, seen))
+    structures["gazetteer"] = _tier(len(gazetteer.entries), deep_sizeof(gazetteer.entries, seen))
+    renderer = CourtFinder.tile_renderer
+    if renderer is not None:
+        # Геометрии территорий хранятся в GEOS, вне кучи Python: оцениваются размером WKB
+        geometry = sum(len(shape.wkb) for territories in renderer.territories.values()
+                       for shape, _ in territories)
+        structures["tile_renderer"] = _tier(len(renderer), deep_sizeof(renderer, seen) + geometry,
+                                            renderer.evictions, capacity=renderer.cache_size,
+                                            geometry_bytes=geometry)
+
+    near = shared_cache.near
+    caches = {
+        "near": _tier(len(near), deep_sizeof(near, seen), near.evictions, capacity=near.size,
+                      expirations=near.expirations),
+        "msgpack_strings": _tier(len(_SHORT_STRINGS), deep_sizeof(_SHORT_STRINGS, seen)),
+    }
+    total = sum(item["bytes"] for item in structures.values()) + sum(item["bytes"] for item in caches.values())
+    return {
+        "rss_bytes": process_rss(),
+        "accounted_bytes": total,
+        "dataset_version": CourtFinder.dataset_version,
+        "structures": structures,
+        "caches": caches,
+        "tracemalloc": allocation_tracer.status(),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
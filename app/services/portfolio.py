@@ -0,0 +1,382 @@
+# app/services/portfolio.py
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import ContextManager, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.address_suggest import address_key
+from app.services.court_finder import (
+    CONFIDENCE_HIGH, CONFIDENCE_LOW, CONFIDENCE_MEDIUM, PATH_FALLBACK_DISTRICT, PATH_FALLBACK_GUESS,
+    PATH_NEAREST, PATH_TERRITORY, CourtFinder
+)
+from app.services.court_store import source_fingerprint
+from app.services.geocoder import geocode_address
+from app.services.upstream import PRIORITY_BACKGROUND, upstream_priority
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_COLUMNS = ("address", "адрес", "адрес должника")
+DEBT_COLUMNS = ("debt_amount", "сумма", "сумма долга")
+RESULT_COLUMNS = ["court_name", "court_type", "court_address", "court_website", "court_latitude",
+                  "court_longitude", "confidence", "path", "error"]
+
+Item = Tuple[str, float]  # адрес, сумма долга
+Result = Tuple  # значения RESULT_COLUMNS
+
+
+# --- Работа в процессах пула ---------------------------------------------------------------------
+
+def _init_worker():
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.ERROR)
+    logging.getLogger().addHandler(handler)
+    if not CourtFinder.courts_data:
+        CourtFinder.load_courts_data()
+
+
+def _court_result(index: int, path: str, confidence: str) -> Result:
+    court = CourtFinder.court_response(index)
+    return (court["name"], court["type"], court["address"], court["website"], court["latitude"],
+            court["longitude"], confidence, path, "")
+
+
+def _local_pass(items: Sequence[Item]) -> List[Tuple[Optional[Result], str]]:
+    """Всё, что не требует сети: участок по территории подсудности.
+
+    Для каждой строки возвращает (результат или None, ключ для геокодирования).
+    """
+    output = []
+    for address, debt_amount in items:
+        target_type = CourtFinder.determine_court_type(debt_amount)
+        if target_type == "мировой":
+            court_index = CourtFinder.territory_index.lookup(address)
+            if court_index is not None:
+                output.append((_court_result(court_index, PATH_TERRITORY, CONFIDENCE_HIGH), ""))
+                continue
+        output.append((None, address_key(address)))
+    return output
+
+
+def _coords_pass(items: Sequence[Tuple[str, float, Optional[Tuple[float, float]]]]) -> List[Result]:
+    """Ближайший суд по координатам, иначе суд района из адреса, иначе название по району."""
+    output = []
+    for address, debt_amount, coords in items:
+        target_type = CourtFinder.determine_court_type(debt_amount)
+        if coords:
+            court_index = CourtFinder.nearest_court_index(coords, target_type)
+            if court_index is not None:
+                output.append(_court_result(court_index, PATH_NEAREST, CONFIDENCE_MEDIUM))
+                continue
+        district = CourtFinder.get_district_from_address(address)
+        court_index = CourtFinder.district_court_index(district, target_type)
+        if court_index is not None:
+            output.append(_court_result(court_index, PATH_FALLBACK_DISTRICT, CONFIDENCE_LOW))
+            continue
+        name = f"{district} районный суд" if target_type == "районный" else f"Судебный участок {district} район"
+        lat, lon = coords if coords else (None, None)
+        output.append((name, target_type, "", "", lat, lon, CONFIDENCE_LOW, PATH_FALLBACK_GUESS, ""))
+    return output
+
+
+# --- Геокодирование в основном процессе ----------------------------------------------------------
+
+class SharedGeocoder:
+    """Один геокодер на весь прогон: ограничение одновременных запросов и кэш по нормализованному
+    адресу (в портфелях один и тот же адрес встречается у многих должников). Скорость и суточную
+    квоту задаёт общий планировщик app.services.upstream: прогон идёт с фоновым приоритетом."""
+
+    def __init__(self, concurrency: int, cache_size: int = 200000):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache: Dict[str, Optional[Tuple[float, float]]] = {}
+        self.cache_size = cache_size
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+
+    async def geocode(self, key: str, address: str) -> Optional[Tuple[float, float]]:
+        if key in self.cache:
+            return self.cache[key]
+        while (pending := self._pending.get(key)) is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Отменён запрос, выполнявший геокодирование, а не этот — пробуем сами
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            async with self.semaphore:
+                self.requests += 1
+                coords = await geocode_address(address)
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[key] = coords
+            future.set_result(coords)
+            return coords
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ожидающих может не быть
+            raise
+        finally:
+            del self._pending[key]
+
+
+# --- Чтение входного файла -----------------------------------------------------------------------
+
+def _find_column(header: Sequence[str], explicit: Optional[str], aliases: Sequence[str]) -> int:
+    names = [str(name or "").strip().lower() for name in header]
+    for candidate in ([explicit] if explicit else aliases):
+        if candidate.strip().lower() in names:
+            return names.index(candidate.strip().lower())
+    raise ValueError(f"Во входном файле нет столбца {explicit or ' / '.join(aliases)}; есть: {list(header)}")
+
+
+@contextmanager
+def _read_csv(path: Path) -> Iterator[Tuple[List[str], Iterator[List[str]], str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+        except csv.Error:
+            delimiter = ","
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, [])
+        yield header, reader, delimiter
+
+
+@contextmanager
+def _read_xlsx(path: Path) -> Iterator[Tuple[List[str], Iterator[List[str]], str]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Для чтения XLSX установите openpyxl (pip install openpyxl) "
+                           "или сохраните портфель в CSV")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(value or "") for value in next(rows, ())]
+        yield header, ([("" if value is None else str(value)) for value in row] for row in rows), ";"
+    finally:
+        # В режиме read_only книга держит файл открытым до close()
+        workbook.close()
+
+
+def read_portfolio(path: Path) -> ContextManager[Tuple[List[str], Iterator[List[str]], str]]:
+    """(заголовок, поток строк, разделитель для выходного CSV); файл закрывается при выходе из with."""
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+def _parse_debt(value: str) -> float:
+    return float(str(value).replace("\xa0", "").replace(" ", "").replace(",", "."))
+
+
+# --- Прогон с контрольной точкой -----------------------------------------------------------------
+
+class Checkpoint:
+    """Сколько строк входа обработано и какой длины при этом был выходной файл.
+
+    Записывается атомарно после каждой пачки, уже сброшенной на диск. При возобновлении
+    выход обрезается до сохранённой длины, поэтому недописанная пачка не дублируется.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self) -> Optional[Dict]:
+        if not self.path.exists():
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, state: Dict):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class PortfolioRunner:
+    def __init__(self, input_path: Path, output_path: Path, workers: int = os.cpu_count() or 1,
+                 chunk_size: int = 500, geocode_concurrency: int = 8,
+                 geocode: bool = True, address_column: Optional[str] = None, debt_column: Optional[str] = None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.geocode_concurrency = geocode_concurrency
+        self.use_geocoder = geocode
+        self.address_column = address_column
+        self.debt_column = debt_column
+        self.checkpoint = Checkpoint(output_path.with_name(output_path.name + ".checkpoint"))
+        self.stats = {"rows": 0, "errors": 0, PATH_TERRITORY: 0, PATH_NEAREST: 0,
+                      PATH_FALLBACK_DISTRICT: 0, PATH_FALLBACK_GUESS: 0}
+
+    def run(self, restart: bool = False) -> Dict:
+        # spawn: воркеры не наследуют событийный цикл и потоки основного процесса
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker) as pool:
+            return asyncio.run(self._run(pool, restart))
+
+    async def _run(self, pool: ProcessPoolExecutor, restart: bool) -> Dict:
+        with read_portfolio(self.input_path) as (header, rows, delimiter):
+            return await self._run_rows(pool, restart, header, rows, delimiter)
+
+    async def _run_rows(self, pool: ProcessPoolExecutor, restart: bool, header: List[str],
+                        rows: Iterator[List[str]], delimiter: str) -> Dict:
+        address_col = _find_column(header, self.address_column, ADDRESS_COLUMNS)
+        debt_col = _find_column(header, self.debt_column, DEBT_COLUMNS)
+        fingerprint = source_fingerprint(self.input_path)
+
+        state = None if restart else self.checkpoint.load()
+        if state and state.get("input_fingerprint") != fingerprint:
+            raise RuntimeError(f"Входной файл изменился после прерванного прогона ({self.checkpoint.path}); "
+                               f"запустите с --restart")
+        done_rows = state["rows"] if state else 0
+        if state:
+            self.stats.update(state.get("stats", {}))
+            logger.info(f"Продолжение прогона с строки {done_rows + 1}")
+            output = open(self.output_path, "r+b")
+            output.truncate(state["output_size"])
+            output.seek(state["output_size"])
+            rows = itertools.islice(rows, done_rows, None)
+        else:
+            output = open(self.output_path, "wb")
+            output.write(self._encode([header + RESULT_COLUMNS], delimiter))
+
+        # Прогон не должен отнимать у живых запросов API скорость и квоту геокодера
+        upstream_priority.set(PRIORITY_BACKGROUND)
+        geocoder = SharedGeocoder(self.geocode_concurrency)
+        in_flight: Deque[asyncio.Task] = deque()
+        started = time.monotonic()
+        session_rows = 0
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if chunk:
+                    in_flight.append(asyncio.create_task(self._process(pool, geocoder, chunk, address_col, debt_col)))
+                # Пачки обрабатываются параллельно, а пишутся строго по порядку входа
+                while in_flight and (not chunk or len(in_flight) > self.workers * 2):
+                    chunk_rows, results = await in_flight.popleft()
+                    output.write(self._encode([row + list(result) for row, result in zip(chunk_rows, results)],
+                                              delimiter))
+                    output.flush()
+                    os.fsync(output.fileno())
+                    self._count(results)
+                    done_rows += len(chunk_rows)
+                    session_rows += len(chunk_rows)
+                    self.checkpoint.save({"input": str(self.input_path), "input_fingerprint": fingerprint,
+                                          "rows": done_rows, "output_size": output.tell(), "stats": self.stats})
+                    elapsed = time.monotonic() - started
+                    logger.info(f"Обработано строк: {done_rows} ({session_rows / max(elapsed, 1e-9):.0f} строк/с, "
+                                f"запросов геокодера: {geocoder.requests})")
+                if not chunk:
+                    break
+        finally:
+            for task in in_flight:
+                task.cancel()
+            output.close()
+        logger.info(f"Прогон завершён: {self.stats}")
+        return self.stats
+
+    @staticmethod
+    def _encode(rows: List[List], delimiter: str) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=delimiter).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    async def _process(self, pool: ProcessPoolExecutor, geocoder: SharedGeocoder, chunk: List[List[str]],
+                       address_col: int, debt_col: int) -> Tuple[List[List[str]], List[Result]]:
+        loop = asyncio.get_running_loop()
+        results: List[Optional[Result]] = [None] * len(chunk)
+        items, positions = [], []
+        for i, row in enumerate(chunk):
+            address = row[address_col].strip() if address_col < len(row) else ""
+            try:
+                debt_amount = _parse_debt(row[debt_col] if debt_col < len(row) else "")
+            except ValueError:
+                debt_amount = None
+            if len(address) < 5 or debt_amount is None:
+                error = "нет адреса" if len(address) < 5 else "неверная сумма долга"
+                results[i] = ("",) * (len(RESULT_COLUMNS) - 1) + (error,)
+                continue
+            items.append((address, debt_amount))
+            positions.append(i)
+
+        unresolved = []
+        for (address, debt_amount), i, (result, key) in zip(
+                items, positions, await loop.run_in_executor(pool, _local_pass, items)):
+            if result is not None:
+                results[i] = result
+            else:
+                unresolved.append((i, address, debt_amount, key))
+
+        if unresolved:
+            if self.use_geocoder:
+                coords = await asyncio.gather(*(geocoder.geocode(key, address) for _, address, _, key in unresolved))
+            else:
+                coords = [None] * len(unresolved)
+            second = await loop.run_in_executor(pool, _coords_pass, [
+                (address, debt_amount, point) for (_, address, debt_amount, _), point in zip(unresolved, coords)])
+            for (i, *_), result in zip(unresolved, second):
+                results[i] = result
+        return chunk, results
+
+    def _count(self, results: List[Result]):
+        for result in results:
+            self.stats["rows"] += 1
+            if result[-1]:
+                self.stats["errors"] += 1
+            else:
+                self.stats[result[RESULT_COLUMNS.index("path")]] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Определение подсудности для портфеля должников (CSV/XLSX)")
+    parser.add_argument("input", type=Path, help="Входной файл CSV или XLSX")
+    parser.add_argument("output", type=Path, help="Выходной CSV (исходные столбцы и найденный суд)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Число процессов")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Строк в одной пачке")
+    parser.add_argument("--geocode-concurrency", type=int, default=8, help="Одновременных запросов к геокодеру")
+    parser.add_argument("--no-geocode", action="store_true", help="Не обращаться к геокодеру")
+    parser.add_argument("--address-column", help="Столбец с адресом (по умолчанию address/адрес)")
+    parser.add_argument("--debt-column", help="Столбец с суммой долга (по умолчанию debt_amount/сумма)")
+    parser.add_argument("--restart", action="store_true", help="Начать заново, игнорируя контрольную точку")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger("app.services.geocoder").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    runner = PortfolioRunner(args.input, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                             geocode_concurrency=args.geocode_concurrency,
+                             geocode=not args.no_geocode, address_column=args.address_column,
+                             debt_column=args.debt_column)
+    try:
+        runner.run(restart=args.restart)
+    except (RuntimeError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # python -m app.services.portfolio debtors.csv courts.csv --workers 8
+    main()
@@ -0,0 +1,158 @@
+# app/services/shadow.py
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+from app.core.config import settings
+from app.services.address_suggest import address_key
+from app.services.court_names import normalize_court_name
+
+logger = logging.getLogger(__name__)
+
+# Движок-кандидат: (адрес, сумма, тип дела) -> суд или None, если движок не знает ответа
+CandidateEngine = Callable[[str, float, str], Awaitable[Optional[Dict]]]
+
+OUTCOME_AGREE = "agree"
+OUTCOME_DISAGREE = "disagree"
+OUTCOME_NO_ANSWER = "no_answer"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+
+def court_key(court: Dict) -> Optional[str]:
+    """Ключ для сравнения решений: код суда, иначе нормализованное название."""
+    if court.get("code"):
+        return court["code"].upper()
+    return normalize_court_name(court["name"]) if court.get("name") else None
+
+
+def address_digest(address: str) -> str:
+    """Отпечаток адреса вместо самого адреса: адреса должников — персональные данные. По нему
+    расхождение находится в журнале решений (sha256 от address_key адреса)."""
+    return hashlib.sha256(address_key(address).encode("utf-8")).hexdigest()[:16]
+
+
+def _percentiles(values: Deque[float]) -> Dict:
+    if not values:
+        return {"p50": None, "p95": None}
+    ordered = sorted(values)
+    return {"p50": round(ordered[len(ordered) // 2], 1),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)}
+
+
+class ShadowRunner:
+    """Теневой запуск нового движка поиска суда на живом трафике.
+
+    Для доли sample_rate запросов движок-кандидат выполняется уже после ответа клиенту, в
+    отдельной задаче, и его решение сравнивается с решением текущего пути. Считаются
+    совпадения и расхождения (по пути, которым нашёл суд текущий движок), задержки обоих и их
+    разница; последние расхождения хранятся для разбора (с отпечатком адреса, а не самим
+    адресом). Одновременно выполняется не больше
+    max_in_flight теневых запусков, лишние пропускаются: тень не должна нагружать сервис.
+    """
+
+    def __init__(self, candidate: Optional[CandidateEngine] = None, name: str = "", sample_rate: float = 0.0,
+                 max_in_flight: int = 16, timeout: float = 5.0, window: int = 1000, keep: int = 100):
+        self.candidate = candidate
+        self.name = name
+        self.sample_rate = sample_rate
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._tasks: Set[asyncio.Task] = set()
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+        self.skipped = 0
+        self.primary_ms: Deque[float] = deque(maxlen=window)
+        self.candidate_ms: Deque[float] = deque(maxlen=window)
+        self.delta_ms: Deque[float] = deque(maxlen=window)
+        self.disagreements: Deque[Dict] = deque(maxlen=keep)
+
+    @property
+    def enabled(self) -> bool:
+        return self.candidate is not None and self.sample_rate > 0
+
+    def observe(self, address: str, debt_amount: float, case_type: str, court: Dict, path: str,
+                elapsed: Optional[float]):
+        """Решение текущего пути; elapsed — его задержка в секундах (None — ответ из кэша)."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return
+        if len(self._tasks) >= self.max_in_flight:
+            self.skipped += 1
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._run(address, debt_amount, case_type, court, path, elapsed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, address: str, debt_amount: float, case_type: str, primary: Dict, path: str,
+                   elapsed: Optional[float]):
+        started = time.monotonic()
+        candidate = None
+        try:
+            candidate = await asyncio.wait_for(self.candidate(address, debt_amount, case_type), self.timeout)
+        except asyncio.TimeoutError:
+            outcome = OUTCOME_TIMEOUT
+        except Exception as e:
+            logger.warning(f"Ошибка теневого движка {self.name}: {str(e)}")
+            outcome = OUTCOME_ERROR
+        else:
+            if candidate is None:
+                outcome = OUTCOME_NO_ANSWER
+            elif court_key(candidate) == court_key(primary):
+                outcome = OUTCOME_AGREE
+            else:
+                outcome = OUTCOME_DISAGREE
+        candidate_ms = (time.monotonic() - started) * 1000
+        counters = self.outcomes.setdefault(path, {})
+        counters[outcome] = counters.get(outcome, 0) + 1
+
+        if outcome in (OUTCOME_AGREE, OUTCOME_DISAGREE, OUTCOME_NO_ANSWER):
+            self.candidate_ms.append(candidate_ms)
+            # Ответ из кэша не быстрее движка, а просто не вычислялся: задержки не сравниваются
+            if elapsed is not None:
+                self.primary_ms.append(elapsed * 1000)
+                self.delta_ms.append(candidate_ms - elapsed * 1000)
+        if outcome == OUTCOME_DISAGREE:
+            digest = address_digest(address)
+            logger.info(f"Теневой движок {self.name} разошёлся с текущим для адреса {digest}: "
+                        f"{candidate.get('name')} вместо {primary.get('name')} ({path})")
+            self.disagreements.append({
+                "at": time.time(), "address_digest": digest, "debt_amount": debt_amount, "path": path,
+                "primary": primary.get("name"), "candidate": candidate.get("name"),
+                "primary_ms": round(elapsed * 1000, 1) if elapsed is not None else None,
+                "candidate_ms": round(candidate_ms, 1),
+            })
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+
+    def snapshot(self) -> Dict:
+        totals: Dict[str, int] = {}
+        for counters in self.outcomes.values():
+            for outcome, count in counters.items():
+                totals[outcome] = totals.get(outcome, 0) + count
+        compared = totals.get(OUTCOME_AGREE, 0) + totals.get(OUTCOME_DISAGREE, 0)
+        return {
+            "engine": self.name or None,
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "in_flight": len(self._tasks),
+            "skipped": self.skipped,
+            "outcomes": totals,
+            "agreement": round(totals.get(OUTCOME_AGREE, 0) / compared, 4) if compared else None,
+            "by_path": self.outcomes,
+            "latency_ms": {"primary": _percentiles(self.primary_ms), "candidate": _percentiles(self.candidate_ms),
+                           "delta": _percentiles(self.delta_ms)},
+            "disagreements": list(self.disagreements),
+        }
+
+
+# Движок задаёт app.services.court_finder по имени из SHADOW_ENGINE
+shadow = ShadowRunner(name=settings.SHADOW_ENGINE, sample_rate=settings.SHADOW_SAMPLE_RATE,
+                      max_in_flight=settings.SHADOW_MAX_IN_FLIGHT, timeout=settings.SHADOW_TIMEOUT)
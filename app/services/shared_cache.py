@@ -0,0 +1,379 @@
+# app/services/shared_cache.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheError(Exception):
+    pass
+
+
+# --- Клиент протокола Redis (RESP2) --------------------------------------------------------------
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, (int, float)):
+            arg = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Читает один ответ; ошибка сервера возвращается как CacheError, а не выбрасывается,
+    чтобы в конвейере можно было дочитать остальные ответы."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Соединение с сервером кэша закрыто")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode("utf-8")
+    if prefix == b"-":
+        return CacheError(rest.decode("utf-8"))
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise CacheError(f"Неизвестный ответ сервера кэша: {line[:50]!r}")
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def pipeline(self, commands: Sequence[Sequence]) -> List:
+        self.writer.write(b"".join(encode_command(*command) for command in commands))
+        await self.writer.drain()
+        return [await read_reply(self.reader) for _ in commands]
+
+    def close(self):
+        self.writer.close()
+
+
+class RedisBackend:
+    """Общий кэш на сервере, говорящем на протоколе Redis (Redis, Valkey, KeyDB и т.п.).
+
+    Пул соединений открывается лениво в текущем событийном цикле. Все команды одного вызова
+    уходят одним конвейером. URL: redis://[:пароль@]хост:порт/номер_базы.
+    """
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 0.2):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: List[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Соединения и семафор привязаны к циклу, в котором созданы
+            self._loop = loop
+            self._idle = []
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = _Connection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in await connection.pipeline(setup):
+                if isinstance(reply, CacheError):
+                    connection.close()
+                    raise reply
+        return connection
+
+    async def execute(self, commands: Sequence[Sequence]) -> List:
+        self._bind_loop()
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                replies = await asyncio.wait_for(connection.pipeline(commands), self.timeout)
+            except BaseException:
+                # Соединение в неизвестном состоянии (ответы могли остаться непрочитанными)
+                if connection is not None:
+                    connection.close()
+                raise
+            self._idle.append(connection)
+            return replies
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        reply, = await self.execute([("MGET", *keys)])
+        if isinstance(reply, CacheError):
+            raise reply
+        return reply
+
+    async def set_many(self, items: Sequence[Tuple[str, bytes]], ttl: float):
+        await self.execute([("SET", key, value, "PX", int(ttl * 1000)) for key, value in items])
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """SET NX: True, если ключа не было и он установлен."""
+        reply, = await self.execute([("SET", key, value, "NX", "PX", int(ttl * 1000))])
+        return reply == "OK"
+
+    async def get_unless_locked(self, key: str, lock_key: str) -> Tuple[Optional[bytes], bool]:
+        """(значение, держится ли ещё блокировка) одним конвейером."""
+        value, locked = await self.execute([("GET", key), ("EXISTS", lock_key)])
+        for reply in (value, locked):
+            if isinstance(reply, CacheError):
+                raise reply
+        return value, bool(locked)
+
+    async def delete(self, key: str):
+        await self.execute([("DEL", key)])
+
+    async def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+
+
+# --- Кэш с ближним уровнем -----------------------------------------------------------------------
+
+class _NearCache:
+    """LRU в памяти процесса с коротким TTL перед общим кэшем."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        item = self._items.get(key)
+        if item is None:
+            return _MISSING
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            self.expirations += 1
+            return _MISSING
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value, ttl: Optional[float] = None):
+        self._items[key] = (time.monotonic() + min(ttl or self.ttl, self.ttl), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SharedCache:
+    """Кэш результатов, общий для воркеров и узлов.
+
+    Уровни: ближний кэш процесса, затем общий сервер (если задан backend). Чтения одного
+    такта цикла собираются в один MGET. Повторное вычисление одного ключа защищено дважды:
+    внутри процесса одновременные вызовы ждут одну задачу, между процессами первый
+    берёт короткую блокировку (SET NX), а остальные ждут появления значения или снятия
+    блокировки (значение могло не попасть в кэш — тогда вычисляют сами).
+    При недоступном сервере кэш на retry_after секунд переходит на ближний уровень.
+    """
+
+    def __init__(self, backend: Optional[RedisBackend] = None, near_size: int = 10000, near_ttl: float = 60.0,
+                 lock_ttl: float = 10.0, retry_after: float = 5.0, prefix: str = "courts:"):
+        self.backend = backend
+        self.near = _NearCache(near_size, near_ttl)
+        self.lock_ttl = lock_ttl
+        self.retry_after = retry_after
+        self.prefix = prefix
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending_gets: Dict[str, List[asyncio.Future]] = {}
+        self._flush_scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._down_until = 0.0
+        self.stats = {"near_hits": 0, "shared_hits": 0, "misses": 0, "computed": 0, "waited_for_lock": 0,
+                      "backend_errors": 0, "batches": 0}
+
+    @property
+    def backend_available(self) -> bool:
+        return self.backend is not None and time.monotonic() >= self._down_until
+
+    def _backend_failed(self, error: BaseException):
+        self.stats["backend_errors"] += 1
+        if time.monotonic() >= self._down_until:
+            logger.warning(f"Общий кэш недоступен ({type(error).__name__}: {error}), "
+                           f"работаем без него {self.retry_after} с")
+        self._down_until = time.monotonic() + self.retry_after
+
+    async def _shared_get(self, key: str) -> Optional[bytes]:
+        """Чтение из общего кэша; ключи, запрошенные в одном такте цикла, читаются одним MGET."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_gets.setdefault(key, []).append(future)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            # Задача стартует на следующей итерации цикла, когда соберутся чтения этого такта;
+            # ссылка на неё хранится, чтобы её не собрал сборщик мусора
+            task = loop.create_task(self._flush_gets())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await future
+
+    async def _flush_gets(self):
+        pending, self._pending_gets = self._pending_gets, {}
+        self._flush_scheduled = False
+        keys = list(pending)
+        try:
+            values = await self.backend.get_many(keys)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self._backend_failed(e)
+            values = [None] * len(keys)
+        for key, value in zip(keys, values):
+            for future in pending[key]:
+                if not future.done():
+                    future.set_result(value)
+
+    async def get(self, key: str):
+        """Значение из ближнего или общего кэша, иначе None."""
+        value = self.near.get(key)
+        if value is not _MISSING:
+            self.stats["near_hits"] += 1
+            return value
+        if self.backend_available:
+            raw = await self._shared_get(self.prefix + key)
+            if raw is not None:
+                self.stats["shared_hits"] += 1
+                value = orjson.loads(raw)
+                self.near.put(key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value, ttl: float):
+        self.near.put(key, value, ttl)
+        if self.backend_available:
+            try:
+                await self.backend.set_many([(self.prefix + key, orjson.dumps(value))], ttl)
+            except Exception as e:
+                self._backend_failed(e)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable], ttl: float,
+                             cacheable: Callable[[Any], bool] = lambda value: value is not None):
+        """Значение из кэша или результат compute(); compute для ключа выполняется один раз
+        на процесс и, по возможности, на весь кластер. В кэш попадают значения, для которых
+        cacheable(value) истинно (по умолчанию — не None)."""
+        value = await self.get(key)
+        if value is not None:
+            return value
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Отменили вычисляющий запрос (его дедлайн или разрыв соединения), а не нас:
+                # вычисляем сами или ждём того, кто уже начал заново
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._compute_once(key, compute, ttl, cacheable)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # ожидающих может не быть
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _compute_once(self, key: str, compute: Callable[[], Awaitable], ttl: float,
+                            cacheable: Callable[[Any], bool]):
+        lock_key = f"{self.prefix}lock:{key}"
+        locked = False
+        if self.backend_available:
+            try:
+                locked = await self.backend.add(lock_key, b"1", self.lock_ttl)
+            except Exception as e:
+                self._backend_failed(e)
+                locked = True
+            if not locked:
+                # Ключ уже вычисляет другой процесс — ждём его результат, пока держится блокировка.
+                # Если она снята, а значения нет (результат не кэшируется), вычисляем сами
+                self.stats["waited_for_lock"] += 1
+                deadline = time.monotonic() + self.lock_ttl
+                delay = 0.02
+                while time.monotonic() < deadline and self.backend_available:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                    try:
+                        raw, still_locked = await self.backend.get_unless_locked(self.prefix + key, lock_key)
+                    except Exception as e:
+                        self._backend_failed(e)
+                        break
+                    if raw is not None:
+                        self.stats["shared_hits"] += 1
+                        value = orjson.loads(raw)
+                        self.near.put(key, value)
+                        return value
+                    if not still_locked:
+                        break
+        self.stats["misses"] += 1
+        try:
+            value = await compute()
+            self.stats["computed"] += 1
+            if cacheable(value):
+                await self.set(key, value, ttl)
+            return value
+        finally:
+            if locked and self.backend_available:
+                try:
+                    await self.backend.delete(lock_key)
+                except Exception as e:
+                    self._backend_failed(e)
+
+    def snapshot(self) -> Dict:
+        return {"backend": f"{self.backend.host}:{self.backend.port}" if self.backend else None,
+                "backend_available": self.backend_available, "near_size": len(self.near), **self.stats}
+
+    async def close(self):
+        if self.backend:
+            await self.backend.close()
+
+
+shared_cache = SharedCache(
+    backend=RedisBackend(settings.CACHE_URL, timeout=settings.CACHE_TIMEOUT) if settings.CACHE_URL else None,
+    near_size=settings.CACHE_NEAR_SIZE,
+    near_ttl=settings.CACHE_NEAR_TTL,
+)
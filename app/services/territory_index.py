@@ -0,0 +1,263 @@
+# app/services/territory_index.py
+import json
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TERRITORIES_PATH = Path(__file__).parent.parent.parent / "data" / "territories_rostov.json"
+
+ANY_HOUSE = 10 ** 6
+PARITY_ANY, PARITY_ODD, PARITY_EVEN = 0, 1, 2
+
+SETTLEMENT_TYPES = r"г\.|город|с\.|село|х\.|хутор|пос\.|п\.|поселок|посёлок|ст-ца|станица|сл\.|слобода|рп\.|пгт\.?"
+STREET_TYPES = {
+    "ул": "ул", "улица": "ул",
+    "пер": "пер", "переулок": "пер",
+    "пр": "пр", "пр-кт": "пр", "просп": "пр", "проспект": "пр",
+    "б-р": "б-р", "бульвар": "б-р",
+    "пл": "пл", "площадь": "пл",
+    "проезд": "проезд", "пр-д": "проезд",
+    "туп": "туп", "тупик": "туп",
+    "ш": "ш", "шоссе": "ш",
+    "мкр": "мкр", "микрорайон": "мкр",
+    "спуск": "спуск", "линия": "линия", "аллея": "аллея", "набережная": "наб", "наб": "наб",
+}
+_STREET_TYPE_RE = "|".join(sorted((re.escape(t) for t in STREET_TYPES), key=len, reverse=True))
+# Слова, с которых начинается описание домов, а не название улицы
+_NOT_NAME = r"(?!(?:дом|д\.|четн|нечетн|нечётн|чётн|полностью|все\s|с\s|от\s))"
+# С цифры может начинаться только первое слово названия («40-летия Победы»): число после названия —
+# уже номер дома («ул. Ленина 5»)
+NAME_RE = rf"{_NOT_NAME}[0-9А-ЯЁа-яё][0-9А-ЯЁа-яё\-\.]*(?:\s+{_NOT_NAME}[А-ЯЁа-яё][0-9А-ЯЁа-яё\-]*){{0,3}}"
+
+SETTLEMENT_RE = re.compile(rf"(?:^|[\s,;:(])(?:{SETTLEMENT_TYPES})\s*([А-ЯЁ][А-ЯЁа-яё\-]+(?:\s+[А-ЯЁ][А-ЯЁа-яё\-]+)?)")
+STREET_RE = re.compile(rf"(?:^|[\s,;:(])({_STREET_TYPE_RE})\.?\s+({NAME_RE})", re.IGNORECASE)
+STREET_SUFFIX_RE = re.compile(rf"(?:^|[\s,;:(])({NAME_RE})\s+({_STREET_TYPE_RE})\.?(?=[\s,;:)]|$)", re.IGNORECASE)
+HOUSE_SPEC_RE = re.compile(
+    r"(?P<odd>нечетн\w*|нечётн\w*)"
+    r"|(?P<even>четн\w*|чётн\w*)"
+    r"|(?P<full>полностью|все\s+дома|вся\s+улица)"
+    r"|(?:с|от)\s*№?\s*(?P<open_lo>\d+)\w*\s*(?:по|до)\s*конц\w*"
+    r"|(?:с|от)\s*№?\s*(?P<from_lo>\d+)\w*\s*(?:по|до)\s*№?\s*(?P<from_hi>\d+)"
+    r"|(?P<dash_lo>\d+)\w*\s*[-–—]\s*(?P<dash_hi>\d+)"
+    r"|(?P<single>\d+)",
+    re.IGNORECASE,
+)
+ADDRESS_HOUSE_RE = re.compile(r"(?:д\.|дом)?\s*(\d+)")
+
+Entry = Tuple[str, str, str, int, int, int]  # населённый пункт, тип улицы, улица, с, по, чётность
+
+
+def normalize(text: str) -> str:
+    text = text.replace("\xa0", " ").lower().replace("ё", "е")
+    return re.sub(r"\s+", " ", text).strip(" .,")
+
+
+def _street_type(raw: str) -> str:
+    return STREET_TYPES.get(normalize(raw), "")
+
+
+def _parse_house_spec(spec: str) -> List[Tuple[int, int, int]]:
+    ranges = []
+    parity = PARITY_ANY
+    full = False
+    for match in HOUSE_SPEC_RE.finditer(normalize(spec)):
+        if match.group("odd"):
+            parity = PARITY_ODD
+        elif match.group("even"):
+            parity = PARITY_EVEN
+        elif match.group("full"):
+            full = True
+        elif match.group("open_lo"):
+            ranges.append((int(match.group("open_lo")), ANY_HOUSE, parity))
+        elif match.group("from_lo"):
+            ranges.append((int(match.group("from_lo")), int(match.group("from_hi")), parity))
+        elif match.group("dash_lo"):
+            ranges.append((int(match.group("dash_lo")), int(match.group("dash_hi")), parity))
+        else:
+            number = int(match.group("single"))
+            ranges.append((number, number, parity))
+    if not ranges or full:
+        ranges.append((0, ANY_HOUSE, parity))
+    return ranges
+
+
+def parse_territory(text: str, default_settlement: str = "") -> List[Entry]:
+    """Разбирает текстовое описание территории участка на записи
+    (населённый пункт, тип улицы, улица, дом с, дом по, чётность).
+
+    Пустая улица означает весь населённый пункт. Пропущенные в тексте номера домов
+    означают всю улицу.
+    """
+    entries: List[Entry] = []
+    settlement = normalize(default_settlement)
+    for segment in re.split(r"[;\n]+", text.replace("\xa0", " ")):
+        marks = []
+        for match in SETTLEMENT_RE.finditer(segment):
+            marks.append((match.start(1), match.end(), "settlement", normalize(match.group(1)), ""))
+        for match in STREET_RE.finditer(segment):
+            marks.append((match.start(1), match.end(), "street", normalize(match.group(2)),
+                          _street_type(match.group(1))))
+        for match in STREET_SUFFIX_RE.finditer(segment):
+            if not any(start <= match.start(1) < end for start, end, *_ in marks):
+                marks.append((match.start(1), match.end(), "street", normalize(match.group(1)),
+                              _street_type(match.group(2))))
+        marks.sort()
+
+        pending_settlement = None
+        for i, (start, end, kind, value, street_type) in enumerate(marks):
+            spec = segment[end:marks[i + 1][0] if i + 1 < len(marks) else len(segment)]
+            if kind == "settlement":
+                if pending_settlement:
+                    entries.append((pending_settlement, "", "", 0, ANY_HOUSE, PARITY_ANY))
+                settlement = value
+                pending_settlement = value
+                continue
+            pending_settlement = None
+            for lo, hi, parity in _parse_house_spec(spec):
+                entries.append((settlement, street_type, value, lo, hi, parity))
+        if pending_settlement:
+            entries.append((pending_settlement, "", "", 0, ANY_HOUSE, PARITY_ANY))
+    return entries
+
+
+def parse_address(address: str) -> Tuple[str, str, str, Optional[int]]:
+    """(населённый пункт, тип улицы, улица, номер дома) из адреса должника."""
+    settlement_match = SETTLEMENT_RE.search(address)
+    settlement = normalize(settlement_match.group(1)) if settlement_match else ""
+    street_match = STREET_RE.search(address)
+    street_type = street = ""
+    house = None
+    if street_match:
+        street_type, street = _street_type(street_match.group(1)), normalize(street_match.group(2))
+        rest = address[street_match.end():]
+    else:
+        suffix_match = STREET_SUFFIX_RE.search(address)
+        if suffix_match:
+            street_type, street = _street_type(suffix_match.group(2)), normalize(suffix_match.group(1))
+        rest = address[suffix_match.end():] if suffix_match else ""
+    house_match = ADDRESS_HOUSE_RE.search(rest)
+    if house_match:
+        house = int(house_match.group(1))
+    if not settlement:
+        # «Ростов-на-Дону, ул. ...» — населённый пункт без сокращения перед улицей
+        parts = [part.strip() for part in address.split(",")]
+        candidates = [p for p in parts if p and not p[0].isdigit() and not STREET_RE.search(" " + p)
+                      and "обл" not in p.lower() and "район" not in p.lower()]
+        settlement = normalize(candidates[0]) if candidates else ""
+    return settlement, street_type, street, house
+
+
+def court_settlement(court: Dict) -> str:
+    """Населённый пункт из адреса суда — для территорий, где он не назван явно."""
+    return parse_address(court.get("address") or "")[0]
+
+
+class TerritoryIndex:
+    """Инвертированный индекс «улица -> диапазоны домов -> судебный участок».
+
+    Строится из разобранных описаний территорий (см. parse_territory). Поиск по адресу —
+    одно обращение к словарю и проверка нескольких диапазонов. Если адресу подходят
+    диапазоны разных участков, результат считается неоднозначным и не возвращается.
+    Улица подходит только в своём населённом пункте: адрес, где он не указан, по улицам
+    не ищется (одноимённые улицы есть во многих городах области).
+    """
+
+    def __init__(self):
+        self._streets: Dict[str, List[Tuple[str, str, int, int, int, int]]] = {}
+        self._settlements: Dict[str, List[int]] = {}
+        self.entries = 0
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def add(self, court_index: int, entries: Sequence[Sequence]):
+        for settlement, street_type, street, lo, hi, parity in entries:
+            settlement = sys.intern(settlement)
+            if not street:
+                self._settlements.setdefault(settlement, []).append(court_index)
+            else:
+                self._streets.setdefault(sys.intern(street), []).append(
+                    (settlement, sys.intern(street_type), lo, hi, parity, court_index))
+            self.entries += 1
+
+    def lookup(self, address: str) -> Optional[int]:
+        settlement, street_type, street, house = parse_address(address)
+        found = set()
+        if street:
+            for entry_settlement, entry_type, lo, hi, parity, court_index in self._streets.get(street, ()):
+                # Населённый пункт записи и адреса должны совпадать: иначе улица с тем же названием
+                # в другом городе (или в городе, не указанном в адресе) попала бы на этот участок
+                if entry_settlement != settlement:
+                    continue
+                if street_type and entry_type and entry_type != street_type:
+                    continue
+                if house is None:
+                    if lo == 0 and hi == ANY_HOUSE:
+                        found.add(court_index)
+                    continue
+                if not lo <= house <= hi:
+                    continue
+                if parity and house % 2 != (1 if parity == PARITY_ODD else 0):
+                    continue
+                found.add(court_index)
+        if not found and settlement:
+            found.update(self._settlements.get(settlement, ()))
+        if len(found) == 1:
+            return found.pop()
+        if found:
+            logger.debug(f"Адрес {address} подходит нескольким участкам: {sorted(found)}")
+        return None
+
+
+def load_territory_index(courts: Sequence[Dict], path: Path = TERRITORIES_PATH) -> TerritoryIndex:
+    """Строит индекс по файлу разобранных территорий, сопоставляя участки по коду.
+
+    Записи без населённого пункта (файлы, собранные до того, как он стал подставляться)
+    относятся к населённому пункту суда.
+    """
+    index = TerritoryIndex()
+    if not path.exists():
+        logger.info(f"Файл территорий {path} не найден, поиск по территориям отключён")
+        return index
+    with open(path, "r", encoding="utf-8") as f:
+        territories = json.load(f)
+    by_code = {court.get("code"): i for i, court in enumerate(courts) if court.get("code")}
+    for item in territories:
+        court_index = by_code.get(item.get("code"))
+        if court_index is None:
+            logger.warning(f"Участок {item.get('code')} из файла территорий не найден в данных о судах")
+            continue
+        settlement = court_settlement(courts[court_index])
+        index.add(court_index, [entry if entry[0] else (settlement, *entry[1:]) for entry in item["entries"]])
+    logger.info(f"Индекс территорий построен: {len(index)} записей")
+    return index
+
+
+def build_territories_file(source: Path, output: Path = TERRITORIES_PATH):
+    """Разбирает поле territory из вывода parse_courts.py и сохраняет записи по участкам."""
+    with open(source, "r", encoding="utf-8") as f:
+        courts = json.load(f)
+    result = []
+    for court in courts:
+        text = court.get("territory") or ""
+        if not court.get("code") or not text or text.startswith("Не найдена"):
+            continue
+        entries = parse_territory(text, court_settlement(court))
+        if entries:
+            result.append({"code": court["code"], "name": court["name"], "entries": entries})
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    logger.info(f"Территории {len(result)} участков сохранены в {output}")
+
+
+if __name__ == "__main__":
+    # python -m app.services.territory_index rostov_courts_with_territory.json [data/territories_rostov.json]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2:
+        print("Использование: python -m app.services.territory_index <вывод parse_courts.py> [выходной файл]")
+        sys.exit(1)
+    build_territories_file(Path(sys.argv[1]), Path(sys.argv[2]) if len(sys.argv) > 2 else TERRITORIES_PATH)
@@ -0,0 +1,499 @@
+# app/services/upstream.py
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# Относительный UPSTREAM_QUOTA_PATH считается от корня репозитория: скрипты обновления данных,
+# запущенные из другого каталога, должны попадать в тот же учёт, что и API
+REPO_ROOT = Path(__file__).parent.parent.parent
+
+SERVICE_YANDEX = "yandex_geocoder"
+SERVICE_SUDRF = "sudrf"
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+# Приоритет по умолчанию для вызовов внутри задачи; пакетная обработка выставляет фоновый
+upstream_priority: ContextVar[str] = ContextVar("upstream_priority", default=PRIORITY_INTERACTIVE)
+
+# Ответы, по которым сервис считается перегруженным
+OVERLOAD_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamLimited(Exception):
+    """Запрос не отправлен: исчерпана суточная квота или не дождались очереди."""
+
+    def __init__(self, service: str, reason: str):
+        super().__init__(f"{service}: {reason}")
+        self.service = service
+        self.reason = reason
+
+
+def _quota_day() -> str:
+    # Сутки по московскому времени
+    return time.strftime("%Y-%m-%d", time.gmtime(time.time() + 3 * 3600))
+
+
+@dataclass
+class RateBucket:
+    """Состояние скорости сервиса: корзины токенов (общая и фоновая), текущая скорость AIMD и
+    срок, до которого интерактивные запросы ждут токена (фоновые в это время уступают).
+    Моменты времени — time.time(), чтобы состояние можно было делить между процессами."""
+
+    tokens: float
+    background_tokens: float
+    updated: float
+    rate: float
+    last_decrease: float = 0.0
+    interactive_until: float = 0.0
+
+
+class MemoryQuotaLedger:
+    """Учёт квот и скорости в памяти процесса (когда общий файл не задан)."""
+
+    # Обращения к учёту дешёвые и не блокируют цикл
+    shared = False
+
+    def __init__(self):
+        self._used: Dict[tuple, int] = {}
+        self._buckets: Dict[str, RateBucket] = {}
+        self._lock = threading.Lock()
+
+    def take(self, service: str, priority: str, amount: int, quota: int, background_limit: int) -> int:
+        with self._lock:
+            return self._take_locked(service, priority, amount, quota, background_limit)
+
+    def _take_locked(self, service: str, priority: str, amount: int, quota: int, background_limit: int) -> int:
+        day = _quota_day()
+        total = sum(used for (s, d, _), used in self._used.items() if s == service and d == day)
+        granted = self._grant(priority, amount, quota - total,
+                              background_limit - self._used.get((service, day, PRIORITY_BACKGROUND), 0))
+        if granted:
+            key = (service, day, priority)
+            self._used[key] = self._used.get(key, 0) + granted
+        return granted
+
+    @staticmethod
+    def _grant(priority: str, amount: int, left: int, background_left: int) -> int:
+        if priority == PRIORITY_BACKGROUND:
+            left = min(left, background_left)
+        return max(0, min(amount, left))
+
+    def usage(self, service: str) -> Dict[str, int]:
+        day = _quota_day()
+        return {p: used for (s, d, p), used in self._used.items() if s == service and d == day}
+
+    def update_bucket(self, service: str, default: Callable[[], RateBucket], apply: Callable[[RateBucket], T]) -> T:
+        """Атомарно применяет apply к состоянию скорости сервиса и возвращает её результат."""
+        return self.exchange(service, default, lambda bucket, take: apply(bucket))
+
+    def exchange(self, service: str, default: Callable[[], RateBucket],
+                 apply: Callable[[RateBucket, Callable[..., int]], T]) -> T:
+        """То же, но apply может взять и порцию квоты: take(priority, amount, quota, background_limit)
+        выполняется в той же атомарной операции."""
+        with self._lock:
+            bucket = self._buckets.get(service)
+            if bucket is None:
+                bucket = self._buckets[service] = default()
+            return apply(bucket, lambda *args: self._take_locked(service, *args))
+
+
+class SqliteQuotaLedger(MemoryQuotaLedger):
+    """Суточный учёт запросов и состояние скорости в файле SQLite, общие для воркеров API и
+    скриптов на узле.
+
+    Изменения атомарны (BEGIN IMMEDIATE), поэтому процессы вместе не превышают ни квоту, ни
+    скорость, а фоновые задачи в скриптах уступают запросам API из воркеров.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Состояние скорости меняется на каждый запрос; fsync на каждую запись ему не нужен
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS upstream_quota (service TEXT NOT NULL, day TEXT NOT NULL, "
+                "priority TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (service, day, priority))")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS upstream_rate (service TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "background_tokens REAL NOT NULL, updated REAL NOT NULL, rate REAL NOT NULL, "
+                "last_decrease REAL NOT NULL, interactive_until REAL NOT NULL)")
+            self._connection = connection
+        return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def take(self, service: str, priority: str, amount: int, quota: int, background_limit: int) -> int:
+        with self._transaction() as connection:
+            return self._take_in(connection, service, priority, amount, quota, background_limit)
+
+    def _take_in(self, connection: sqlite3.Connection, service: str, priority: str, amount: int, quota: int,
+                 background_limit: int) -> int:
+        day = _quota_day()
+        used = dict(connection.execute(
+            "SELECT priority, used FROM upstream_quota WHERE service = ? AND day = ?", (service, day)))
+        granted = self._grant(priority, amount, quota - sum(used.values()),
+                              background_limit - used.get(PRIORITY_BACKGROUND, 0))
+        if granted:
+            connection.execute(
+                "INSERT INTO upstream_quota (service, day, priority, used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (service, day, priority) DO UPDATE SET used = used + excluded.used",
+                (service, day, priority, granted))
+        return granted
+
+    def usage(self, service: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connect().execute(
+                "SELECT priority, used FROM upstream_quota WHERE service = ? AND day = ?", (service, _quota_day())))
+
+    def exchange(self, service: str, default: Callable[[], RateBucket],
+                 apply: Callable[[RateBucket, Callable[..., int]], T]) -> T:
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT tokens, background_tokens, updated, rate, last_decrease, interactive_until "
+                "FROM upstream_rate WHERE service = ?", (service,)).fetchone()
+            bucket = RateBucket(*row) if row else default()
+            result = apply(bucket, lambda *args: self._take_in(connection, service, *args))
+            connection.execute("INSERT OR REPLACE INTO upstream_rate VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (service, *astuple(bucket)))
+        return result
+
+
+class _Call:
+    def __init__(self):
+        self.ok = True
+
+    def failed(self):
+        """Отметить ответ как признак перегрузки сервиса."""
+        self.ok = False
+
+    def observe(self, status_code: int):
+        if status_code in OVERLOAD_STATUSES:
+            self.ok = False
+
+
+class ServiceScheduler:
+    """Допуск запросов к одному внешнему сервису.
+
+    Скорость ограничена корзиной токенов. Её скорость подстраивается по принципу AIMD:
+    каждый успешный ответ прибавляет скорость (на increase запросов в секунду за секунду),
+    ошибка перегрузки или ответ дольше latency_target уменьшают её в decrease раз (не чаще
+    раза в cooldown секунд). Фоновые запросы получают не больше background_share скорости и
+    пропускают вперёд ожидающие интерактивные. Корзина, скорость и признак ожидающих
+    интерактивных запросов хранятся в ledger: с общим файлом учёта они общие для всех процессов
+    узла, и вместе процессы не превышают заданную скорость. Суточная квота (0 — без квоты)
+    учитывается там же, фоновым достаётся не больше background_share квоты.
+
+    Чтобы процессы не выстраивались в очередь за блокировкой общего учёта на каждый запрос,
+    допуск обходится одной транзакцией учёта, и та нужна не всегда: токены берутся порциями до
+    batch штук (неиспользованные пропадают через время, за которое корзина их накопила бы),
+    квота — порциями по lease запросов (остаток пропадает при завершении процесса), а успешные
+    исходы копятся в процессе и попадают в учёт со следующей транзакцией. Ошибка или медленный
+    ответ записываются сразу, чтобы снижение скорости сразу действовало на все процессы.
+    """
+
+    def __init__(self, name: str, rate: float, burst: Optional[float] = None, min_rate: Optional[float] = None,
+                 daily_quota: int = 0, background_share: float = 0.3, latency_target: Optional[float] = None,
+                 increase: Optional[float] = None, decrease: float = 0.5, cooldown: float = 1.0,
+                 ledger: Optional[MemoryQuotaLedger] = None, lease: int = 10, batch: Optional[int] = None):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = min_rate or rate * 0.05
+        self.burst = burst or max(1.0, rate)
+        self.daily_quota = daily_quota
+        self.background_share = background_share
+        self.latency_target = latency_target
+        self.increase = increase or rate * 0.1
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.ledger = ledger or MemoryQuotaLedger()
+        self.lease = lease
+        # По умолчанию порция токенов — около 0,1 с предельной скорости
+        self.batch = batch or max(1, int(rate * 0.1))
+        self._leased = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._tokens = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._tokens_until = {PRIORITY_INTERACTIVE: 0.0, PRIORITY_BACKGROUND: 0.0}
+        self._pending_good = 0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "failures": 0, "slow": 0, "decreases": 0, "throttled": 0, "quota_exceeded": 0}
+
+    async def _ledger(self, fn: Callable[..., T], *args) -> T:
+        # Общий учёт — запись в SQLite, её не стоит делать в потоке событийного цикла
+        if self.ledger.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    # --- скорость -------------------------------------------------------------------------------
+
+    def _new_bucket(self) -> RateBucket:
+        return RateBucket(tokens=self.burst, background_tokens=1.0, updated=time.time(), rate=self.max_rate)
+
+    def _take(self, bucket: RateBucket, priority: str) -> Tuple[float, int]:
+        """(0, сколько токенов взято) или (сколько секунд подождать, 0)."""
+        now = time.time()
+        elapsed, bucket.updated = max(0.0, now - bucket.updated), now
+        # Скорость из общего учёта могла остаться от процесса с другими настройками
+        rate = bucket.rate = min(self.max_rate, max(self.min_rate, bucket.rate))
+        bucket.tokens = min(self.burst, bucket.tokens + elapsed * rate)
+        background_rate = rate * self.background_share
+        bucket.background_tokens = min(1.0, bucket.background_tokens + elapsed * background_rate)
+        if priority == PRIORITY_BACKGROUND:
+            if bucket.interactive_until > now:
+                return 1 / rate, 0
+            if bucket.background_tokens < 1:
+                return (1 - bucket.background_tokens) / background_rate, 0
+        if bucket.tokens < 1:
+            wait = (1 - bucket.tokens) / rate
+            if priority == PRIORITY_INTERACTIVE:
+                # Пока интерактивный запрос ждёт токена, фоновые (в том числе в других процессах) уступают
+                bucket.interactive_until = max(bucket.interactive_until, now + wait + 1 / rate)
+            return wait, 0
+        if priority == PRIORITY_BACKGROUND:
+            # Корзина фоновых вмещает один токен, так что фоновые берут их по одному
+            bucket.tokens -= 1
+            bucket.background_tokens -= 1
+            return 0.0, 1
+        taken = min(self.batch, int(bucket.tokens))
+        bucket.tokens -= taken
+        return 0.0, taken
+
+    def _exchange(self, bucket: RateBucket, take: Callable[..., int], priority: str, good: int, has_token: bool,
+                  need_quota: bool) -> Tuple[float, int, Optional[int], float]:
+        """Транзакция допуска: (ожидание, новые токены, порция квоты или None, скорость)."""
+        self._adjust(bucket, good)
+        taken = 0
+        if not has_token:
+            wait, taken = self._take(bucket, priority)
+            if wait:
+                return wait, 0, None, bucket.rate
+        quota = None
+        if need_quota:
+            quota = take(priority, self.lease, self.daily_quota, int(self.daily_quota * self.background_share))
+            if not quota and taken:
+                # Без квоты запрос не уйдёт, взятые токены возвращаются в корзину
+                bucket.tokens += taken
+                if priority == PRIORITY_BACKGROUND:
+                    bucket.background_tokens += taken
+                taken = 0
+        return 0.0, taken, quota, bucket.rate
+
+    def _take_local(self, priority: str) -> bool:
+        """Допуск из порций токенов и квоты, уже взятых процессом, без обращения к учёту."""
+        with self._lock:
+            if self._tokens[priority] and time.time() > self._tokens_until[priority]:
+                self._tokens[priority] = 0
+            if not self._tokens[priority]:
+                return False
+            if self.daily_quota:
+                if not self._leased[priority]:
+                    return False
+                self._leased[priority] -= 1
+            self._tokens[priority] -= 1
+            return True
+
+    def _try_take(self, priority: str) -> float:
+        """0, если допуск получен; иначе — сколько секунд подождать до следующей попытки."""
+        if self._take_local(priority):
+            return 0.0
+        with self._lock:
+            good, self._pending_good = self._pending_good, 0
+            # Токен есть, не хватило квоты
+            has_token = self._tokens[priority] > 0
+            if has_token:
+                self._tokens[priority] -= 1
+            need_quota = bool(self.daily_quota) and not self._leased[priority]
+        wait, taken, quota, rate = self.ledger.exchange(
+            self.name, self._new_bucket,
+            lambda bucket, take: self._exchange(bucket, take, priority, good, has_token, need_quota))
+        if wait:
+            return wait
+        with self._lock:
+            if need_quota and not quota:
+                if has_token:
+                    self._tokens[priority] += 1
+                self.stats["quota_exceeded"] += 1
+                raise UpstreamLimited(self.name, "quota")
+            if quota:
+                self._leased[priority] += quota
+            if self.daily_quota:
+                self._leased[priority] -= 1
+            if taken > 1:
+                self._tokens[priority] += taken - 1
+                self._tokens_until[priority] = time.time() + (taken - 1) / rate
+        return 0.0
+
+    def _check_deadline(self, deadline: Optional[float], wait: float):
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.stats["throttled"] += 1
+            raise UpstreamLimited(self.name, "throttled")
+
+    # --- допуск ---------------------------------------------------------------------------------
+
+    async def acquire(self, priority: str, timeout: Optional[float] = None):
+        if self._take_local(priority):
+            return
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        wait = await self._ledger(self._try_take, priority)
+        while wait:
+            self._check_deadline(deadline, wait)
+            await asyncio.sleep(wait)
+            wait = await self._ledger(self._try_take, priority)
+
+    def acquire_sync(self, priority: str, timeout: Optional[float] = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        wait = self._try_take(priority)
+        while wait:
+            self._check_deadline(deadline, wait)
+            time.sleep(wait)
+            wait = self._try_take(priority)
+
+    def _adjust(self, bucket: RateBucket, good: int, failed: bool = False) -> Optional[float]:
+        """Учитывает good успешных исходов и, если failed, одну ошибку; новая скорость, если её
+        пришлось снизить, иначе None."""
+        for _ in range(good):
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase / bucket.rate)
+        if not failed:
+            return None
+        now = time.time()
+        if now - bucket.last_decrease < self.cooldown:
+            return None
+        bucket.last_decrease = now
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+        return bucket.rate
+
+    def _note(self, ok: bool, latency: float) -> bool:
+        """Учитывает исход в процессе; True, если скорость нужно снизить в общем учёте сейчас."""
+        slow = ok and self.latency_target is not None and latency > self.latency_target
+        with self._lock:
+            self.stats["requests"] += 1
+            if ok and not slow:
+                self._pending_good += 1
+                return False
+            self.stats["failures" if not ok else "slow"] += 1
+            # Порции токенов взяты при прежней скорости
+            self._tokens = dict.fromkeys(self._tokens, 0)
+            return True
+
+    def record(self, ok: bool, latency: float):
+        if self._note(ok, latency):
+            self._decrease(ok, latency)
+
+    def _decrease(self, ok: bool, latency: float):
+        with self._lock:
+            good, self._pending_good = self._pending_good, 0
+        rate = self.ledger.update_bucket(self.name, self._new_bucket,
+                                         lambda bucket: self._adjust(bucket, good, failed=True))
+        if rate is None:
+            return
+        with self._lock:
+            self.stats["decreases"] += 1
+        logger.warning(f"{self.name}: {'ошибка' if not ok else f'ответ за {latency:.1f} с'}, "
+                       f"скорость снижена до {rate:.2f} запросов в секунду")
+
+    @asynccontextmanager
+    async def call(self, priority: Optional[str] = None, timeout: Optional[float] = None):
+        """async with scheduler.call() as call: ... — ждёт допуска и учитывает исход запроса.
+
+        Исключение внутри блока считается ошибкой; ответ с кодом перегрузки нужно отметить
+        через call.observe(status_code) или call.failed(). Отменённый запрос не учитывается.
+        """
+        await self.acquire(priority or upstream_priority.get(), timeout)
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self._outcome(False, time.monotonic() - started)
+            raise
+        else:
+            await self._outcome(call.ok, time.monotonic() - started)
+
+    async def _outcome(self, ok: bool, latency: float):
+        # Успешный исход только копится в процессе, в учёт (в отдельном потоке) пишется лишь снижение
+        if self._note(ok, latency):
+            await self._ledger(self._decrease, ok, latency)
+
+    @contextmanager
+    def call_sync(self, priority: Optional[str] = None, timeout: Optional[float] = None):
+        """То же для синхронного кода (скрипты обновления данных)."""
+        self.acquire_sync(priority or upstream_priority.get(), timeout)
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        else:
+            self.record(call.ok, time.monotonic() - started)
+
+    def snapshot(self) -> Dict:
+        bucket = self.ledger.update_bucket(self.name, self._new_bucket, lambda bucket: bucket)
+        return {"rate": round(bucket.rate, 2), "max_rate": self.max_rate, "tokens": round(bucket.tokens, 2),
+                "interactive_waiting": bucket.interactive_until > time.time(), "shared": self.ledger.shared,
+                "daily_quota": self.daily_quota,
+                "quota_used": self.ledger.usage(self.name) if self.daily_quota else None, **self.stats}
+
+
+class UpstreamScheduler:
+    """Планировщики внешних сервисов процесса с общим учётом квот и скорости."""
+
+    def __init__(self, ledger: MemoryQuotaLedger):
+        self.ledger = ledger
+        self.services: Dict[str, ServiceScheduler] = {}
+
+    def add(self, name: str, **limits) -> ServiceScheduler:
+        self.services[name] = ServiceScheduler(name, ledger=self.ledger, **limits)
+        return self.services[name]
+
+    def __getitem__(self, name: str) -> ServiceScheduler:
+        return self.services[name]
+
+    def snapshot(self) -> Dict:
+        return {name: service.snapshot() for name, service in self.services.items()}
+
+
+def _create_scheduler() -> UpstreamScheduler:
+    ledger = (SqliteQuotaLedger(str(REPO_ROOT / settings.UPSTREAM_QUOTA_PATH)) if settings.UPSTREAM_QUOTA_PATH
+              else MemoryQuotaLedger())
+    scheduler = UpstreamScheduler(ledger)
+    scheduler.add(SERVICE_YANDEX, rate=settings.YANDEX_GEOCODER_RATE, daily_quota=settings.YANDEX_GEOCODER_DAILY_QUOTA,
+                  background_share=settings.UPSTREAM_BACKGROUND_SHARE, latency_target=settings.YANDEX_GEOCODER_SLOW)
+    scheduler.add(SERVICE_SUDRF, rate=settings.SUDRF_RATE, background_share=settings.UPSTREAM_BACKGROUND_SHARE,
+                  latency_target=settings.SUDRF_SLOW)
+    return scheduler
+
+
+upstream = _create_scheduler()
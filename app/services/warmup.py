@@ -0,0 +1,144 @@
+# app/services/warmup.py
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from app.services.audit import audit_log
+from app.services.court_finder import DEBT_THRESHOLD, CourtFinder
+from app.services.shared_cache import shared_cache
+from app.services.upstream import PRIORITY_BACKGROUND, upstream_priority
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PHASE_PENDING = "pending"
+PHASE_DATASET = "dataset"
+PHASE_INDEXES = "indexes"
+PHASE_CACHES = "caches"
+PHASE_READY = "ready"
+
+
+class WarmUp:
+    """Подготовка процесса к приёму трафика; пока она идёт, /health/ready отвечает 503.
+
+    Этапы: загрузка набора данных (или снимка) с индексами, построение ленивых структур,
+    прогрев кэшей самыми частыми адресами из журнала решений за последние window секунд.
+    Адреса попадают в подсказки (если задан SUGGEST_TOKEN); если задан общий кэш, по ним
+    выполняется поиск суда, чтобы результаты были в кэше (с фоновым приоритетом у внешних
+    сервисов). Прогрев кэшей
+    ограничен timeout секундами: по его истечении процесс всё равно становится готовым.
+    Если данные не загрузились, загрузка повторяется каждые retry_interval секунд.
+    """
+
+    def __init__(self, addresses: int = 500, window: float = 7 * 24 * 3600, concurrency: int = 8,
+                 timeout: float = 60.0, retry_interval: float = 5.0):
+        self.addresses = addresses
+        self.window = window
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.phase = PHASE_PENDING
+        self.error: Optional[str] = None
+        self.lookups_total = 0
+        self.lookups_done = 0
+        self.lookups_failed = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == PHASE_READY
+
+    def retry_after(self) -> int:
+        """Через сколько секунд повторить запрос, пришедший до загрузки данных (Retry-After)."""
+        return max(1, math.ceil(self.retry_interval))
+
+    def start(self):
+        self._started = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        self.phase = PHASE_DATASET
+        while True:
+            # В отдельном потоке: liveness-проверки отвечают, пока строятся индексы
+            await asyncio.to_thread(CourtFinder.load_courts_data)
+            if CourtFinder.courts_data:
+                self.error = None
+                break
+            self.error = "Данные о судах не загружены"
+            logger.error(f"{self.error}, повтор через {self.retry_interval} с")
+            await asyncio.sleep(self.retry_interval)
+
+        self.phase = PHASE_INDEXES
+        await asyncio.to_thread(CourtFinder.get_tile_renderer)
+
+        self.phase = PHASE_CACHES
+        try:
+            await self._warm_caches()
+        except Exception as e:
+            logger.error(f"Ошибка прогрева кэшей: {str(e)}")
+
+        self.phase = PHASE_READY
+        self._finished = time.monotonic()
+        logger.info(f"Процесс готов к приёму трафика за {self._finished - self._started:.1f} с "
+                    f"(прогрето адресов: {self.lookups_done - self.lookups_failed} из {self.lookups_total})")
+
+    async def _warm_caches(self):
+        if not self.addresses:
+            return
+        lookups = await audit_log.frequent_lookups(time.time() - self.window, self.addresses, DEBT_THRESHOLD)
+        if settings.SUGGEST_TOKEN:
+            # Адрес может встретиться дважды — для мирового и районного суда
+            for address in dict.fromkeys(address for address, _, _ in lookups):
+                CourtFinder.suggest_index.add(address)
+        if shared_cache.backend is None:
+            # Ближний кэш живёт минуты: прогревать его запросами к внешним сервисам незачем
+            logger.info(f"Общий кэш не задан, прогрет только индекс подсказок ({len(lookups)} адресов)")
+            return
+        self.lookups_total = len(lookups)
+        upstream_priority.set(PRIORITY_BACKGROUND)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(address: str, debt_amount: Optional[float], case_type: Optional[str]):
+            async with semaphore:
+                try:
+                    await CourtFinder.resolve(address, debt_amount or 0.0, case_type or "")
+                except Exception as e:
+                    self.lookups_failed += 1
+                    logger.warning(f"Не удалось прогреть адрес {address}: {str(e)}")
+                self.lookups_done += 1
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(warm(*lookup) for lookup in lookups)), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Прогрев кэшей остановлен через {self.timeout} с: "
+                           f"{self.lookups_done} из {self.lookups_total} адресов")
+
+    def snapshot(self) -> Dict:
+        elapsed = None
+        if self._started is not None:
+            elapsed = round(((self._finished or time.monotonic()) - self._started) * 1000, 1)
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "elapsed_ms": elapsed,
+            "error": self.error,
+            "courts": len(CourtFinder.courts_data),
+            "dataset_version": CourtFinder.dataset_version,
+            "cache_warmup": {"total": self.lookups_total, "done": self.lookups_done, "failed": self.lookups_failed},
+        }
+
+
+warmup = WarmUp(addresses=settings.WARMUP_ADDRESSES, window=settings.WARMUP_WINDOW,
+                concurrency=settings.WARMUP_CONCURRENCY, timeout=settings.WARMUP_TIMEOUT)
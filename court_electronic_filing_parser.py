@@ -3,11 +3,9 @@ import requests
 from bs4 import BeautifulSoup
 import logging
 from pathlib import Path
-import time
 from urllib3.exceptions import InsecureRequestWarning
 import warnings
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from app.services.upstream import OVERLOAD_STATUSES, PRIORITY_BACKGROUND, SERVICE_SUDRF, UpstreamLimited, upstream
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -21,6 +19,8 @@ logger.addHandler(handler)
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
+# Попыток на сайт; паузы между ними и между судами задаёт планировщик запросов к sudrf.ru
+ATTEMPTS = 3
 
 
 def load_courts_data(file_path: str) -> list:
@@ -34,26 +34,26 @@ def load_courts_data(file_path: str) -> list:
         return []
 
 
-def setup_session_with_retries():
-    """Настраивает сессию с повторными попытками."""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,  # Максимум 3 попытки
-        backoff_factor=1,  # Задержка между попытками: 1, 2, 4 секунды
-        status_forcelist=[500, 502, 503, 504]  # Повторять при этих ошибках сервера
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("https://", adapter)
-    return session
-
-
 def check_electronic_filing(website: str, session: requests.Session) -> str:
     """Проверяет наличие ссылки на обращения граждан, указывающей на электронную подачу."""
     if website.startswith("http://"):
         website = website.replace("http://", "https://")
 
     try:
-        response = session.get(website, headers=HEADERS, timeout=20, verify=False)  # Увеличен timeout до 20 секунд
+        for attempt in range(1, ATTEMPTS + 1):
+            # Ошибка снижает скорость планировщика, так что повтор уходит уже реже
+            try:
+                with upstream[SERVICE_SUDRF].call_sync(PRIORITY_BACKGROUND) as call:
+                    response = session.get(website, headers=HEADERS, timeout=20, verify=False)  # Увеличен timeout до 20 секунд
+                    call.observe(response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == ATTEMPTS:
+                    raise
+                logger.info(f"Ошибка доступа к {website}: {str(e)}, попытка {attempt} из {ATTEMPTS}")
+                continue
+            if response.status_code not in OVERLOAD_STATUSES or attempt == ATTEMPTS:
+                break
+            logger.info(f"{website} ответил {response.status_code}, попытка {attempt} из {ATTEMPTS}")
         response.raise_for_status()
         soup = BeautifulSoup(response.text, "html.parser")
 
@@ -65,19 +65,18 @@ def check_electronic_filing(website: str, session: requests.Session) -> str:
         else:
             logger.info(f"Ссылка на обращения граждан не найдена на {website}")
             return "нет"
-    except requests.RequestException as e:
+    except (requests.RequestException, UpstreamLimited) as e:
         logger.warning(f"Ошибка доступа к {website}: {str(e)}. Присваиваем 'неизвестно'")
         return "неизвестно"
 
 
 def update_courts_with_electronic_filing(courts: list) -> list:
     """Обновляет данные судов, добавляя поле electronic_filing."""
-    session = setup_session_with_retries()  # Создаём сессию с повторными попытками
+    session = requests.Session()
     for court in courts:
         if "website" in court and court["website"]:
             logger.info(f"Проверка сайта: {court['website']}")
             court["electronic_filing"] = check_electronic_filing(court["website"], session)
-            time.sleep(1)  # Задержка между судами
         else:
             logger.warning(f"У суда '{court.get('name', 'Без названия')}' нет сайта")
             court["electronic_filing"] = "неизвестно"
@@ -0,0 +1,37 @@
+# loadtest/__main__.py
+"""Запуск: python -m loadtest --scenario baseline --scenario sudrf_slow --workers 2 --json report.json"""
+import argparse
+import logging
+from pathlib import Path
+
+from loadtest.harness import SCENARIOS, print_report, run_scenario, write_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API определения подсудности")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Сценарий (можно указать несколько); по умолчанию все")
+    parser.add_argument("--workers", type=int, default=1, help="Число воркеров uvicorn")
+    parser.add_argument("--rates", help="Интенсивности через запятую, rps (переопределяют сценарий)")
+    parser.add_argument("--step-seconds", type=float, help="Длительность одной ступени, с")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора запросов")
+    parser.add_argument("--port", type=int, default=18000, help="Порт приложения; имитаторы займут четыре следующих")
+    parser.add_argument("--json", type=Path, help="Куда сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = []
+    for name in args.scenario or sorted(SCENARIOS):
+        scenario = SCENARIOS[name]
+        if args.rates:
+            scenario.rates = [float(rate) for rate in args.rates.split(",")]
+        if args.step_seconds:
+            scenario.step_seconds = args.step_seconds
+        results.append(run_scenario(scenario, args.workers, args.seed, args.port))
+    print_report(results)
+    if args.json:
+        write_report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
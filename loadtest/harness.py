@@ -0,0 +1,428 @@
+# loadtest/harness.py
+"""Нагрузочный прогон настоящего приложения под uvicorn против локальных имитаторов.
+
+Генератор открытого типа: запросы отправляются по пуассоновскому расписанию с заданной
+интенсивностью независимо от того, успевает ли сервис отвечать. Параллельно идёт «зонд» —
+лёгкий запрос к /api/courts/case_types/ с фиксированным интервалом. Его задержка не зависит
+от внешних сервисов, поэтому её рост означает, что событийный цикл воркера заблокирован
+(например, синхронным сетевым вызовом или разбором HTML в обработчике).
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from loadtest.simulators import (UpstreamProfile, create_geocoder_app, create_nominatim_app, create_sudrf_app,
+                                 serve_fake_redis)
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).parent.parent
+STREETS = [
+    "Пушкинская", "Большая Садовая", "Ленина", "Криворожская", "Малиновского", "Стачки",
+    "Текучева", "Шолохова", "Еременко", "Горького", "Социалистическая", "Мечникова",
+]
+SETTLEMENTS = ["Ростов-на-Дону", "Таганрог", "Шахты", "Новочеркасск", "Азов", "Батайск", "Волгодонск"]
+# Лёгкий запрос к простаивающему циклу занимает единицы миллисекунд;
+# p99 выше этого порога означает, что цикл чем-то заблокирован.
+PROBE_STALL_MS = 50.0
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    mix: Dict[str, float]
+    geocoder: UpstreamProfile
+    sudrf: UpstreamProfile
+    rates: List[float] = field(default_factory=lambda: [5, 10, 20, 40, 80])
+    step_seconds: float = 20.0
+    slo_ms: float = 1000.0
+    probe_interval: float = 0.1
+    # Общий кэш на имитаторе Redis и число различных адресов в потоке запросов (0 — без ограничения)
+    shared_cache: bool = False
+    address_pool: int = 0
+    # Запасной геокодер (имитатор Nominatim); None — приложение работает только с Яндексом
+    nominatim: Optional[UpstreamProfile] = None
+    # Теневой движок (SHADOW_ENGINE), запускаемый на каждом поиске; итоги сравнения — GET /admin/shadow
+    shadow_engine: str = ""
+
+
+SCENARIOS = {
+    "baseline": Scenario(
+        name="baseline",
+        description="Оба внешних сервиса быстрые, ответ даёт геокодер + поиск ближайшего суда",
+        mix={"find_world": 0.6, "find_district": 0.2, "suggest": 0.2},
+        geocoder=UpstreamProfile(latency_ms=60, jitter_ms=20),
+        sudrf=UpstreamProfile(latency_ms=300, jitter_ms=100),
+    ),
+    "geocoder_down": Scenario(
+        name="geocoder_down",
+        description="Геокодер отвечает ошибкой, каждый поиск уходит на sudrf.ru",
+        mix={"find_world": 0.7, "find_district": 0.3},
+        geocoder=UpstreamProfile(latency_ms=20, jitter_ms=5, error_rate=1.0),
+        sudrf=UpstreamProfile(latency_ms=300, jitter_ms=100),
+        rates=[2, 5, 10, 20],
+    ),
+    "sudrf_slow": Scenario(
+        name="sudrf_slow",
+        description="Геокодер недоступен, sudrf.ru отвечает за 2 с — видны блокировки цикла",
+        mix={"find_world": 0.5, "find_district": 0.2, "suggest": 0.3},
+        geocoder=UpstreamProfile(latency_ms=20, jitter_ms=5, error_rate=1.0),
+        sudrf=UpstreamProfile(latency_ms=2000, jitter_ms=300),
+        rates=[1, 2, 5, 10],
+        slo_ms=5000.0,
+    ),
+    "upstream_timeouts": Scenario(
+        name="upstream_timeouts",
+        description="Часть запросов к обоим сервисам зависает до таймаута клиента",
+        mix={"find_world": 0.6, "find_district": 0.2, "suggest": 0.2},
+        geocoder=UpstreamProfile(latency_ms=80, jitter_ms=30, error_rate=0.05, timeout_rate=0.1, hang_seconds=15),
+        sudrf=UpstreamProfile(latency_ms=400, jitter_ms=150, error_rate=0.1, timeout_rate=0.1, hang_seconds=40),
+        rates=[2, 5, 10, 20],
+        slo_ms=15000.0,
+    ),
+    "shared_cache": Scenario(
+        name="shared_cache",
+        description="Повторяющиеся адреса, общий кэш на имитаторе Redis; запускать с --workers > 1",
+        mix={"find_world": 0.6, "find_district": 0.3, "suggest": 0.1},
+        geocoder=UpstreamProfile(latency_ms=200, jitter_ms=50),
+        sudrf=UpstreamProfile(latency_ms=1000, jitter_ms=200),
+        rates=[10, 20, 40, 80],
+        shared_cache=True,
+        address_pool=300,
+    ),
+    "geocoder_tail": Scenario(
+        name="geocoder_tail",
+        description="У геокодера Яндекса тяжёлый хвост задержек, запасной Nominatim быстрый — видна подстраховка",
+        mix={"find_world": 0.7, "find_district": 0.3},
+        geocoder=UpstreamProfile(latency_ms=80, jitter_ms=30, timeout_rate=0.05, hang_seconds=8),
+        sudrf=UpstreamProfile(latency_ms=300, jitter_ms=100),
+        nominatim=UpstreamProfile(latency_ms=120, jitter_ms=30),
+        rates=[5, 10, 20, 40],
+        slo_ms=2000.0,
+    ),
+    "shadow": Scenario(
+        name="shadow",
+        description="Каждый поиск повторяется офлайн-движком в теневом режиме — видна его цена для основного пути",
+        mix={"find_world": 0.6, "find_district": 0.2, "suggest": 0.2},
+        geocoder=UpstreamProfile(latency_ms=60, jitter_ms=20),
+        sudrf=UpstreamProfile(latency_ms=300, jitter_ms=100),
+        shadow_engine="offline",
+    ),
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@dataclass
+class KindStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, status: str, latency_ms: float):
+        self.latencies_ms.append(latency_ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def summary(self) -> Dict:
+        return {
+            "count": len(self.latencies_ms),
+            "statuses": self.statuses,
+            "p50_ms": percentile(self.latencies_ms, 50),
+            "p90_ms": percentile(self.latencies_ms, 90),
+            "p99_ms": percentile(self.latencies_ms, 99),
+            "max_ms": max(self.latencies_ms) if self.latencies_ms else None,
+        }
+
+
+@dataclass
+class StepResult:
+    offered_rps: float
+    achieved_rps: float
+    sent: int
+    dropped: int
+    kinds: Dict[str, Dict]
+    probe: Dict
+    saturated: bool
+    loop_stalled: bool
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, seed: int, max_in_flight: int = 2000, client_timeout: float = 60.0,
+                 address_pool: int = 0):
+        self.base_url = base_url
+        self.random = random.Random(seed)
+        self.max_in_flight = max_in_flight
+        self.client_timeout = client_timeout
+        self.address_pool = [self._random_address() for _ in range(address_pool)]
+
+    def _random_address(self) -> str:
+        return (f"{self.random.choice(SETTLEMENTS)}, ул. {self.random.choice(STREETS)}, "
+                f"{self.random.randint(1, 250)}")
+
+    def _address(self) -> str:
+        if self.address_pool:
+            return self.random.choice(self.address_pool)
+        return self._random_address()
+
+    def _request_args(self, kind: str):
+        if kind == "find_world":
+            return "POST", "/api/courts/find_court/", {
+                "json": {"address": self._address(), "debt_amount": 30000.0, "case_type": "имущественный_спор"}}
+        if kind == "find_district":
+            return "POST", "/api/courts/find_court/", {
+                "json": {"address": self._address(), "debt_amount": 120000.0, "case_type": "имущественный_спор"}}
+        if kind == "suggest":
+            query = self._address()[:self.random.randint(3, 20)]
+            return "GET", "/api/courts/suggest", {"params": {"q": query}}
+        return "GET", "/api/courts/case_types/", {}
+
+    async def _send(self, client: httpx.AsyncClient, kind: str, stats: Dict[str, KindStats], window_end: float,
+                    completed: List[int]):
+        method, path, kwargs = self._request_args(kind)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        stats.setdefault(kind, KindStats()).record(status, (finished - started) * 1000)
+        if status.startswith("2") and finished <= window_end:
+            completed[0] += 1
+
+    async def _probe(self, client: httpx.AsyncClient, interval: float, stats: KindStats, stop: asyncio.Event):
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = await client.get("/api/courts/case_types/")
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            stats.record(status, (time.perf_counter() - started) * 1000)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_step(self, scenario: Scenario, rate: float) -> StepResult:
+        kinds, weights = zip(*scenario.mix.items())
+        stats: Dict[str, KindStats] = {}
+        probe_stats = KindStats()
+        completed = [0]
+        sent = dropped = 0
+        tasks = set()
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.client_timeout, limits=limits) as client, \
+                httpx.AsyncClient(base_url=self.base_url, timeout=self.client_timeout) as probe_client:
+            stop = asyncio.Event()
+            probe_task = asyncio.create_task(self._probe(probe_client, scenario.probe_interval, probe_stats, stop))
+            started = time.perf_counter()
+            window_end = started + scenario.step_seconds
+            next_arrival = started
+            while True:
+                next_arrival += self.random.expovariate(rate)
+                if next_arrival >= window_end:
+                    break
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+                if len(tasks) >= self.max_in_flight:
+                    dropped += 1
+                    continue
+                kind = self.random.choices(kinds, weights)[0]
+                task = asyncio.create_task(self._send(client, kind, stats, window_end, completed))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+            await asyncio.sleep(max(0.0, window_end - time.perf_counter()))
+            stop.set()
+            await probe_task
+            if tasks:
+                await asyncio.wait(tasks)
+
+        summaries = {kind: kind_stats.summary() for kind, kind_stats in stats.items()}
+        achieved = completed[0] / scenario.step_seconds
+        errors = sum(count for s in summaries.values() for code, count in s["statuses"].items()
+                     if not code.startswith("2"))
+        worst_p99 = max((s["p99_ms"] or 0 for s in summaries.values()), default=0)
+        probe_summary = probe_stats.summary()
+        return StepResult(
+            offered_rps=rate,
+            achieved_rps=round(achieved, 2),
+            sent=sent,
+            dropped=dropped,
+            kinds=summaries,
+            probe=probe_summary,
+            saturated=(achieved < 0.9 * rate or worst_p99 > scenario.slo_ms
+                       or (sent > 0 and errors / sent > 0.01) or dropped > 0),
+            loop_stalled=(probe_summary["p99_ms"] or 0) > PROBE_STALL_MS,
+        )
+
+
+def _serve(app_factory, profile: UpstreamProfile, port: int):
+    uvicorn.run(app_factory(profile), host="127.0.0.1", port=port, log_level="warning")
+
+
+class Environment:
+    """Имитаторы и тестируемое приложение, запущенные в отдельных процессах."""
+
+    def __init__(self, scenario: Scenario, app_port: int, geocoder_port: int, sudrf_port: int, workers: int,
+                 cache_port: int = 0, nominatim_port: int = 0):
+        self.scenario = scenario
+        self.app_port = app_port
+        self.geocoder_port = geocoder_port
+        self.sudrf_port = sudrf_port
+        self.cache_port = cache_port
+        self.nominatim_port = nominatim_port
+        self.workers = workers
+        self._simulators: List[multiprocessing.Process] = []
+        self._app: Optional[subprocess.Popen] = None
+        self._workdir: Optional[tempfile.TemporaryDirectory] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    def __enter__(self):
+        simulators = [(create_geocoder_app, self.scenario.geocoder, self.geocoder_port),
+                      (create_sudrf_app, self.scenario.sudrf, self.sudrf_port)]
+        if self.scenario.nominatim:
+            simulators.append((create_nominatim_app, self.scenario.nominatim, self.nominatim_port))
+        for factory, profile, port in simulators:
+            process = multiprocessing.Process(target=_serve, args=(factory, profile, port), daemon=True)
+            process.start()
+            self._simulators.append(process)
+        if self.scenario.shared_cache:
+            process = multiprocessing.Process(target=serve_fake_redis, args=(self.cache_port,), daemon=True)
+            process.start()
+            self._simulators.append(process)
+
+        # Приложение пишет лог, журнал решений и учёт квот в рабочий каталог: у прогона он свой,
+        # чтобы файлы не оставались в репозитории и не смешивались с файлами рабочего сервиса
+        self._workdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+        workdir = Path(self._workdir.name)
+        env = dict(os.environ)
+        env.update({
+            "AUDIT_SQLITE_PATH": str(workdir / "lookup_audit.sqlite3"),
+            "UPSTREAM_QUOTA_PATH": str(workdir / "upstream_quota.sqlite3"),
+            "YANDEX_GEOCODER_API_KEY": env.get("YANDEX_GEOCODER_API_KEY", "loadtest"),
+            "YANDEX_GEOCODER_URL": f"http://127.0.0.1:{self.geocoder_port}/1.x/",
+            "SUDRF_URL": f"http://127.0.0.1:{self.sudrf_port}/index.php",
+            "CACHE_URL": f"redis://127.0.0.1:{self.cache_port}/0" if self.scenario.shared_cache else "",
+            "NOMINATIM_URL": f"http://127.0.0.1:{self.nominatim_port}" if self.scenario.nominatim else "",
+            # Имитаторы не ограничивают скорость, и у них нет суточной квоты
+            "YANDEX_GEOCODER_RATE": "1000",
+            "SUDRF_RATE": "1000",
+            "YANDEX_GEOCODER_DAILY_QUOTA": "0",
+            "SHADOW_ENGINE": self.scenario.shadow_engine,
+            "SHADOW_SAMPLE_RATE": "1.0",
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")])),
+        })
+        self._app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", str(REPO_ROOT), "--host", "127.0.0.1",
+             "--port", str(self.app_port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=workdir, env=env,
+        )
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        urls = [f"{self.base_url}/health/ready",
+                f"http://127.0.0.1:{self.geocoder_port}/docs",
+                f"http://127.0.0.1:{self.sudrf_port}/docs"]
+        if self.scenario.nominatim:
+            urls.append(f"http://127.0.0.1:{self.nominatim_port}/docs")
+        while urls:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Сервисы не поднялись за {timeout} с: {urls}")
+            try:
+                if httpx.get(urls[0], timeout=1.0).status_code == 200:
+                    urls.pop(0)
+                    continue
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+
+    def __exit__(self, *exc):
+        if self._app:
+            self._app.terminate()
+            try:
+                self._app.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._app.kill()
+        for process in self._simulators:
+            process.terminate()
+            process.join(timeout=5)
+        if self._workdir:
+            self._workdir.cleanup()
+
+
+def run_scenario(scenario: Scenario, workers: int, seed: int, base_port: int) -> Dict:
+    logger.info(f"Сценарий {scenario.name}: {scenario.description}")
+    with Environment(scenario, base_port, base_port + 1, base_port + 2, workers, cache_port=base_port + 3,
+                     nominatim_port=base_port + 4) as env:
+        generator = LoadGenerator(env.base_url, seed, address_pool=scenario.address_pool)
+        steps = []
+        for rate in scenario.rates:
+            step = asyncio.run(generator.run_step(scenario, rate))
+            steps.append(step)
+            logger.info(f"  {rate} rps -> {step.achieved_rps} rps, зонд p99={step.probe['p99_ms']} мс"
+                        f"{', насыщение' if step.saturated else ''}{', блокировки цикла' if step.loop_stalled else ''}")
+    saturation = next((step.offered_rps for step in steps if step.saturated), None)
+    return {
+        "scenario": scenario.name,
+        "description": scenario.description,
+        "workers": workers,
+        "seed": seed,
+        "saturation_rps": saturation,
+        "max_achieved_rps": max((step.achieved_rps for step in steps), default=0),
+        "steps": [asdict(step) for step in steps],
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_report(results: List[Dict]):
+    for result in results:
+        print(f"\n=== {result['scenario']}: {result['description']} (воркеров: {result['workers']})")
+        print(f"{'rps':>6} {'факт':>7} {'вид':<14} {'n':>6} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}  статусы")
+        for step in result["steps"]:
+            rows = list(step["kinds"].items()) + [("зонд", step["probe"])]
+            for i, (kind, s) in enumerate(rows):
+                head = f"{step['offered_rps']:>6} {step['achieved_rps']:>7}" if i == 0 else " " * 14
+                print(f"{head} {kind:<14} {s['count']:>6} {_fmt(s['p50_ms']):>7} {_fmt(s['p90_ms']):>7} "
+                      f"{_fmt(s['p99_ms']):>7} {_fmt(s['max_ms']):>7}  {s['statuses']}")
+            flags = [name for name, on in (("насыщение", step["saturated"]), ("блокировки цикла", step["loop_stalled"]))
+                     if on]
+            if flags or step["dropped"]:
+                print(f"{'':>14} ! {', '.join(flags)}; отброшено генератором: {step['dropped']}")
+        print(f"Точка насыщения: {result['saturation_rps'] or 'не достигнута'} rps, "
+              f"максимум: {result['max_achieved_rps']} rps")
+
+
+def write_report(results: List[Dict], path: Path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    logger.info(f"Отчёт сохранён в {path}")
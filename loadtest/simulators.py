@@ -0,0 +1,234 @@
+# loadtest/simulators.py
+"""Локальные имитаторы геокодеров (Яндекс, Nominatim), поиска sudrf.ru и сервера кэша для нагрузочных прогонов."""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+DATA_PATH = Path(__file__).parent.parent / "data" / "courts_rostov.json"
+
+# Прямоугольник, в который имитатор геокодера «попадает» адресами (Ростовская область)
+BBOX = (46.2, 38.2, 50.2, 44.3)
+
+
+@dataclass
+class UpstreamProfile:
+    """Профиль поведения имитатора: задержка, доля ошибок и доля «зависших» ответов."""
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang_seconds: float = 60.0
+
+    async def apply(self) -> bool:
+        """Выдерживает задержку; возвращает False, если нужно ответить ошибкой."""
+        roll = random.random()
+        if roll < self.timeout_rate:
+            await asyncio.sleep(self.hang_seconds)
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        return roll >= self.timeout_rate + self.error_rate
+
+
+def _address_hash(address: str) -> int:
+    return int.from_bytes(hashlib.blake2b(address.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _address_coords(address: str) -> Tuple[float, float]:
+    value = _address_hash(address)
+    lat = BBOX[0] + (value % 10000) / 10000 * (BBOX[2] - BBOX[0])
+    lon = BBOX[1] + (value // 10000 % 10000) / 10000 * (BBOX[3] - BBOX[1])
+    return lat, lon
+
+
+def _load_court_names() -> List[str]:
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    courts = data if isinstance(data, list) else data.get("courts", [])
+    return [court["name"] for court in courts]
+
+
+def create_geocoder_app(profile: UpstreamProfile) -> FastAPI:
+    """Имитатор https://geocode-maps.yandex.ru/1.x/ с детерминированными координатами."""
+    app = FastAPI()
+    app.state.profile = profile
+
+    @app.get("/1.x/")
+    async def geocode(geocode: str = "", format: str = "json", apikey: str = ""):
+        if not await app.state.profile.apply():
+            return JSONResponse(status_code=500, content={"error": "simulated failure"})
+        lat, lon = _address_coords(geocode)
+        return {"response": {"GeoObjectCollection": {"featureMember": [
+            {"GeoObject": {"Point": {"pos": f"{lon} {lat}"}}}
+        ]}}}
+
+    return app
+
+
+def create_nominatim_app(profile: UpstreamProfile) -> FastAPI:
+    """Имитатор /search собственного Nominatim; координаты те же, что у имитатора Яндекса."""
+    app = FastAPI()
+    app.state.profile = profile
+
+    @app.get("/search")
+    async def search(q: str = "", format: str = "json", limit: int = 1, countrycodes: str = ""):
+        if not await app.state.profile.apply():
+            return JSONResponse(status_code=500, content={"error": "simulated failure"})
+        lat, lon = _address_coords(q)
+        return [{"lat": str(lat), "lon": str(lon), "display_name": q}]
+
+    return app
+
+
+def create_sudrf_app(profile: UpstreamProfile) -> FastAPI:
+    """Имитатор https://sudrf.ru/index.php с разметкой, которую разбирает CourtFinder."""
+    app = FastAPI()
+    app.state.profile = profile
+    names = _load_court_names()
+    world_courts = [name for name in names if "Судебный участок" in name]
+    district_courts = [name for name in names if "Судебный участок" not in name]
+
+    @app.post("/index.php")
+    async def search(request: Request):
+        if not await app.state.profile.apply():
+            return HTMLResponse(status_code=503, content="<html>Service Unavailable</html>")
+        form = parse_qs((await request.body()).decode("utf-8"))
+        value = _address_hash(form.get("court_addr", [""])[0])
+        if request.query_params.get("searchtype") == "ms":
+            rows = "".join(
+                f"<tr><td>{i}</td><td><a href='#'>{name}</a></td><td></td><td></td>"
+                f"<td><a href='http://sim{i}.ros.msudrf.ru'>сайт</a></td></tr>"
+                for i, name in enumerate(world_courts[value % len(world_courts):][:3])
+            )
+            return HTMLResponse(f"<html><body><table>{rows}</table></body></html>")
+        items = "".join(
+            f"<li><a class='court-result' href='#'>{name}</a>"
+            f"<a target='_blank' href='http://sim{i}.ros.sudrf.ru'>сайт</a></li>"
+            for i, name in enumerate(district_courts[value % len(district_courts):][:3])
+        )
+        return HTMLResponse(f"<html><body><ul>{items}</ul></body></html>")
+
+    return app
+
+
+class FakeRedisServer:
+    """Сервер в процессе, понимающий подмножество протокола Redis, которое использует
+    app.services.shared_cache: PING, AUTH, SELECT, GET, MGET, SET (NX, EX, PX), DEL, EXISTS, DBSIZE, FLUSHALL.
+
+    Подходит для прогонов и проверок без настоящего Redis; считает выполненные команды.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands: Counter = Counter()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: set = set()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> "FakeRedisServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _execute(self, args: List[bytes]) -> bytes:
+        command = args[0].upper().decode("ascii", "replace")
+        self.commands[command] += 1
+        if command == "PING":
+            return b"+PONG\r\n"
+        if command in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if command == "GET":
+            return self._bulk(self._get(args[1]))
+        if command == "MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(self._bulk(self._get(key)) for key in args[1:])
+        if command == "SET":
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires = None
+            for i, option in enumerate(options):
+                if option in (b"EX", b"PX"):
+                    ttl = float(options[i + 1]) / (1 if option == b"EX" else 1000)
+                    expires = time.monotonic() + ttl
+            if b"NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            self.data[key] = (value, expires)
+            return b"+OK\r\n"
+        if command == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if command == "EXISTS":
+            return b":%d\r\n" % sum(self._get(key) is not None for key in args[1:])
+        if command == "DBSIZE":
+            return b":%d\r\n" % len(self.data)
+        if command == "FLUSHALL":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command.encode("ascii", "replace")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    writer.write(b"-ERR protocol error\r\n")
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # отмена при остановке сервера — штатное завершение соединения
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+def serve_fake_redis(port: int, latency_ms: float = 0.0):
+    asyncio.run(FakeRedisServer(port=port, latency_ms=latency_ms).serve_forever())
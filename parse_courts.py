@@ -1,10 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
 import json
-import time
 from geopy.geocoders import Yandex
 import ssl
 import certifi
+from app.services.upstream import PRIORITY_BACKGROUND, SERVICE_SUDRF, SERVICE_YANDEX, UpstreamLimited, upstream
 
 # Настройки
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -19,10 +19,15 @@ def geocode_address(address: str):
     if "Не найден" in address:
         return None, None
     try:
-        location = geolocator.geocode(address)
+        # Скрипт — фоновая задача: не отнимает у API скорость и суточную квоту геокодера
+        with upstream[SERVICE_YANDEX].call_sync(PRIORITY_BACKGROUND):
+            location = geolocator.geocode(address)
         if location:
             return location.latitude, location.longitude
         return None, None
+    except UpstreamLimited as e:
+        print(f"Геокодирование {address} пропущено: {str(e)}")
+        return None, None
     except Exception as e:
         print(f"Ошибка геокодирования {address}: {str(e)}")
         return None, None
@@ -32,7 +37,9 @@ def parse_court_details(site: str):
     """Парсинг адреса, телефона, email и территории подсудности."""
     try:
         # Основная страница
-        response = requests.get(site, headers={"User-Agent": USER_AGENT}, timeout=10, verify=False)
+        with upstream[SERVICE_SUDRF].call_sync(PRIORITY_BACKGROUND) as call:
+            response = requests.get(site, headers={"User-Agent": USER_AGENT}, timeout=10, verify=False)
+            call.observe(response.status_code)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, "html.parser")
 
@@ -48,7 +55,10 @@ def parse_court_details(site: str):
 
         # Страница подсудности
         territory_url = f"{site}/modules.php?name=sud_delo&op=terr"
-        territory_response = requests.get(territory_url, headers={"User-Agent": USER_AGENT}, timeout=10, verify=False)
+        with upstream[SERVICE_SUDRF].call_sync(PRIORITY_BACKGROUND) as call:
+            territory_response = requests.get(territory_url, headers={"User-Agent": USER_AGENT}, timeout=10,
+                                              verify=False)
+            call.observe(territory_response.status_code)
         territory_soup = BeautifulSoup(territory_response.text, "html.parser")
 
         # Ищем текст территории (обычно в div или table)
@@ -66,7 +76,9 @@ def parse_courts(region_code: str = REGION_CODE):
     headers = {"User-Agent": USER_AGENT}
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        with upstream[SERVICE_SUDRF].call_sync(PRIORITY_BACKGROUND) as call:
+            response = requests.get(url, headers=headers, timeout=10)
+            call.observe(response.status_code)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, "html.parser")
 
@@ -111,7 +123,6 @@ def parse_courts(region_code: str = REGION_CODE):
             }
             courts.append(court_data)
             print(f"Спарсен: {name} -> {address} -> {territory[:50]}...")
-            time.sleep(1)
 
         return courts
 
@@ -1,11 +1,11 @@
 import requests
 from bs4 import BeautifulSoup
 import json
-import time
 from geopy.geocoders import Yandex
 import ssl
 import certifi
 import logging
+from app.services.upstream import PRIORITY_BACKGROUND, SERVICE_SUDRF, SERVICE_YANDEX, UpstreamLimited, upstream
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,12 +25,17 @@ def geocode_address(address: str):
     if "Не найден" in address:
         return None, None
     try:
-        location = geolocator.geocode(address)
+        # Скрипт — фоновая задача: не отнимает у API скорость и суточную квоту геокодера
+        with upstream[SERVICE_YANDEX].call_sync(PRIORITY_BACKGROUND):
+            location = geolocator.geocode(address)
         if location:
             logger.debug(f"Геокодирован адрес {address}: {location.latitude}, {location.longitude}")
             return location.latitude, location.longitude
         logger.warning(f"Не удалось геокодировать адрес: {address}")
         return None, None
+    except UpstreamLimited as e:
+        logger.warning(f"Геокодирование {address} пропущено: {str(e)}")
+        return None, None
     except Exception as e:
         logger.error(f"Ошибка геокодирования {address}: {str(e)}")
         return None, None
@@ -43,7 +48,9 @@ def parse_courts(region_code: str = REGION_CODE):
     try:
         logger.info(f"Начинаем парсинг судов для региона {region_code}")
         logger.info(f"URL запроса: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
+        with upstream[SERVICE_SUDRF].call_sync(PRIORITY_BACKGROUND) as call:
+            response = requests.get(url, headers=headers, timeout=10)
+            call.observe(response.status_code)
         response.raise_for_status()
         logger.info("Запрос успешно выполнен")
         soup = BeautifulSoup(response.text, "html.parser")
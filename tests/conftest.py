@@ -0,0 +1,5 @@
+# tests/conftest.py
+import os
+
+# Настройки приложения требуют ключ геокодера; в тестах внешние сервисы не вызываются
+os.environ.setdefault("YANDEX_GEOCODER_API_KEY", "test")
@@ -0,0 +1,88 @@
+# tests/test_address_suggest.py
+import threading
+
+from app.services.address_suggest import (
+    RANKED_POSTINGS_THRESHOLD, SOURCE_COURT, SOURCE_DEBTOR, AddressSuggestIndex,
+)
+
+COURT_ADDRESSES = [f"г. Ростов-на-Дону, ул. Ленина, д. {house}" for house in range(RANKED_POSTINGS_THRESHOLD + 50)]
+
+
+def test_ranked_path_keeps_addresses_starting_with_query():
+    index = AddressSuggestIndex()
+    index.build(COURT_ADDRESSES)
+    index.add("Ленинградская ул., д. 5", SOURCE_DEBTOR)
+    suggestions = index.suggest("лен", limit=3)
+    assert suggestions[0]["address"] == "Ленинградская ул., д. 5"
+    assert [item["source"] for item in suggestions[1:]] == [SOURCE_COURT, SOURCE_COURT]
+
+
+def test_ranked_path_with_many_addresses_starting_with_query():
+    index = AddressSuggestIndex()
+    index.build(COURT_ADDRESSES)
+    for house in range(RANKED_POSTINGS_THRESHOLD + 10):
+        index.add(f"ленинградская ул., д. {house}", SOURCE_DEBTOR, hits=1 + house % 3)
+    suggestions = index.suggest("лен", limit=5)
+    assert len(suggestions) == 5
+    assert all(item["address"].startswith("ленинградская") for item in suggestions)
+    assert all(item["hits"] == 3 for item in suggestions)
+
+
+def test_eviction_keeps_sorted_addresses_consistent():
+    index = AddressSuggestIndex(max_debtor_entries=2)
+    for street in ("садовая", "северная", "солнечная"):
+        index.add(f"{street} ул., д. 1", SOURCE_DEBTOR)
+    assert index.evictions == 1
+    assert [item["address"] for item in index.suggest("с", limit=5)] == ["северная ул., д. 1",
+                                                                         "солнечная ул., д. 1"]
+
+
+def test_build_while_debtors_are_added():
+    index = AddressSuggestIndex(max_debtor_entries=500)
+    done = threading.Event()
+
+    def add_debtors():
+        for house in range(5000):
+            index.add(f"ул. Садовая, д. {house}", SOURCE_DEBTOR)
+        done.set()
+
+    thread = threading.Thread(target=add_debtors)
+    thread.start()
+    while not done.is_set():
+        index.build(COURT_ADDRESSES[:50])
+    thread.join()
+    assert index.debtor_entries == 500
+    assert index.suggest("садовая", limit=1)
+
+
+def test_courts_only_hides_debtor_addresses():
+    index = AddressSuggestIndex()
+    index.build(COURT_ADDRESSES)
+    index.add("Ленинградская ул., д. 5", SOURCE_DEBTOR)
+    index.add("ул. Ленина, д. 7, кв. 12", SOURCE_DEBTOR)
+    for query in ("лен", "ленинградская", "ленина 7"):
+        assert all(item["source"] == SOURCE_COURT for item in index.suggest(query, limit=20, courts_only=True))
+    assert index.suggest("ленинградская", limit=5, courts_only=True) == []
+    assert index.suggest("ленинградская", limit=5)[0]["source"] == SOURCE_DEBTOR
+
+
+def test_suggest_endpoint_requires_token_for_debtor_addresses(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.core.config import settings
+    from app.main import app
+    from app.services.court_finder import CourtFinder
+
+    index = AddressSuggestIndex()
+    index.build(["г. Ростов-на-Дону, ул. Ленина, д. 1"])
+    index.add("Ленинградская ул., д. 5", SOURCE_DEBTOR)
+    monkeypatch.setattr(CourtFinder, "suggest_index", index)
+    monkeypatch.setattr(settings, "SUGGEST_TOKEN", "secret")
+    client = TestClient(app)
+
+    def sources(**headers):
+        response = client.get("/api/courts/suggest", params={"q": "лен"}, headers=headers)
+        return {item["source"] for item in response.json()["suggestions"]}
+
+    assert sources() == {SOURCE_COURT}
+    assert sources(**{settings.SUGGEST_HEADER: "wrong"}) == {SOURCE_COURT}
+    assert sources(**{settings.SUGGEST_HEADER: "secret"}) == {SOURCE_COURT, SOURCE_DEBTOR}
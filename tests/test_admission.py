@@ -0,0 +1,142 @@
+# tests/test_admission.py
+import asyncio
+import time
+
+import orjson
+import pytest
+
+from app.core.admission import (
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, AdmissionController, AdmissionMiddleware, Rejected,
+)
+
+
+def _controller(max_concurrent=1, interactive=10, bulk=10, queue_timeout=1.0, bulk_share=0.5):
+    return AdmissionController(max_concurrent, {PRIORITY_INTERACTIVE: interactive, PRIORITY_BULK: bulk},
+                               queue_timeout=queue_timeout, bulk_share=bulk_share)
+
+
+def test_interactive_is_served_before_bulk():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire(PRIORITY_BULK)
+        order = []
+
+        async def request(priority, name):
+            await controller.acquire(priority)
+            order.append(name)
+            controller.release(priority)
+
+        tasks = [asyncio.create_task(request(PRIORITY_BULK, "bulk-1")),
+                 asyncio.create_task(request(PRIORITY_BULK, "bulk-2"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(PRIORITY_INTERACTIVE, "interactive")))
+        await asyncio.sleep(0)
+        assert controller.snapshot()["queued"] == {PRIORITY_INTERACTIVE: 1, PRIORITY_BULK: 2}
+        controller.release(PRIORITY_BULK)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "bulk-1", "bulk-2"]
+
+
+def test_bulk_is_limited_to_its_share():
+    async def scenario():
+        controller = _controller(max_concurrent=4, bulk_share=0.5)
+        await controller.acquire(PRIORITY_BULK)
+        await controller.acquire(PRIORITY_BULK)
+        bulk = asyncio.create_task(controller.acquire(PRIORITY_BULK))
+        await asyncio.sleep(0)
+        # Свободные места остаются интерактивным
+        assert not bulk.done()
+        assert await controller.acquire(PRIORITY_INTERACTIVE) == 0.0
+        controller.release(PRIORITY_BULK)
+        await bulk
+        assert controller.active == {PRIORITY_INTERACTIVE: 1, PRIORITY_BULK: 2}
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_at_once_with_retry_after():
+    async def scenario():
+        controller = _controller(max_concurrent=2, interactive=3)
+        controller.service_time = 1.0
+        for _ in range(2):
+            await controller.acquire(PRIORITY_INTERACTIVE)
+        waiters = [asyncio.create_task(controller.acquire(PRIORITY_INTERACTIVE)) for _ in range(3)]
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire(PRIORITY_INTERACTIVE)
+        assert time.monotonic() - started < 0.05
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert controller.snapshot()["queued"][PRIORITY_INTERACTIVE] == 0
+        return rejected.value, controller.stats[PRIORITY_INTERACTIVE].rejected
+
+    error, rejected = asyncio.run(scenario())
+    assert error.reason == "queue_full"
+    # Трое в очереди и сам запрос на двух местах при среднем времени обработки 1 с
+    assert error.retry_after == 2
+    assert rejected == 1
+
+
+def test_retry_after_counts_queues_ahead():
+    controller = _controller(max_concurrent=1)
+    controller.service_time = 2.0
+    controller.queues[PRIORITY_INTERACTIVE].extend([None, None])
+    controller.queues[PRIORITY_BULK].extend([None] * 3)
+    # Интерактивному мешают только интерактивные, пакетному — все очереди
+    assert controller.retry_after(PRIORITY_INTERACTIVE) == 6
+    assert controller.retry_after(PRIORITY_BULK) == 12
+
+
+def test_queue_timeout_rejects():
+    async def scenario():
+        controller = _controller(queue_timeout=0.05)
+        await controller.acquire(PRIORITY_INTERACTIVE)
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire(PRIORITY_INTERACTIVE)
+        assert not controller.queues[PRIORITY_INTERACTIVE]
+        return rejected.value
+
+    assert asyncio.run(scenario()).reason == "queue_timeout"
+
+
+def test_middleware_answers_429_without_calling_app():
+    controller = _controller(interactive=0)
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware = AdmissionMiddleware(app, controller, ["/api/find-court"])
+
+    async def request(path, headers=()):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({"type": "http", "method": "POST", "path": path, "headers": list(headers)}, None, send)
+        return messages
+
+    async def scenario():
+        admitted = await request("/api/find-court", [(b"x-request-priority", b"bulk")])
+        await controller.acquire(PRIORITY_INTERACTIVE)
+        rejected = await request("/api/find-court")
+        other = await request("/health")
+        return admitted, rejected, other
+
+    admitted, rejected, other = asyncio.run(scenario())
+    assert admitted[0]["status"] == 200
+    assert (b"server-timing", b"queue;dur=0.0") in admitted[0]["headers"]
+    assert rejected[0]["status"] == 429
+    assert dict(rejected[0]["headers"])[b"retry-after"] == b"1"
+    assert orjson.loads(rejected[1]["body"])["reason"] == "queue_full"
+    assert other[0]["status"] == 200
+    assert calls == ["/api/find-court", "/health"]
+    assert controller.stats[PRIORITY_BULK].admitted == 1
+    assert controller.active[PRIORITY_BULK] == 0
@@ -0,0 +1,46 @@
+# tests/test_audit.py
+import asyncio
+import time
+
+from app.services.audit import AuditRecord, SqliteAuditWriter
+from app.services.court_finder import DEBT_THRESHOLD
+
+
+def record(address, debt_amount, created_at):
+    return AuditRecord(created_at=created_at, address=address, debt_amount=debt_amount, case_type="алименты",
+                       latitude=None, longitude=None, court_name=None, court_type=None, path="nearest",
+                       confidence="high", deadline_exceeded=False, latency_ms=1.0)
+
+
+def test_frequent_lookups_keep_both_court_types(tmp_path):
+    writer = SqliteAuditWriter(str(tmp_path / "audit.sqlite3"))
+    now = time.time()
+
+    async def run():
+        await writer.write([record("ул. Ленина, 1", 10000.0, now)] * 3
+                           + [record("ул. Ленина, 1", 90000.0, now)] * 2
+                           + [record("ул. Садовая, 5", None, now)])
+        try:
+            return await writer.frequent_lookups(now - 60, 10, DEBT_THRESHOLD)
+        finally:
+            await writer.close()
+
+    lookups = asyncio.run(run())
+    assert [(address, debt) for address, debt, _ in lookups] == [
+        ("ул. Ленина, 1", 10000.0), ("ул. Ленина, 1", 90000.0), ("ул. Садовая, 5", None)]
+
+
+def test_concurrent_writes_share_one_connection_thread(tmp_path):
+    writer = SqliteAuditWriter(str(tmp_path / "audit.sqlite3"))
+    now = time.time()
+
+    async def run():
+        # sqlite3 с check_same_thread=True бросает ProgrammingError при доступе из чужого потока
+        await asyncio.gather(*(writer.write([record(f"ул. Ленина, {i}", 1000.0, now)]) for i in range(20)),
+                             *(writer.frequent_lookups(now - 60, 100, DEBT_THRESHOLD) for _ in range(5)))
+        try:
+            return await writer.frequent_lookups(now - 60, 100, DEBT_THRESHOLD)
+        finally:
+            await writer.close()
+
+    assert len(asyncio.run(run())) == 20
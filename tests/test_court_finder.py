@@ -0,0 +1,129 @@
+# tests/test_court_finder.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import court_finder
+from app.services.court_finder import CONFIDENCE_LOW, PATH_ERROR, PATH_NEAREST, CourtFinder
+
+
+def test_load_publishes_indexes_before_courts_data(monkeypatch):
+    building = threading.Event()
+    release = threading.Event()
+    warm = court_finder.PayloadCache.warm
+
+    def slow_warm(self):
+        building.set()
+        release.wait(5)
+        return warm(self)
+
+    monkeypatch.setattr(court_finder.PayloadCache, "warm", slow_warm)
+    for name in ("courts_data", "payloads", "suggest_index", "nearest_tiles", "territory_index", "name_index",
+                 "court_districts", "dataset_version"):
+        monkeypatch.setattr(CourtFinder, name, getattr(CourtFinder, name))
+    monkeypatch.setattr(CourtFinder, "courts_data", [])
+
+    thread = threading.Thread(target=CourtFinder.load_courts_data)
+    thread.start()
+    assert building.wait(5)
+    # Индексы почти готовы, но ничего не опубликовано: запросы видят прежнее состояние
+    assert CourtFinder.courts_data == []
+    assert len(CourtFinder.payloads) == 0
+    release.set()
+    thread.join()
+    assert len(CourtFinder.courts_data) > 0
+    assert len(CourtFinder.payloads) == len(CourtFinder.courts_data)
+    assert CourtFinder.payloads.version == CourtFinder.dataset_version
+    assert len(CourtFinder.suggest_index) > 0
+
+
+ADDRESS = "г. Ростов-на-Дону, ул. Большая Садовая, д. 1"
+DISTRICT_DEBT = 100000.0  # районный суд: индекс территорий мировых участков не участвует
+
+
+@pytest.fixture(scope="module")
+def loaded():
+    if not CourtFinder.courts_data:
+        CourtFinder.load_courts_data()
+    assert CourtFinder.courts_data
+
+
+@pytest.fixture
+def upstreams(loaded, monkeypatch):
+    calls = {"geocode": 0, "sudrf": 0, "sudrf_cancelled": 0}
+    behaviour = {"geocode_delay": 0.0, "coords": (47.2226, 39.7188), "geocode_cancelled": False,
+                 "sudrf_delay": 0.0, "sudrf": []}
+
+    async def geocode_address(address):
+        calls["geocode"] += 1
+        await asyncio.sleep(behaviour["geocode_delay"])
+        if behaviour["geocode_cancelled"]:
+            raise asyncio.CancelledError()
+        return behaviour["coords"]
+
+    async def search_courts_by_address_sudrf(address, target_type, timeout=None):
+        calls["sudrf"] += 1
+        try:
+            await asyncio.sleep(behaviour["sudrf_delay"])
+        except asyncio.CancelledError:
+            calls["sudrf_cancelled"] += 1
+            raise
+        return behaviour["sudrf"]
+
+    monkeypatch.setattr(court_finder, "geocode_address", geocode_address)
+    monkeypatch.setattr(CourtFinder, "search_courts_by_address_sudrf", staticmethod(search_courts_by_address_sudrf))
+    monkeypatch.setattr(settings, "SUDRF_HEDGE_AFTER", 0.5)
+    return calls, behaviour
+
+
+def resolve(budget=1.0):
+    return asyncio.run(CourtFinder._resolve(ADDRESS, DISTRICT_DEBT, "имущественный_спор", budget))
+
+
+def test_fast_geocode_does_not_query_sudrf(upstreams):
+    calls, _ = upstreams
+    resolution = resolve()
+    assert resolution.path == PATH_NEAREST
+    assert calls == {"geocode": 1, "sudrf": 0, "sudrf_cancelled": 0}
+
+
+def test_sudrf_is_queried_when_geocode_finds_nothing(upstreams):
+    calls, behaviour = upstreams
+    behaviour["coords"] = None
+    resolution = resolve()
+    assert calls["sudrf"] == 1
+    assert resolution.confidence == CONFIDENCE_LOW
+    assert not resolution.deadline_exceeded
+
+
+def test_slow_geocode_starts_sudrf_hedge_and_cancels_it(upstreams):
+    calls, behaviour = upstreams
+    behaviour["geocode_delay"] = 0.3
+    behaviour["sudrf_delay"] = 5.0
+    resolution = resolve(budget=0.4)
+    assert resolution.path == PATH_NEAREST
+    assert calls["sudrf"] == 1
+    assert calls["sudrf_cancelled"] == 1
+
+
+def test_budget_exceeded_falls_back(upstreams):
+    calls, behaviour = upstreams
+    behaviour["geocode_delay"] = 5.0
+    behaviour["sudrf_delay"] = 5.0
+    started = time.monotonic()
+    resolution = resolve(budget=0.2)
+    assert time.monotonic() - started < 1.0
+    assert resolution.deadline_exceeded
+    assert resolution.confidence == CONFIDENCE_LOW
+    assert resolution.path != PATH_ERROR
+
+
+def test_cancelled_geocode_falls_back_instead_of_raising(upstreams):
+    calls, behaviour = upstreams
+    behaviour["geocode_cancelled"] = True
+    resolution = resolve()
+    assert resolution.path not in (PATH_ERROR, PATH_NEAREST)
+    assert calls["sudrf"] == 1
@@ -0,0 +1,70 @@
+# tests/test_court_names.py
+import pytest
+
+from app.services.court_names import CourtNameIndex, normalize_court_name, website_key
+
+COURTS = [
+    {"name": "Судебный участок № 1 Ворошиловского судебного района г. Ростова-на-Дону", "code": "61MS0001",
+     "website": "http://vrsh1.ros.msudrf.ru"},
+    {"name": "Судебный участок № 11 Ворошиловского судебного района г. Ростова-на-Дону", "code": "61MS0011"},
+    {"name": "Ленинский районный суд г. Ростова-на-Дону", "code": "61RS0019", "website": "https://lenin--ros.sudrf.ru/"},
+    {"name": "Аксайский районный суд Ростовской области", "code": ""},
+]
+
+
+@pytest.fixture
+def index():
+    return CourtNameIndex().build(COURTS)
+
+
+@pytest.mark.parametrize("name", [
+    "судебный участок №1 ворошиловского судебного района г ростова-на-дону",
+    "Судебный\xa0участок N 1 Ворошиловского судебного района г. «Ростова-на-Дону»",
+    "СУДЕБНЫЙ УЧАСТОК № 1 ВОРОШИЛОВСКОГО СУДЕБНОГО РАЙОНА Г. РОСТОВА-НА-ДОНУ",
+])
+def test_normalize_court_name(name):
+    assert normalize_court_name(name) == normalize_court_name(COURTS[0]["name"])
+
+
+def test_website_key():
+    assert website_key("http://www.Vrsh1.ros.msudrf.ru/index.php") == "vrsh1.ros.msudrf.ru"
+    assert website_key("vrsh1.ros.msudrf.ru") == "vrsh1.ros.msudrf.ru"
+
+
+def test_match_by_code_website_and_name(index):
+    assert index.match("Другое название", code="61ms0011") == (1, 1.0)
+    assert index.match("Другое название", website="www.lenin--ros.sudrf.ru") == (2, 1.0)
+    assert index.match("аксайский районный суд «Ростовской области»") == (3, 1.0)
+    # Неизвестный код не мешает сопоставлению по названию
+    assert index.match("Аксайский районный суд Ростовской области", code="61RS0000") == (3, 1.0)
+
+
+def test_fuzzy_match_tolerates_small_differences(index):
+    match = index.match("Ленинский районный суд города Ростова-на-Дону")
+    assert match is not None and match[0] == 2
+    assert index.threshold <= match[1] < 1.0
+
+
+def test_fuzzy_match_requires_same_court_numbers(index):
+    assert index.match("Судебный участок № 111 Ворошиловского судебного района г. Ростова-на-Дону") is None
+    match = index.match("Судебный участок № 11 Ворошиловского судебного р-на г. Ростова-на-Дону")
+    assert match is not None and match[0] == 1
+
+
+def test_threshold_limits_fuzzy_matches():
+    name = "Аксайский районный суд"
+    (_, score) = CourtNameIndex(threshold=0.0).build(COURTS).match(name)
+    assert score < 1.0
+    assert CourtNameIndex(threshold=score).build(COURTS).match(name) == (3, score)
+    assert CourtNameIndex(threshold=score + 0.01).build(COURTS).match(name) is None
+
+
+def test_common_trigrams_do_not_hide_rare_ones():
+    courts = [{"name": f"Судебный участок № {number} Октябрьского судебного района г. Ростова-на-Дону"}
+              for number in range(1, 100)]
+    courts.append({"name": "Судебный участок № 5 Зерноградского судебного района Ростовской области"})
+    index = CourtNameIndex().build(courts)
+    match = index.match("Судебный участок № 5 Зерноградского судебного района Ростовской обл")
+    assert match is not None and match[0] == len(courts) - 1
+    match = index.match("Судебный участок № 42 Октябрьского суд. района г. Ростова-на-Дону")
+    assert match is not None and match[0] == 41
@@ -0,0 +1,62 @@
+# tests/test_court_payload.py
+import asyncio
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.api.endpoints import courts as courts_endpoints
+from app.api.endpoints.courts import CourtRequest, CourtResponse, FindCourtResponse
+from app.api.responses import OrjsonResponse
+from app.services.court_finder import CourtFinder, Resolution
+from app.services.court_payload import CourtPayload, court_payload, envelope, guessed_payload
+from app.services.warmup import PHASE_READY, warmup
+
+COURT = {"name": "Судебный участок № 1 Ленинского судебного района г. Ростова-на-Дону", "type": "мировой",
+         "code": "61MS0001", "address": "344002, г. Ростов-на-Дону, ул. Ленина, д. 1", "phone": "+7 (863) 000-00-01",
+         "email": "ms1@example.ru", "latitude": 47, "longitude": 39.7123456789, "website": "http://ms1.ros.msudrf.ru",
+         "electronic_filing": "Да"}
+
+PAYLOADS = [
+    court_payload(COURT),
+    court_payload({"name": "Участок без контактов", "type": "мировой", "address": "г. Шахты"}),
+    guessed_payload("Ленинский районный суд", "районный", "г. Ростов-на-Дону", "http://lenin.ros.sudrf.ru",
+                    (47.22, 39.71)),
+    guessed_payload("Судебный участок Азовский район", "мировой", ""),
+    CourtPayload.from_raw(court_payload(COURT).raw),
+]
+
+
+def _old_body(court, **fields) -> bytes:
+    """Тело ответа до перехода на orjson: response_model=dict и суд через CourtResponse."""
+    return JSONResponse(jsonable_encoder({**fields, "court": CourtResponse(**court)})).body
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_envelope_matches_old_response_model(payload):
+    fields = {"status": "success", "confidence": "high", "deadline_exceeded": False}
+    body = OrjsonResponse(envelope(payload, **fields)).body
+    assert body == _old_body(payload, **fields)
+    FindCourtResponse.model_validate_json(body)
+
+
+def test_envelope_without_fields_and_for_plain_dict():
+    payload = court_payload(COURT)
+    assert envelope(payload) == b'{"court":' + payload.raw + b"}"
+    assert envelope(dict(payload), status="success") == envelope(payload, status="success")
+
+
+def test_find_court_endpoint_body_matches_old_response_model(monkeypatch):
+    monkeypatch.setattr(warmup, "phase", PHASE_READY)
+    monkeypatch.setattr(CourtFinder, "courts_data", [COURT])
+    resolution = Resolution(court_payload(COURT), "territory", "high", elapsed=0.01, deadline_exceeded=True)
+
+    async def resolve(*args, **kwargs):
+        return resolution
+
+    monkeypatch.setattr(CourtFinder, "resolve", resolve)
+    request = CourtRequest(address="г. Ростов-на-Дону, ул. Ленина, д. 5", debt_amount=1000.0,
+                           case_type="имущественный_спор")
+    response = asyncio.run(courts_endpoints.find_court_endpoint(request))
+    assert response.media_type == "application/json"
+    assert response.body == _old_body(resolution.court, status="success", confidence="high", deadline_exceeded=True)
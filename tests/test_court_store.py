@@ -0,0 +1,64 @@
+# tests/test_court_store.py
+import json
+
+import pytest
+
+from app.services.court_payload import PayloadCache, court_payload
+from app.services.court_store import (
+    COURT_TYPES, COURTS_DATA_PATH, INDEX_FIELDS, CourtSnapshot, build_nearest_tiles, build_snapshot, index_records,
+    read_courts_file,
+)
+
+COURTS = [
+    {"name": "Судебный участок № 1", "code": "61MS0001", "address": "г. Ростов-на-Дону, ул. Ленина, д. 1",
+     "coordinates": {"lat": 47.22, "lon": 39.71}, "phone": "+7 863 000-00-01"},
+    {"name": "Ленинский районный суд г. Ростова-на-Дону", "code": "61RS0001", "website": "http://lenin.ros.sudrf.ru",
+     "address": "г. Ростов-на-Дону, ул. Пушкинская, д. 2", "coordinates": {"lat": 47.23, "lon": 39.72}},
+    {"name": "Судебный участок № 2", "code": "61MS0002", "address": "г. Таганрог, ул. Петровская, д. 10"},
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    source = tmp_path / "courts.json"
+    source.write_text(json.dumps(COURTS, ensure_ascii=False), encoding="utf-8")
+    snapshot = CourtSnapshot(build_snapshot(source, tmp_path / "courts.snapshot"))
+    yield snapshot, read_courts_file(source)
+    snapshot.close()
+
+
+def test_index_records_do_not_decode_records(snapshot):
+    snapshot, courts = snapshot
+    records = index_records(snapshot)
+    assert records == [{field: court.get(field) for field in INDEX_FIELDS} for court in courts]
+    assert snapshot.decoded_cache_info().currsize == 0
+    assert index_records(courts) is courts
+
+
+def test_payloads_come_from_snapshot(snapshot):
+    snapshot, courts = snapshot
+    payloads = PayloadCache(snapshot, "v1", stored_limit=2).warm()
+    assert len(payloads._payloads) == 0
+    for index, court in enumerate(courts):
+        assert payloads.get(index).raw == court_payload(court).raw
+        assert payloads.get(index) == court_payload(court)
+    assert len(payloads._payloads) == 2
+    assert payloads.index_of(court_payload(courts[2])) == 2
+    assert payloads.table() == PayloadCache(courts, "v1").table()
+    assert snapshot.decoded_cache_info().currsize == 0
+
+
+def test_mapped_tiles_match_built_tiles(tmp_path):
+    snapshot = CourtSnapshot(build_snapshot(COURTS_DATA_PATH, tmp_path / "courts.snapshot"))
+    try:
+        tiles = snapshot.nearest_tiles()
+        built = build_nearest_tiles(read_courts_file(COURTS_DATA_PATH))
+        assert len(tiles) == len(built) > 0
+        for court_type in COURT_TYPES:
+            for lat_step in range(60):
+                for lon_step in range(60):
+                    lat, lon = 45.5 + lat_step * 0.08, 38.0 + lon_step * 0.12
+                    assert tiles.lookup(lat, lon, court_type) == built.lookup(lat, lon, court_type)
+        assert tiles.lookup(47.22, 39.71, "неизвестный") is None
+    finally:
+        snapshot.close()
@@ -0,0 +1,58 @@
+# tests/test_court_stream.py
+import asyncio
+
+from app.api.court_stream import LookupStream
+from app.core.admission import PRIORITY_BULK, PRIORITY_INTERACTIVE, AdmissionController
+from app.core.msgpack_codec import Unpacker, packb
+
+
+async def echo(item):
+    await asyncio.sleep(0.01 * (3 - item["id"]))  # ответы приходят не по порядку
+    return {"id": item["id"], "status": "success"}
+
+
+def run_stream(chunks, lookup=echo, max_in_flight=8):
+    controller = AdmissionController(4, {PRIORITY_INTERACTIVE: 10, PRIORITY_BULK: 10}, queue_timeout=1.0)
+    stream = LookupStream(lookup, controller, PRIORITY_INTERACTIVE, max_in_flight=max_in_flight, max_frame=1024)
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(stream({"type": "http"}, receive, send))
+    assert sent[0]["status"] == 200 and sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    unpacker = Unpacker()
+    unpacker.feed(b"".join(message.get("body", b"") for message in sent[1:]))
+    return list(unpacker), controller
+
+
+def test_replies_for_split_frames():
+    body = b"".join(packb({"id": i, "address": "ул. Ленина, 1"}) for i in range(3))
+    replies, controller = run_stream([body[:5], body[5:17], body[17:]])
+    assert sorted(reply["id"] for reply in replies) == [0, 1, 2]
+    assert all(reply["status"] == "success" for reply in replies)
+    assert controller.in_flight == 0
+
+
+def test_deeply_nested_frame_is_reported_not_raised():
+    replies, _ = run_stream([packb({"id": 0}), b"\x91" * 500 + b"\xc0"])
+    assert {"id": 0, "status": "success"} in replies
+    errors = [reply for reply in replies if reply["status"] == "error"]
+    assert len(errors) == 1 and "MessagePack" in errors[0]["detail"]
+
+
+def test_truncated_body_and_failing_lookup():
+    async def failing(item):
+        raise RuntimeError("boom")
+
+    replies, controller = run_stream([packb({"id": 7}) + b"\x82\xa2id"], lookup=failing)
+    assert {"id": 7, "status": "error", "detail": "Внутренняя ошибка сервера"} in replies
+    assert any(reply["id"] is None and "оборвано" in reply["detail"] for reply in replies)
+    assert controller.in_flight == 0
@@ -0,0 +1,68 @@
+# tests/test_court_tiles.py
+import asyncio
+import threading
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import courts as courts_endpoints
+from app.services.court_finder import CourtFinder
+from app.services.warmup import PHASE_INDEXES, PHASE_READY, warmup
+
+COURTS = [
+    {"name": "Судебный участок № 1", "type": "мировой", "code": "61MS0001", "latitude": 47.22, "longitude": 39.71},
+    {"name": "Судебный участок № 2", "type": "мировой", "code": "61MS0002", "latitude": 47.25, "longitude": 39.75},
+    {"name": "Ленинский районный суд", "type": "районный", "code": "61RS0001", "latitude": 47.23, "longitude": 39.72},
+]
+
+
+@pytest.fixture
+def courts(monkeypatch):
+    monkeypatch.setattr(warmup, "phase", PHASE_READY)
+    monkeypatch.setattr(CourtFinder, "courts_data", COURTS)
+    monkeypatch.setattr(CourtFinder, "dataset_version", "test")
+    monkeypatch.setattr(CourtFinder, "tile_renderer", None)
+
+
+def get_tile(z, x, y, court_type=None):
+    return asyncio.run(courts_endpoints.get_court_tile(z=z, x=x, y=y, court_type=court_type, if_none_match=None))
+
+
+def test_tile_is_rendered_off_the_loop(courts, monkeypatch):
+    threads = []
+    render = CourtFinder.get_tile_renderer().render
+
+    def tracked(*args):
+        threads.append(threading.current_thread())
+        return render(*args)
+
+    monkeypatch.setattr(CourtFinder.tile_renderer, "render", tracked)
+    response = get_tile(10, 624, 361, "мировой")
+    assert response.status_code == 200
+    assert threads and threads[0] is not threading.main_thread()
+    assert orjson.loads(response.body)["type"] == "FeatureCollection"
+
+
+def test_unknown_court_type_is_rejected(courts):
+    with pytest.raises(HTTPException) as error:
+        get_tile(10, 624, 361, "арбитражный")
+    assert error.value.status_code == 422
+    assert CourtFinder.tile_renderer is None
+
+
+def test_requests_before_data_load_get_503_with_retry_after(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setattr(CourtFinder, "courts_data", [])
+    response = TestClient(app).get("/api/courts/tiles/10/624/361")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_requests_during_warmup_get_503_even_with_courts_loaded(courts, monkeypatch):
+    monkeypatch.setattr(warmup, "phase", PHASE_INDEXES)
+    with pytest.raises(HTTPException) as error:
+        get_tile(10, 624, 361)
+    assert error.value.status_code == 503
@@ -0,0 +1,66 @@
+# tests/test_geo_tiles.py
+import random
+
+from app.services.court_store import COURTS_DATA_PATH, iter_points, read_courts_file
+from app.services.cpu_tasks import nearest_point, pack_points
+from app.services.geo_tiles import NearestCourtTiles, geohash_bbox, geohash_encode
+
+
+def _random_sites(seed: int, count: int):
+    rng = random.Random(seed)
+    sites = [(index, rng.uniform(46.0, 49.0), rng.uniform(38.5, 43.5)) for index in range(count)]
+    # Суды в одном здании: таблица должна вернуть первый из них, как и полный перебор
+    sites.append((count, sites[0][1], sites[0][2]))
+    return sites
+
+
+def _check_against_brute_force(tiles: NearestCourtTiles, court_type: str, sites, points):
+    indexes, coords = pack_points(sites)
+    covered = 0
+    for lat, lon in points:
+        value = tiles.lookup(lat, lon, court_type)
+        if value is None:
+            continue
+        covered += 1
+        nearest, _ = nearest_point((lat, lon), indexes, coords)
+        if isinstance(value, int):
+            assert value == nearest, (lat, lon)
+        else:
+            assert nearest in value, (lat, lon)
+    return covered
+
+
+def test_geohash_bbox_contains_point():
+    geohash = geohash_encode(47.2221, 39.7203, 5)
+    min_lat, min_lon, max_lat, max_lon = geohash_bbox(geohash)
+    assert min_lat <= 47.2221 <= max_lat and min_lon <= 39.7203 <= max_lon
+    assert geohash_encode(47.2221, 39.7203, 3) == geohash[:3]
+
+
+def test_lookup_matches_brute_force_on_random_sites():
+    sites = _random_sites(1, 25)
+    tiles = NearestCourtTiles().build({"мировой": sites})
+    rng = random.Random(101)
+    points = [(rng.uniform(46.0, 49.0), rng.uniform(38.5, 43.5)) for _ in range(120)]
+    # Точки в зданиях судов и рядом с ними — у самых границ ячеек и областей
+    points += [(lat + dlat, lon + dlon) for _, lat, lon in sites for dlat, dlon in ((0, 0), (1e-4, -1e-4))]
+    assert _check_against_brute_force(tiles, "мировой", sites, points) == len(points)
+    assert tiles.stats["мировой"]["boundary"] > 0
+
+
+def test_lookup_matches_brute_force_on_court_data():
+    courts = read_courts_file(COURTS_DATA_PATH)
+    sites = list(iter_points(courts, "районный"))
+    tiles = NearestCourtTiles().build({"районный": sites})
+    rng = random.Random(7)
+    lats = [lat for _, lat, _ in sites]
+    lons = [lon for _, _, lon in sites]
+    points = [(rng.uniform(min(lats), max(lats)), rng.uniform(min(lons), max(lons))) for _ in range(120)]
+    assert _check_against_brute_force(tiles, "районный", sites, points) == len(points)
+
+
+def test_points_outside_table_and_unknown_types_are_not_covered():
+    tiles = NearestCourtTiles().build({"мировой": _random_sites(1, 5)})
+    assert tiles.lookup(55.75, 37.62, "мировой") is None
+    assert tiles.lookup(47.2, 39.7, "районный") is None
+    assert len(NearestCourtTiles.from_dict(tiles.to_dict())) == len(tiles)
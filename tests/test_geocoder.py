@@ -0,0 +1,117 @@
+# tests/test_geocoder.py
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from app.services.geocoder import Coords, GeocoderProvider, HedgedGeocoder
+
+HANG = 60.0
+
+
+class FakeProvider(GeocoderProvider):
+    def __init__(self, name: str, delay: float, result: Optional[Coords], p95: Optional[float] = None):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.result = result
+        self.started: List[float] = []
+        if p95 is not None:
+            self.latencies.extend([p95] * 20)
+
+    async def request(self, address: str) -> Optional[Coords]:
+        self.started.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+def _geocode(geocoder: HedgedGeocoder):
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        coords = await geocoder.geocode("г. Ростов-на-Дону, ул. Ленина, 1")
+        elapsed = loop.time() - started
+        await asyncio.sleep(0)  # отменённые запросы успевают завершиться
+        return coords, elapsed, started
+    return asyncio.run(scenario())
+
+
+def test_provider_must_implement_request():
+    with pytest.raises(TypeError):
+        GeocoderProvider()
+
+
+def test_hedge_starts_after_primary_p95():
+    primary = FakeProvider("primary", HANG, (1.0, 1.0), p95=0.1)
+    secondary = FakeProvider("secondary", 0.0, (2.0, 2.0))
+    geocoder = HedgedGeocoder([primary, secondary], timeout=5.0, min_delay=0.01, max_delay=1.0)
+
+    coords, elapsed, started = _geocode(geocoder)
+
+    assert coords == (2.0, 2.0)
+    assert geocoder.hedged == 1
+    assert secondary.started[0] - started == pytest.approx(0.1, abs=0.05)
+    assert geocoder.wins == {"secondary": 1}
+
+
+def test_fast_primary_is_not_hedged():
+    primary = FakeProvider("primary", 0.0, (1.0, 1.0), p95=0.1)
+    secondary = FakeProvider("secondary", 0.0, (2.0, 2.0))
+    geocoder = HedgedGeocoder([primary, secondary], timeout=5.0, min_delay=0.01, max_delay=1.0)
+
+    coords, _, _ = _geocode(geocoder)
+
+    assert coords == (1.0, 1.0)
+    assert geocoder.hedged == 0
+    assert secondary.started == []
+
+
+def test_failed_primary_starts_next_provider_immediately():
+    primary = FakeProvider("primary", 0.0, None, p95=1.0)
+    secondary = FakeProvider("secondary", 0.0, (2.0, 2.0))
+    geocoder = HedgedGeocoder([primary, secondary], timeout=5.0, min_delay=0.01, max_delay=1.0)
+
+    coords, elapsed, started = _geocode(geocoder)
+
+    assert coords == (2.0, 2.0)
+    assert geocoder.hedged == 0
+    assert secondary.started[0] - started < 0.05
+    assert elapsed < 0.1
+    assert primary.failures == 1
+
+
+def test_losing_requests_are_cancelled():
+    primary = FakeProvider("primary", HANG, (1.0, 1.0), p95=0.05)
+    secondary = FakeProvider("secondary", 0.0, (2.0, 2.0))
+    geocoder = HedgedGeocoder([primary, secondary], timeout=5.0, min_delay=0.01, max_delay=1.0)
+
+    coords, elapsed, _ = _geocode(geocoder)
+
+    assert coords == (2.0, 2.0)
+    assert elapsed < 1.0
+    assert primary.cancelled == 1
+    assert secondary.cancelled == 0
+
+
+def test_overall_timeout_returns_none_and_cancels_everything():
+    primary = FakeProvider("primary", HANG, (1.0, 1.0), p95=0.05)
+    secondary = FakeProvider("secondary", HANG, (2.0, 2.0))
+    geocoder = HedgedGeocoder([primary, secondary], timeout=0.3, min_delay=0.01, max_delay=1.0)
+
+    coords, elapsed, _ = _geocode(geocoder)
+
+    assert coords is None
+    assert elapsed == pytest.approx(0.3, abs=0.1)
+    assert primary.cancelled == 1
+    assert secondary.cancelled == 1
+
+
+def test_all_providers_failing_returns_none():
+    primary = FakeProvider("primary", 0.0, None)
+    secondary = FakeProvider("secondary", 0.0, None)
+    geocoder = HedgedGeocoder([primary, secondary], timeout=5.0)
+
+    coords, elapsed, _ = _geocode(geocoder)
+
+    assert coords is None
+    assert elapsed < 0.1
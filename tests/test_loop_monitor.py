@@ -0,0 +1,42 @@
+# tests/test_loop_monitor.py
+import asyncio
+import time
+
+from app.core.loop_monitor import LoopMonitor, ProfilingMiddleware
+
+
+def _serve(handler, tmp_path, **kwargs):
+    monitor = LoopMonitor(interval=0.02, stall_threshold=0.1, sample_interval=0.005)
+    middleware = ProfilingMiddleware(handler, monitor, profile_dir=str(tmp_path), **kwargs)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await middleware({"type": "http", "method": "POST", "path": "/api/courts/find_court/", "headers": []},
+                         None, None)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    return monitor
+
+
+async def _block_in_child_task(scope, receive, send):
+    async def geocode():
+        time.sleep(0.3)  # синхронный вызов в дочерней задаче запроса
+
+    await asyncio.get_running_loop().create_task(geocode())
+
+
+def test_stall_in_child_task_is_attributed_to_request(tmp_path):
+    monitor = _serve(_block_in_child_task, tmp_path)
+    assert monitor.stalls >= 1
+    assert monitor.events[0]["request"] == "POST /api/courts/find_court/"
+    assert any("geocode" in frame for frame in monitor.events[0]["stack"])
+
+
+def test_profile_includes_child_task_samples(tmp_path):
+    _serve(_block_in_child_task, tmp_path, sample_rate=1.0)
+    profiles = list(tmp_path.glob("*.folded"))
+    assert len(profiles) == 1
+    assert "geocode" in profiles[0].read_text(encoding="utf-8")
@@ -0,0 +1,65 @@
+# tests/test_msgpack_codec.py
+import pytest
+
+from app.core import msgpack_codec
+from app.core.msgpack_codec import MsgpackError, Unpacker, packb, unpackb
+
+VALUES = [
+    None, True, False, 0, 127, 128, 255, 65535, 2 ** 32, 2 ** 63, -1, -32, -33, -129, -2 ** 31 - 1, -2 ** 63,
+    0.5, -1e300, "", "суд", "x" * 31, "y" * 32, "z" * 70000, b"\x00\x01", b"b" * 300,
+    [], list(range(20)), {}, {"id": 1, "status": "success", "court": {"name": "Судебный участок № 1"}},
+    {str(i): i for i in range(20)},
+]
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_roundtrip(value):
+    assert unpackb(packb(value)) == value
+
+
+def test_stream_split_at_every_byte():
+    objects = [{"id": i, "address": f"ул. Ленина, {i}", "debt_amount": 1000.5 * i} for i in range(5)]
+    data = b"".join(packb(obj) for obj in objects)
+    unpacker = Unpacker()
+    decoded = []
+    for i in range(len(data)):
+        unpacker.feed(data[i:i + 1])
+        decoded.extend(unpacker)
+    assert decoded == objects
+    assert unpacker.pending == 0
+
+
+def test_deep_nesting_is_rejected():
+    depth = 100000
+    with pytest.raises(MsgpackError):
+        unpackb(b"\x91" * depth + b"\xc0")
+    with pytest.raises(MsgpackError):
+        unpackb(b"\x81\x00" * depth + b"\xc0")
+
+
+def test_depth_limit_boundary():
+    unpacker = Unpacker(max_depth=3)
+    unpacker.feed(packb([[[1]]]))
+    assert list(unpacker) == [[[[1]]]]
+    unpacker.feed(packb([[[[1]]]]))
+    with pytest.raises(MsgpackError):
+        list(unpacker)
+
+
+def test_oversized_buffer_and_bad_input():
+    unpacker = Unpacker(max_buffer=16)
+    with pytest.raises(MsgpackError):
+        unpacker.feed(b"\xc0" * 17)
+    with pytest.raises(MsgpackError):
+        unpackb(b"\xc1")
+    with pytest.raises(MsgpackError):
+        unpackb(b"\xa2\xff\xfe")
+    with pytest.raises(MsgpackError):
+        unpackb(b"\x81\x90\x01")
+
+
+def test_only_dict_keys_are_cached():
+    secret = "ул. Тайная, д. 1"
+    packb({"address": secret, "id": secret})
+    assert "address" in msgpack_codec._SHORT_STRINGS
+    assert secret not in msgpack_codec._SHORT_STRINGS
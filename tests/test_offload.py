@@ -0,0 +1,74 @@
+# tests/test_offload.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.offload import CpuOffload
+
+
+def where() -> str:
+    return "pool" if multiprocessing.parent_process() is not None else "inline"
+
+
+def crash_in_pool() -> str:
+    """Роняет процесс пула; на месте (после отката) просто отвечает."""
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return "inline"
+
+
+class BrokenPool:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("процесс пула завершился")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_small_tasks_and_disabled_pool_run_inline():
+    offload = CpuOffload(processes=2, thresholds={"parse": 100})
+    assert asyncio.run(offload.run("parse", 10, where)) == "inline"
+    assert asyncio.run(CpuOffload(processes=0).run("parse", 10 ** 6, where)) == "inline"
+    assert offload._pool is None
+    assert offload.snapshot()["stages"]["parse"]["inline"] == 1
+
+
+def test_broken_pool_falls_back_inline_and_is_recreated(monkeypatch):
+    offload = CpuOffload(processes=1)
+    pools = [BrokenPool(), BrokenPool()]
+    started = []
+
+    def start():
+        offload._pool = pools[len(started)]
+        started.append(offload._pool)
+
+    monkeypatch.setattr(offload, "start", start)
+
+    async def scenario():
+        return [await offload.run("nearest", 1, where), await offload.run("nearest", 1, where)]
+
+    assert asyncio.run(scenario()) == ["inline", "inline"]
+    # После отказа пул закрыт и при следующей задаче создаётся заново
+    assert started == pools and all(pool.shut_down for pool in pools)
+    assert offload._pool is None
+    stats = offload.snapshot()["stages"]["nearest"]
+    assert stats["fallbacks"] == 2 and stats["offloaded"] == 0
+
+
+def test_crashed_worker_falls_back_inline():
+    offload = CpuOffload(processes=1)
+
+    async def scenario():
+        try:
+            return [await offload.run("nearest", 1, where), await offload.run("nearest", 1, crash_in_pool),
+                    await offload.run("nearest", 1, where)]
+        finally:
+            offload.shutdown()
+
+    assert asyncio.run(scenario()) == ["pool", "inline", "pool"]
+    stats = offload.snapshot()["stages"]["nearest"]
+    assert stats["offloaded"] == 2 and stats["fallbacks"] == 1
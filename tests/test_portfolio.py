@@ -0,0 +1,32 @@
+# tests/test_portfolio.py
+import asyncio
+
+from app.services import portfolio
+from app.services.portfolio import SharedGeocoder
+
+
+def test_shared_geocoder_waiter_survives_cancelled_leader(monkeypatch):
+    calls = []
+
+    async def geocode_address(address):
+        calls.append(address)
+        await asyncio.sleep(0.05)
+        return 47.22, 39.71
+
+    monkeypatch.setattr(portfolio, "geocode_address", geocode_address)
+
+    async def run():
+        geocoder = SharedGeocoder(concurrency=2)
+        leader = asyncio.create_task(geocoder.geocode("ленина 1", "ул. Ленина, 1"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(geocoder.geocode("ленина 1", "ул. Ленина, 1"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await waiter == (47.22, 39.71)
+        assert leader.cancelled()
+        assert len(calls) == 2
+        # Дальше — из кэша
+        assert await geocoder.geocode("ленина 1", "ул. Ленина, 1") == (47.22, 39.71)
+        assert len(calls) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,161 @@
+# tests/test_shared_cache.py
+import asyncio
+import time
+
+import orjson
+
+from app.services.shared_cache import RedisBackend, SharedCache
+from loadtest.simulators import FakeRedisServer
+
+
+def _run(scenario):
+    async def wrapper():
+        server = await FakeRedisServer().start()
+        try:
+            return await scenario(server)
+        finally:
+            await server.stop()
+    return asyncio.run(wrapper())
+
+
+def _cache(server: FakeRedisServer, **kwargs) -> SharedCache:
+    return SharedCache(RedisBackend(server.url, timeout=1.0), **kwargs)
+
+
+def test_reads_of_one_tick_share_one_mget():
+    async def scenario(server):
+        for i in range(5):
+            server.data[f"courts:k{i}".encode()] = (orjson.dumps({"i": i}), None)
+        cache = _cache(server)
+        values = await asyncio.gather(*(cache.get(f"k{i}") for i in range(6)))
+        assert values == [{"i": i} for i in range(5)] + [None]
+        assert server.commands["MGET"] == 1
+        assert cache.stats["batches"] == 1
+        assert cache.stats["shared_hits"] == 5
+        await cache.close()
+    _run(scenario)
+
+
+def test_concurrent_calls_in_one_process_compute_once():
+    async def scenario(server):
+        cache = _cache(server)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"court": 1}
+
+        values = await asyncio.gather(*(cache.get_or_compute("addr", compute, 60) for _ in range(10)))
+        assert values == [{"court": 1}] * 10
+        assert len(calls) == 1
+        assert orjson.loads(server.data[b"courts:addr"][0]) == {"court": 1}
+        assert b"courts:lock:addr" not in server.data
+        await cache.close()
+    _run(scenario)
+
+
+def test_waiter_survives_cancelled_leader():
+    async def scenario(server):
+        cache = _cache(server)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"court": len(calls)}
+
+        leader = asyncio.create_task(cache.get_or_compute("addr", compute, 60))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute("addr", compute, 60))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # например, истёк бюджет времени запроса-лидера
+        assert await waiter == {"court": 2}
+        assert leader.cancelled()
+        assert len(calls) == 2
+        await cache.close()
+    _run(scenario)
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    async def scenario(server):
+        cache = _cache(server)
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return {"court": 1}
+
+        leader = asyncio.create_task(cache.get_or_compute("addr", compute, 60))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute("addr", compute, 60))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        assert await leader == {"court": 1}
+        assert waiter.cancelled()
+        await cache.close()
+    _run(scenario)
+
+
+def test_second_worker_waits_for_lock_holder():
+    async def scenario(server):
+        first, second = _cache(server), _cache(server)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return {"court": 1}
+
+        holder = asyncio.create_task(first.get_or_compute("addr", compute, 60))
+        await asyncio.sleep(0.05)
+        value = await second.get_or_compute("addr", compute, 60)
+        assert value == {"court": 1}
+        assert await holder == {"court": 1}
+        assert len(calls) == 1
+        assert second.stats["waited_for_lock"] == 1
+        await first.close()
+        await second.close()
+    _run(scenario)
+
+
+def test_waiter_computes_as_soon_as_uncached_lock_is_released():
+    async def scenario(server):
+        first, second = _cache(server, lock_ttl=10.0), _cache(server, lock_ttl=10.0)
+
+        async def not_cacheable():
+            await asyncio.sleep(0.1)
+            return None
+
+        async def compute():
+            return {"court": 2}
+
+        holder = asyncio.create_task(first.get_or_compute("addr", not_cacheable, 60))
+        await asyncio.sleep(0.03)
+        started = time.monotonic()
+        value = await second.get_or_compute("addr", compute, 60)
+        assert value == {"court": 2}
+        assert time.monotonic() - started < 1.0
+        assert await holder is None
+        await first.close()
+        await second.close()
+    _run(scenario)
+
+
+def test_unavailable_backend_falls_back_to_near_cache():
+    async def scenario(server):
+        await server.stop()  # порт свободен, соединение будет отклонено
+        cache = _cache(server, retry_after=30.0)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"court": 3}
+
+        assert await cache.get_or_compute("addr", compute, 60) == {"court": 3}
+        assert not cache.backend_available
+        assert cache.stats["backend_errors"] >= 1
+        assert await cache.get_or_compute("addr", compute, 60) == {"court": 3}
+        assert len(calls) == 1
+        assert cache.stats["near_hits"] == 1
+        await cache.close()
+    _run(scenario)
@@ -0,0 +1,107 @@
+# tests/test_territory_index.py
+import json
+
+import pytest
+
+from app.services.territory_index import (
+    ANY_HOUSE, PARITY_ANY, PARITY_EVEN, PARITY_ODD, TerritoryIndex, build_territories_file,
+    load_territory_index, parse_address, parse_territory,
+)
+
+COURTS = [
+    {"name": "Судебный участок № 1", "code": "61MS0001", "address": "344065, г. Ростов-на-Дону, ул. Криворожская, д. 56"},
+    {"name": "Судебный участок № 2", "code": "61MS0002", "address": "344000, г. Ростов-на-Дону, ул. Ленина, д. 1"},
+    {"name": "Судебный участок № 3", "code": "61MS0003", "address": "347900, г. Таганрог, ул. Петровская, д. 10"},
+]
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("ул. Ленина 5", ("", "ул", "ленина", 5)),
+    ("г. Ростов-на-Дону, ул. Ленина, д. 5", ("ростов-на-дону", "ул", "ленина", 5)),
+    ("Ростов-на-Дону, ул. Ленина, 17", ("ростов-на-дону", "ул", "ленина", 17)),
+    ("Ростов-на-Дону, ул. 40-летия Победы, 12", ("ростов-на-дону", "ул", "40-летия победы", 12)),
+    ("Шахты, Большая Садовая ул., 10", ("шахты", "ул", "большая садовая", 10)),
+    ("г. Таганрог, ул. Пушкинская, д. 15", ("таганрог", "ул", "пушкинская", 15)),
+    ("г. Ростов-на-Дону, ул. Ленина", ("ростов-на-дону", "ул", "ленина", None)),
+])
+def test_parse_address_extracts_house_number(address, expected):
+    assert parse_address(address) == expected
+
+
+def test_parse_territory_ranges_and_parity():
+    entries = parse_territory("ул. Ленина 1-15; ул. Садовая нечетные с 3 по 21; пер. Тихий", "Ростов-на-Дону")
+    assert entries == [
+        ("ростов-на-дону", "ул", "ленина", 1, 15, PARITY_ANY),
+        ("ростов-на-дону", "ул", "садовая", 3, 21, PARITY_ODD),
+        ("ростов-на-дону", "пер", "тихий", 0, ANY_HOUSE, PARITY_ANY),
+    ]
+
+
+def test_parse_territory_explicit_settlement_overrides_default():
+    entries = parse_territory("х. Красный, ул. Мира четные", "Ростов-на-Дону")
+    assert entries == [("красный", "ул", "мира", 0, ANY_HOUSE, PARITY_EVEN)]
+
+
+def _index() -> TerritoryIndex:
+    index = TerritoryIndex()
+    index.add(0, parse_territory("ул. Ленина с 1 по 15; ул. Пушкинская полностью", "Ростов-на-Дону"))
+    index.add(1, parse_territory("ул. Ленина с 17 по 99", "Ростов-на-Дону"))
+    index.add(2, parse_territory("ул. Садовая четные", "Таганрог"))
+    return index
+
+
+def test_lookup_applies_house_ranges():
+    index = _index()
+    assert index.lookup("г. Ростов-на-Дону, ул. Ленина, д. 5") == 0
+    assert index.lookup("Ростов-на-Дону, ул. Ленина 20") == 1
+    assert index.lookup("Ростов-на-Дону, ул. Ленина 16") is None
+
+
+def test_lookup_applies_parity():
+    index = _index()
+    assert index.lookup("г. Таганрог, ул. Садовая, д. 4") == 2
+    assert index.lookup("г. Таганрог, ул. Садовая, д. 5") is None
+
+
+@pytest.mark.parametrize("address", [
+    "г. Таганрог, ул. Пушкинская, д. 15",
+    "Шахты, Большая Садовая ул., 10",
+    "г. Шахты, ул. Ленина, д. 5",
+])
+def test_lookup_ignores_same_street_in_other_city(address):
+    assert _index().lookup(address) is None
+
+
+def test_entries_without_settlement_do_not_match_other_cities():
+    index = TerritoryIndex()
+    index.add(0, [("", "ул", "пушкинская", 0, ANY_HOUSE, PARITY_ANY)])
+    assert index.lookup("г. Таганрог, ул. Пушкинская, д. 15") is None
+
+
+def test_build_and_load_use_court_settlement(tmp_path):
+    source = tmp_path / "courts.json"
+    source.write_text(json.dumps([
+        {**COURTS[0], "territory": "ул. Пушкинская полностью"},
+        {**COURTS[2], "territory": "ул. Пушкинская полностью"},
+    ], ensure_ascii=False), encoding="utf-8")
+    output = tmp_path / "territories.json"
+    build_territories_file(source, output)
+
+    index = load_territory_index(COURTS, output)
+    assert index.lookup("г. Ростов-на-Дону, ул. Пушкинская, д. 15") == 0
+    assert index.lookup("г. Таганрог, ул. Пушкинская, д. 15") == 2
+    assert index.lookup("г. Шахты, ул. Пушкинская, д. 15") is None
+
+
+def test_load_fills_settlement_of_old_files(tmp_path):
+    path = tmp_path / "territories.json"
+    path.write_text(json.dumps([{"code": "61MS0003", "name": "", "entries": [["", "ул", "пушкинская", 0, ANY_HOUSE, 0]]}]),
+                    encoding="utf-8")
+    index = load_territory_index(COURTS, path)
+    assert index.lookup("г. Таганрог, ул. Пушкинская, д. 15") == 2
+    assert index.lookup("г. Ростов-на-Дону, ул. Пушкинская, д. 15") is None
+
+
+@pytest.mark.parametrize("address", ["ул. Ленина 5", "ул. Садовая, д. 4", "Пушкинская ул., 15"])
+def test_lookup_requires_settlement_for_streets(address):
+    assert _index().lookup(address) is None
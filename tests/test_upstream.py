@@ -0,0 +1,121 @@
+# tests/test_upstream.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.upstream import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ServiceScheduler, SqliteQuotaLedger, UpstreamLimited,
+)
+
+
+def _scheduler(path, **limits) -> ServiceScheduler:
+    """Планировщик «отдельного процесса»: свой ledger на общем файле учёта."""
+    return ServiceScheduler("sudrf", ledger=SqliteQuotaLedger(str(path)), **limits)
+
+
+def test_processes_share_one_rate(tmp_path):
+    path = tmp_path / "quota.sqlite3"
+    first, second = _scheduler(path, rate=20.0, burst=1.0), _scheduler(path, rate=20.0, burst=1.0)
+    started = time.monotonic()
+    for _ in range(5):
+        first.acquire_sync(PRIORITY_INTERACTIVE)
+        second.acquire_sync(PRIORITY_INTERACTIVE)
+    # 10 запросов при общей скорости 20 в секунду и корзине на 1 запрос — не меньше 0,45 с
+    assert time.monotonic() - started >= 0.4
+
+
+def test_background_yields_to_interactive_of_another_process(tmp_path):
+    path = tmp_path / "quota.sqlite3"
+    api = _scheduler(path, rate=10.0, burst=1.0, background_share=0.5)
+    script = _scheduler(path, rate=10.0, burst=1.0, background_share=0.5)
+    api.acquire_sync(PRIORITY_INTERACTIVE)  # корзина пуста
+
+    order = []
+
+    def interactive():
+        api.acquire_sync(PRIORITY_INTERACTIVE)
+        order.append("interactive")
+
+    thread = threading.Thread(target=interactive)
+    thread.start()
+    time.sleep(0.02)  # интерактивный запрос уже ждёт токена
+    script.acquire_sync(PRIORITY_BACKGROUND)
+    order.append("background")
+    thread.join()
+    assert order == ["interactive", "background"]
+
+
+def test_rate_decrease_is_shared(tmp_path):
+    path = tmp_path / "quota.sqlite3"
+    first, second = _scheduler(path, rate=10.0), _scheduler(path, rate=10.0)
+    first.record(False, 0.1)
+    assert second.snapshot()["rate"] == pytest.approx(5.0)
+    assert first.stats["decreases"] == 1
+
+
+def test_daily_quota_is_shared(tmp_path):
+    path = tmp_path / "quota.sqlite3"
+    first = _scheduler(path, rate=1000.0, daily_quota=4, lease=2)
+    second = _scheduler(path, rate=1000.0, daily_quota=4, lease=2)
+    for scheduler in (first, first, second, second):
+        scheduler.acquire_sync(PRIORITY_INTERACTIVE)
+    with pytest.raises(UpstreamLimited):
+        first.acquire_sync(PRIORITY_INTERACTIVE)
+
+
+def test_async_acquire_respects_deadline(tmp_path):
+    scheduler = _scheduler(tmp_path / "quota.sqlite3", rate=1.0, burst=1.0)
+
+    async def scenario():
+        await scheduler.acquire(PRIORITY_INTERACTIVE)
+        with pytest.raises(UpstreamLimited):
+            await scheduler.acquire(PRIORITY_INTERACTIVE, timeout=0.1)
+
+    asyncio.run(scenario())
+    assert scheduler.stats["throttled"] == 1
+
+
+class CountingLedger(SqliteQuotaLedger):
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.transactions = 0
+
+    def exchange(self, service, default, apply):
+        self.transactions += 1
+        return super().exchange(service, default, apply)
+
+
+def test_acquire_takes_tokens_and_quota_in_batches(tmp_path):
+    ledger = CountingLedger(str(tmp_path / "quota.sqlite3"))
+    scheduler = ServiceScheduler("sudrf", ledger=ledger, rate=1000.0, daily_quota=100, lease=5, batch=5)
+    for _ in range(10):
+        with scheduler.call_sync(PRIORITY_INTERACTIVE):
+            pass
+    # Одна транзакция на порцию токенов и квоты, успешные исходы не пишутся отдельно
+    assert ledger.transactions == 2
+    assert ledger.usage("sudrf") == {PRIORITY_INTERACTIVE: 10}
+    assert scheduler.stats["requests"] == 10
+
+
+def test_failure_is_written_at_once_and_drops_local_tokens(tmp_path):
+    path = tmp_path / "quota.sqlite3"
+    ledger = CountingLedger(str(path))
+    first = ServiceScheduler("sudrf", ledger=ledger, rate=10.0, batch=5)
+    first.acquire_sync(PRIORITY_INTERACTIVE)
+    first.record(False, 0.1)
+    assert _scheduler(path, rate=10.0).snapshot()["rate"] == pytest.approx(5.0)
+    transactions = ledger.transactions
+    first.acquire_sync(PRIORITY_INTERACTIVE)
+    assert ledger.transactions == transactions + 1
+
+
+def test_denied_quota_returns_tokens(tmp_path):
+    scheduler = _scheduler(tmp_path / "quota.sqlite3", rate=1.0, burst=3.0, daily_quota=1, lease=1, batch=1)
+    scheduler.acquire_sync(PRIORITY_INTERACTIVE)
+    with pytest.raises(UpstreamLimited):
+        scheduler.acquire_sync(PRIORITY_INTERACTIVE)
+    assert scheduler.stats["quota_exceeded"] == 1
+    # Токен, взятый вместе с отказом в квоте, вернулся в общую корзину
+    assert scheduler.snapshot()["tokens"] == pytest.approx(2.0, abs=0.1)